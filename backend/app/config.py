@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -25,11 +27,26 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
         extra = "allow"  # Allow extra fields in the environment file (for future changes)
 
+    # Full SQLAlchemy URL overriding the DATABASE_* parts, e.g. a local
+    # Postgres or SQLite database for benchmarks (see benchmarks/run.py)
+    SQLALCHEMY_DATABASE_URL: Optional[str] = None
+
     # Construct PostgreSQL database URL dynamically
     @property
     def DATABASE_URL(self) -> str:
+        if self.SQLALCHEMY_DATABASE_URL:
+            return self.SQLALCHEMY_DATABASE_URL
         return f"postgresql://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
 
+    # Async (asyncpg) URL for the opt-in async data layer
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        if self.SQLALCHEMY_DATABASE_URL:
+            return self.SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1).replace(
+                "sqlite://", "sqlite+aiosqlite://", 1
+            )
+        return f"postgresql+asyncpg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
+
     # Optional: Test database URL
     @property
     def DATABASE_TEST_URL(self) -> str:
@@ -46,5 +63,134 @@ class Settings(BaseSettings):
     # Logging Configuration
     LOG_LEVEL: str = "INFO"
 
+    # Background export jobs. A finished export is reused for identical
+    # requests until the data changes or EXPORT_CACHE_TTL seconds pass; files
+    # in EXPORT_DIR are deleted after EXPORT_RETENTION_HOURS
+    EXPORT_DIR: str = "exports"
+    EXPORT_WORKERS: int = 2
+    EXPORT_CACHE_TTL: float = 900.0
+    EXPORT_RETENTION_HOURS: float = 24.0
+
+    # Audit log writer
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 0.5
+    AUDIT_ENQUEUE_TIMEOUT: float = 1.0
+
+    # Drug catalog cache. LISTEN needs a session-mode connection, so point
+    # this at a direct/session-pooler URL when DATABASE_URL is a transaction pooler
+    DRUG_CATALOG_TTL: float = 300.0
+    DRUG_CATALOG_LISTEN_URL: Optional[str] = None
+
+    # Logo drawn on receipts and reports (defaults to app/assets/renewal.png)
+    REPORT_LOGO_PATH: Optional[str] = None
+
+    # Process pools (app/process_pools.py). WEB_CONCURRENCY is the number of
+    # gunicorn workers on the host (gunicorn.conf.py exports it); pools
+    # default to a per-worker share of the cores
+    WEB_CONCURRENCY: int = 1
+    PROCESS_POOL_START_METHOD: str = "forkserver"  # forkserver, spawn or fork
+
+    # PDF render pool (0 workers renders on the request thread)
+    PDF_WORKERS: int = 2
+    PDF_MAX_PENDING: int = 16
+    PDF_RENDER_TIMEOUT: float = 60.0
+
+    # Password hashing pool (app/services/password_hasher.py). Unset workers
+    # means this worker's share of the cores; 0 hashes on the request thread. Operations beyond
+    # PASSWORD_HASH_MAX_PENDING per process get a 503. Changing BCRYPT_ROUNDS
+    # rehashes each password at its owner's next login
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    BCRYPT_ROUNDS: int = 12
+
+    # Database pools (see app/database.py). Unset sizes fall back to the
+    # defaults for ENVIRONMENT and pool mode; a pool size of 0 means NullPool.
+    ENVIRONMENT: str = "production"  # development, test or production
+    DB_POOL_MODE: Optional[str] = None  # session or transaction; port 6543 implies transaction
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_SSLMODE: Optional[str] = None
+
+    # Read replica for reporting, export and audit reads (unset: reads use the
+    # primary). After a write the client is pinned to the primary for
+    # READ_YOUR_WRITES_SECONDS; an unreachable replica is skipped for
+    # REPLICA_RETRY_SECONDS
+    READ_REPLICA_URL: Optional[str] = None
+    READ_YOUR_WRITES_SECONDS: float = 10.0
+    REPLICA_RETRY_SECONDS: float = 30.0
+
+    # Per-request SQL instrumentation (app/query_stats.py). Requests over a
+    # threshold are logged; with ENVIRONMENT=test they fail instead.
+    # QUERY_STATS_HEADERS adds the counts to every response (debug only)
+    QUERY_STATS_HEADERS: bool = False
+    QUERY_COUNT_WARN: int = 50
+    QUERY_TIME_WARN_MS: float = 500.0
+    QUERY_REPEAT_WARN: int = 10
+
+    # Bearer token required by /metrics (unset: open, e.g. behind a private network)
+    METRICS_TOKEN: Optional[str] = None
+
+    # Authenticated principals cached per worker (app/services/principal_cache.py).
+    # Admin changes apply at once in the worker that made them, within the TTL elsewhere
+    PRINCIPAL_CACHE_TTL: float = 30.0
+    PRINCIPAL_CACHE_SIZE: int = 1024
+
+    # Patient identifiers (app/id_allocator.py): str.format templates with
+    # {number} from a database sequence and {check}, its Luhn check digit.
+    # ID_BLOCK_SIZE numbers are reserved per worker per round trip
+    PATIENT_ID_FORMAT: str = "PAT-{number:07d}{check}"
+    HOSPITAL_REG_NUMBER_FORMAT: str = "REG-{number:07d}{check}"
+    ID_BLOCK_SIZE: int = 50
+
+    # Async database pool (one per worker; waiting for it does not hold a thread)
+    ASYNC_POOL_SIZE: Optional[int] = None
+    ASYNC_MAX_OVERFLOW: Optional[int] = None
+
+    # Outgoing email/SMS (app/services/notification_senders.py). EMAIL_BACKEND
+    # is smtp or log; SMS_BACKEND is twilio, http (JSON POST to
+    # SMS_GATEWAY_URL) or log. SMTP sessions idle longer than
+    # SMTP_IDLE_TIMEOUT are checked before reuse
+    EMAIL_BACKEND: str = "smtp"
+    SMTP_FROM: Optional[str] = None
+    SMTP_STARTTLS: bool = True
+    SMTP_IDLE_TIMEOUT: float = 60.0
+    SMS_BACKEND: str = "twilio"
+    SMS_GATEWAY_URL: Optional[str] = None
+    TWILIO_ACCOUNT_SID: Optional[str] = None
+    TWILIO_AUTH_TOKEN: Optional[str] = None
+    TWILIO_FROM_NUMBER: Optional[str] = None
+
+    # Notification outbox dispatcher (app/services/notification_outbox.py).
+    # Failed sends are retried after RETRY_BASE * 2^(attempt-1) seconds, capped
+    # at RETRY_MAX, until MAX_ATTEMPTS; a claimed batch not finished within
+    # LEASE_SECONDS is claimed again
+    NOTIFICATION_DISPATCHER: bool = True
+    NOTIFICATION_BATCH_SIZE: int = 50
+    NOTIFICATION_POLL_INTERVAL: float = 5.0
+    NOTIFICATION_MAX_ATTEMPTS: int = 8
+    NOTIFICATION_RETRY_BASE: float = 30.0
+    NOTIFICATION_RETRY_MAX: float = 3600.0
+    NOTIFICATION_LEASE_SECONDS: float = 300.0
+
+    # Appointment reminder scheduler (send_appointment_reminders.py, its own
+    # process): every REMINDER_INTERVAL_MINUTES, queue reminders for the
+    # appointments starting within REMINDER_LEAD_HOURS, REMINDER_BATCH_SIZE per query
+    REMINDER_LEAD_HOURS: float = 24.0
+    REMINDER_INTERVAL_MINUTES: float = 5.0
+    REMINDER_BATCH_SIZE: int = 1000
+
+    # Department notification stream (app/services/department_notifications.py).
+    # Workers LISTEN for new events on NOTIFICATION_LISTEN_URL (default
+    # DATABASE_URL; needs a session-mode connection like DRUG_CATALOG_LISTEN_URL).
+    # A subscriber more than NOTIFICATION_STREAM_QUEUE_SIZE events behind is
+    # disconnected and resumes from its last id; resumes replay
+    # NOTIFICATION_STREAM_BACKLOG events per query
+    NOTIFICATION_LISTEN_URL: Optional[str] = None
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = 256
+    NOTIFICATION_STREAM_BACKLOG: int = 500
+
 # Instantiate the settings class
 settings = Settings()
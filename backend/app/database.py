@@ -1,13 +1,206 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from app.config import settings
+from app.metrics import DB_POOL_CHECKOUT_TIMEOUTS, DB_POOL_CHECKOUT_WAIT
+
+logger = logging.getLogger(__name__)
+
+# (pool_size, max_overflow) per environment for direct or session-mode connections
+POOL_DEFAULTS = {
+    "development": (5, 5),
+    "test": (0, 0),
+    "production": (10, 20),
+}
+
+# Behind a transaction pooler (PgBouncer, Supabase port 6543) the pooler does
+# the pooling; keep only a few warm client connections per worker
+TRANSACTION_POOL_DEFAULTS = (2, 3)
+
+# Supabase's transaction pooler listens on this port
+TRANSACTION_POOLER_PORT = 6543
+
+
+class PoolMetrics:
+    """Checkout counts and wait times for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+        if timed_out:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(self.name).inc()
+        else:
+            DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(wait_seconds)
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "pool_class": type(pool).__name__,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        return stats
+
+
+class _MeteredPoolMixin:
+    """Times every checkout, including waiting for a free connection and opening a new one."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class MeteredNullPool(_MeteredPoolMixin, NullPool):
+    pass
+
+
+# Every engine built by the factory, by name, for pool_stats()
+_engines: Dict[str, Any] = {}
+
+
+def is_transaction_pooler(url: str) -> bool:
+    if settings.DB_POOL_MODE:
+        return settings.DB_POOL_MODE == "transaction"
+    return make_url(url).port == TRANSACTION_POOLER_PORT
+
+
+def _pool_sizes(url: str, pool_size: Optional[int], max_overflow: Optional[int]) -> Tuple[int, int]:
+    if is_transaction_pooler(url):
+        default_size, default_overflow = TRANSACTION_POOL_DEFAULTS
+    else:
+        default_size, default_overflow = POOL_DEFAULTS.get(settings.ENVIRONMENT, POOL_DEFAULTS["production"])
+    size = pool_size if pool_size is not None else settings.DB_POOL_SIZE
+    overflow = max_overflow if max_overflow is not None else settings.DB_MAX_OVERFLOW
+    return (
+        default_size if size is None else size,
+        default_overflow if overflow is None else overflow,
+    )
+
+
+def _pool_options(url: str, queue_pool, pool_size: Optional[int], max_overflow: Optional[int]) -> Dict[str, Any]:
+    size, overflow = _pool_sizes(url, pool_size, max_overflow)
+    if size <= 0:
+        return {"poolclass": MeteredNullPool}
+    return {
+        "poolclass": queue_pool,
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _register(name: str, engine, sync_engine: Engine):
+    sync_engine.pool.metrics = PoolMetrics(name)
+    _engines[name] = sync_engine
+    return engine
+
+
+def create_db_engine(url: Optional[str] = None, name: str = "primary", **pool_overrides) -> Engine:
+    """
+    The one place sync engines are built.
+
+    Pool sizing follows ENVIRONMENT unless DB_POOL_SIZE / DB_MAX_OVERFLOW are
+    set. Behind a transaction pooler the pool is kept small (or NullPool with
+    a size of 0). psycopg2 never uses server-side prepared statements, so
+    nothing else has to change for PgBouncer in transaction mode.
+    """
+    url = url or settings.DATABASE_URL
+    connect_args = {}
+    if settings.DB_SSLMODE:
+        connect_args["sslmode"] = settings.DB_SSLMODE
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        **_pool_options(url, MeteredQueuePool, pool_overrides.get("pool_size"), pool_overrides.get("max_overflow")),
+    )
+    return _register(name, engine, engine)
+
+
+def create_async_db_engine(url: Optional[str] = None, name: str = "async", **pool_overrides) -> AsyncEngine:
+    """
+    Async (asyncpg) counterpart of create_db_engine. asyncpg prepares every
+    statement server-side, which breaks behind a transaction pooler, so in
+    that mode statement caching is turned off and any prepared statement
+    gets a unique name.
+    """
+    url = url or settings.ASYNC_DATABASE_URL
+    connect_args: Dict[str, Any] = {}
+    if settings.DB_SSLMODE:
+        connect_args["ssl"] = settings.DB_SSLMODE
+    if is_transaction_pooler(url):
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    engine = create_async_engine(
+        url,
+        connect_args=connect_args,
+        **_pool_options(url, MeteredAsyncQueuePool, pool_overrides.get("pool_size"), pool_overrides.get("max_overflow")),
+    )
+    return _register(name, engine, engine.sync_engine)
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Pool size and checkout wait metrics of every engine in this process."""
+    return {name: engine.pool.metrics.snapshot(engine.pool) for name, engine in _engines.items()}
 
-# Database connection URL from settings (which loads from .env)
-SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 # Create the SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_db_engine()
 
 # Create a session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -22,3 +215,124 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Read replica for pure reads (reports, exports, audit browsing, dashboards).
+# Without READ_REPLICA_URL every read session simply uses the primary.
+replica_engine = create_db_engine(settings.READ_REPLICA_URL, name="replica") if settings.READ_REPLICA_URL else None
+
+# Monotonic time until which the replica is skipped after failing to connect
+_replica_down_until = 0.0
+
+
+class RequestRouting:
+    """Per-request routing state, shared by every session the request opens."""
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set by the routing middleware. A mutable object rather than a flag, because
+# sync dependencies and endpoints run in threadpool copies of the context
+_request_routing: ContextVar[Optional[RequestRouting]] = ContextVar("request_routing", default=None)
+
+
+def begin_request_routing(pinned: bool = False) -> RequestRouting:
+    routing = RequestRouting(pinned)
+    _request_routing.set(routing)
+    return routing
+
+
+def pin_to_primary():
+    """Send every later read of the current request to the primary."""
+    routing = _request_routing.get()
+    if routing is not None:
+        routing.pinned = routing.wrote = True
+
+
+def replica_available() -> bool:
+    if replica_engine is None or time.monotonic() < _replica_down_until:
+        return False
+    routing = _request_routing.get()
+    return routing is None or not routing.pinned
+
+
+class RoutingSession(Session):
+    """
+    Session for read-only dependencies: statements go to the replica unless
+    the request is pinned to the primary (it wrote, or the client wrote a
+    moment ago). A flush always goes to the primary and pins the request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or not self.info.get("use_replica") or not replica_available():
+            return engine
+        return replica_engine
+
+
+@event.listens_for(Session, "after_flush")
+def _pin_after_flush(session, flush_context):
+    # Read your writes: once anything in this request is written, the rest of
+    # the request reads from the primary
+    if session.new or session.dirty or session.deleted:
+        pin_to_primary()
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+
+def open_read_session() -> Session:
+    """A read-only session on the replica, or on the primary when it is pinned or unavailable."""
+    global _replica_down_until
+    db = ReadSessionLocal()
+    if not replica_available():
+        return db
+    db.info["use_replica"] = True
+    try:
+        # Check out the replica connection up front so an outage falls back here
+        db.connection()
+    except OperationalError as e:
+        logger.warning(f"Read replica unavailable, reading from the primary: {e}")
+        db.close()
+        _replica_down_until = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        db = ReadSessionLocal()
+    return db
+
+
+# Dependency function to get a session for pure reads (replica when available)
+def get_read_db():
+    db = open_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Opt-in async engine (asyncpg) for read-heavy async routes. It is created on
+# first use, so workers that never serve an async route open no extra pool.
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _async_engine = create_async_db_engine(
+            pool_size=settings.ASYNC_POOL_SIZE,
+            max_overflow=settings.ASYNC_MAX_OVERFLOW,
+        )
+        # Objects stay readable after commit: async sessions cannot lazy-load on access
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+# Dependency function to get an async database session
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -0,0 +1,131 @@
+# Patient identifiers from database sequences. Each worker process takes a
+# block of numbers from a Postgres sequence in one round trip and hands them
+# out from memory, so a registration never needs a retry and never waits on
+# another worker. Numbers are unique but not gap-free: a block that is not
+# used up before the worker restarts is skipped. The human-readable form
+# comes from a configurable format with a Luhn check digit, so a mistyped
+# number is rejected rather than opening another patient's record.
+import logging
+import os
+import re
+import threading
+from collections import deque
+from typing import Deque, Set
+
+from sqlalchemy import Column, Integer, MetaData, Sequence, String, Table, func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from app.config import settings
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def luhn_check_digit(number: int) -> int:
+    """The Luhn check digit for `number`, as used on card and health service numbers."""
+    total = 0
+    for position, digit in enumerate(reversed(str(number))):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return (10 - total % 10) % 10
+
+
+# Sequence-less dialects (the SQLite stand-in used by the benchmarks) count in
+# a table instead. The counter is updated in the inserting transaction, so it
+# rolls back with a failed insert and numbers are taken one at a time
+_counters = Table(
+    "id_counters", MetaData(),
+    Column("name", String(64), primary_key=True),
+    Column("value", Integer, nullable=False),
+)
+_counter_tables_created: Set[int] = set()
+
+
+def _next_counter_value(connection: Connection, name: str) -> int:
+    if id(connection.engine) not in _counter_tables_created:
+        _counters.create(connection, checkfirst=True)
+        _counter_tables_created.add(id(connection.engine))
+    value = connection.execute(
+        update(_counters).where(_counters.c.name == name).values(value=_counters.c.value + 1).returning(_counters.c.value)
+    ).scalar()
+    if value is None:
+        connection.execute(insert(_counters).values(name=name, value=1))
+        value = 1
+    return value
+
+
+class IdentifierAllocator:
+    """
+    Formatted identifiers backed by one database sequence.
+
+    `format` is a str.format template with the fields {number} (the sequence
+    value) and {check} (its Luhn check digit), e.g. "PAT-{number:07d}{check}".
+    `block_size` numbers are reserved per round trip; they are shared by all
+    threads of the worker.
+    """
+
+    def __init__(self, sequence_name: str, format: str, block_size: int):
+        if "{number" not in format:
+            raise ValueError(f"Identifier format {format!r} has no {{number}} field")
+        format.format(number=1, check=0)  # Fail at startup on unknown fields
+        self.sequence = Sequence(sequence_name, metadata=Base.metadata)
+        self.format = format
+        self.block_size = max(1, block_size)
+        self._numbers: Deque[int] = deque()
+        self._lock = threading.Lock()
+
+    def format_number(self, number: int) -> str:
+        return self.format.format(number=number, check=luhn_check_digit(number))
+
+    def next_number(self, connection: Connection) -> int:
+        if not connection.dialect.supports_sequences:
+            return _next_counter_value(connection, self.sequence.name)
+        with self._lock:
+            if not self._numbers:
+                self._numbers.extend(self._reserve_block(connection))
+            return self._numbers.popleft()
+
+    def next_identifier(self, connection: Connection) -> str:
+        return self.format_number(self.next_number(connection))
+
+    def matches(self, identifier: str) -> bool:
+        """Whether `identifier` has this allocator's shape and a valid check digit."""
+        pattern = re.escape(self.format)
+        pattern = re.sub(r"\\\{number[^}]*\\\}", r"(?P<number>\\d+)", pattern)
+        pattern = re.sub(r"\\\{check[^}]*\\\}", r"(?P<check>\\d)", pattern)
+        match = re.fullmatch(pattern, identifier)
+        if not match:
+            return False
+        return self.format_number(int(match.group("number"))) == identifier
+
+    def reset(self):
+        """Drop reserved numbers; a forked child must not hand out its parent's block."""
+        self._numbers = deque()
+        self._lock = threading.Lock()
+
+    def _reserve_block(self, connection: Connection) -> list:
+        # nextval() is not transactional: the block stays reserved even if
+        # the insert that asked for it rolls back
+        series = func.generate_series(1, self.block_size).table_valued("n")
+        numbers = sorted(connection.execute(select(self.sequence.next_value()).select_from(series)).scalars())
+        logger.debug("Reserved %s numbers %s-%s from %s", len(numbers), numbers[0], numbers[-1], self.sequence.name)
+        return numbers
+
+
+patient_id_allocator = IdentifierAllocator("patient_id_seq", settings.PATIENT_ID_FORMAT, settings.ID_BLOCK_SIZE)
+hospital_reg_number_allocator = IdentifierAllocator(
+    "hospital_reg_number_seq", settings.HOSPITAL_REG_NUMBER_FORMAT, settings.ID_BLOCK_SIZE
+)
+
+
+def _reset_after_fork():
+    patient_id_allocator.reset()
+    hospital_reg_number_allocator.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
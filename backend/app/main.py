@@ -0,0 +1,203 @@
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+import logging
+import math
+import time
+
+from app.models import Base, create_default_roles
+from app.database import (
+    engine, replica_engine, SessionLocal, get_db, get_read_db, begin_request_routing, dispose_async_engine, pool_stats
+)
+from app.create_admin import create_admin_user
+from app.metrics import (
+    AUDIT_QUEUE_DEPTH, REQUEST_LATENCY, REQUEST_QUERIES, REQUESTS_IN_PROGRESS,
+    gauge_refresher, refresh_gauges, render_metrics, set_pool_gauges
+)
+from app.query_stats import (
+    begin_query_stats, check_budget, route_query_stats, QueryBudgetExceeded,
+    QUERY_COUNT_HEADER, QUERY_REPEAT_HEADER, QUERY_TIME_HEADER
+)
+
+# Import all v1 routes
+from .routes.v1 import (
+    patients, appointments, billing, clinical, mental_health, pharmacy, drug,
+    laboratory, occupational, nurses, social_work, notifications, export, doctors, admin, audit_logs
+)
+
+# Import all v2 routes
+from .routes.v2 import (
+    patients as patients_v2, appointments as appointments_v2, billing as billing_v2, async_reads
+)
+
+# Import all services
+from .services.dashboard_service import DashboardService
+from .services.report_service import ReportService
+from .services.notification_service import NotificationService
+from .services.audit_logger import AuditLogger, audit_log_writer
+from .services.export_jobs import export_job_manager
+from .services.drug_catalog import drug_catalog_cache
+from .services.report_assets import report_assets
+from .services.pdf_renderer import pdf_renderer
+from .services.password_hasher import password_hasher
+from .services.notification_outbox import notification_dispatcher
+from .services.department_notifications import department_event_hub
+from .config import settings
+
+# Setup logger
+logger = logging.getLogger("uvicorn.error")
+
+# Initialize the FastAPI app
+app = FastAPI(title="Renewal Ridge EMR API", version="1.0.0")
+
+# Read-your-writes: a request that writes, and the same client for
+# READ_YOUR_WRITES_SECONDS afterwards, reads from the primary, not the replica
+PRIMARY_PIN_COOKIE = "db_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+@app.middleware("http")
+async def route_reads(request: Request, call_next):
+    if replica_engine is None:
+        return await call_next(request)
+    try:
+        pinned_until = float(request.cookies.get(PRIMARY_PIN_COOKIE, 0))
+    except ValueError:
+        pinned_until = 0.0
+    routing = begin_request_routing(pinned=request.method not in SAFE_METHODS or pinned_until > time.time())
+    response = await call_next(request)
+    if (routing.wrote or request.method not in SAFE_METHODS) and response.status_code < 400:
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE,
+            str(time.time() + settings.READ_YOUR_WRITES_SECONDS),
+            max_age=math.ceil(settings.READ_YOUR_WRITES_SECONDS),
+            httponly=True,
+            secure=settings.ENVIRONMENT != "development",
+            samesite="lax" if settings.ENVIRONMENT == "development" else "none",
+        )
+    return response
+
+# Per-request SQL counts: logged (or, under ENVIRONMENT=test, raised) above
+# the QUERY_*_WARN thresholds, totalled per route, and sent back as headers
+# when QUERY_STATS_HEADERS is on
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    stats = begin_query_stats()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+    route_query_stats.add(f"{request.method} {route}", stats)
+    REQUEST_QUERIES.labels(request.method, route).observe(stats.count)
+    if settings.QUERY_STATS_HEADERS:
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers[QUERY_TIME_HEADER] = f"{stats.duration_ms:.1f}"
+        response.headers[QUERY_REPEAT_HEADER] = str(stats.max_repeat)
+    problems = check_budget(
+        stats, settings.QUERY_COUNT_WARN, settings.QUERY_REPEAT_WARN, settings.QUERY_TIME_WARN_MS
+    )
+    if problems:
+        message = f"{request.method} {route} over query budget: " + "; ".join(problems)
+        if settings.ENVIRONMENT == "test":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+# Request latency by route template and in-flight requests, for /metrics
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    in_progress = REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        REQUEST_LATENCY.labels(request.method, route, str(status)).observe(time.perf_counter() - start)
+        refresh_gauges()
+
+@gauge_refresher
+def refresh_app_gauges():
+    set_pool_gauges(pool_stats())
+    AUDIT_QUEUE_DEPTH.set(audit_log_writer.queue_depth)
+
+# Prometheus scrape endpoint; merged across gunicorn workers when
+# PROMETHEUS_MULTIPROC_DIR is set. Protected by METRICS_TOKEN when configured
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Initialize Services with database session injection
+def get_dashboard_service(db: Session = Depends(get_read_db)) -> DashboardService:
+    return DashboardService(db=db)
+
+def get_report_service(db: Session = Depends(get_read_db)) -> ReportService:
+    return ReportService(db=db)
+
+def get_notification_service(db: Session = Depends(get_db)) -> NotificationService:
+    return NotificationService(db=db)
+
+# Include the v1 routers
+app.include_router(patients.router, prefix="/v1/patients", tags=["patients"])
+app.include_router(appointments.router, prefix="/v1/appointments", tags=["appointments"])
+app.include_router(billing.router, prefix="/v1/billing", tags=["billing"])
+app.include_router(clinical.router, prefix="/v1/clinical", tags=["clinical"])
+app.include_router(mental_health.router, prefix="/v1/mental-health", tags=["mental_health"])
+app.include_router(pharmacy.router, prefix="/v1/pharmacy", tags=["pharmacy"])
+app.include_router(laboratory.router, prefix="/v1/laboratory", tags=["laboratory"])
+app.include_router(occupational.router, prefix="/v1/occupational", tags=["occupational"])
+app.include_router(nurses.router, prefix="/v1/nurses", tags=["nurses"])
+app.include_router(social_work.router, prefix="/v1/social-work", tags=["social_work"])
+app.include_router(notifications.router, prefix="/v1/notifications", tags=["notifications"])
+app.include_router(export.router, prefix="/v1/export", tags=["export"])
+app.include_router(doctors.router, prefix="/v1/doctors", tags=["doctors"])
+app.include_router(admin.router, prefix="/v1/admin", tags=["admin"])
+app.include_router(drug.router, prefix="/v1/drug", tags=["drug"])
+app.include_router(audit_logs.router, prefix="/v1/audit", tags=["audit"])
+
+# Include the v2 routers
+app.include_router(patients_v2.router, prefix="/v2/patients", tags=["patients"])
+app.include_router(appointments_v2.router, prefix="/v2/appointments", tags=["appointments"])
+app.include_router(billing_v2.router, prefix="/v2/billing", tags=["billing"])
+app.include_router(async_reads.router, prefix="/v2/async", tags=["async reads"])
+
+# Startup event to create the tables, default roles and admin user. Not done
+# at import: process pool workers import app.* modules and must stay light
+@app.on_event("startup")
+async def startup():
+    # Ensure that all tables are created on startup
+    Base.metadata.create_all(bind=engine)
+    audit_log_writer.start()
+    report_assets.load()
+    drug_catalog_cache.start_listener(settings.DRUG_CATALOG_LISTEN_URL or settings.DATABASE_URL)
+    department_event_hub.start_listener(settings.NOTIFICATION_LISTEN_URL or settings.DATABASE_URL)
+    if settings.NOTIFICATION_DISPATCHER:
+        notification_dispatcher.start()
+    db = SessionLocal()
+    try:
+        # Create default roles
+        create_default_roles(db)
+
+        # Create admin user, now passing db
+        create_admin_user(db)
+
+    except Exception as e:
+        logger.error(f"Error during startup: {e}")
+        raise HTTPException(status_code=500, detail="Failed to initialize default roles or admin user")
+    finally:
+        db.close()
+
+# Shutdown event for cleanup
+@app.on_event("shutdown")
+async def shutdown():
+    export_job_manager.shutdown()
+    pdf_renderer.shutdown()
+    password_hasher.shutdown()
+    notification_dispatcher.shutdown()
+    department_event_hub.stop_listener()
+    drug_catalog_cache.stop_listener()
+    audit_log_writer.shutdown()
+    await dispose_async_engine()
@@ -0,0 +1,116 @@
+# Prometheus metrics. Under gunicorn every worker is its own process, so
+# when PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py) each process
+# writes its samples to files in that directory and /metrics merges them,
+# whichever worker serves the scrape. Without it the default in-process
+# registry is served, which is right for a single uvicorn process.
+import os
+from typing import Callable, Dict, List, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Label-less gauges open their sample file as soon as they are defined below.
+# gunicorn.conf.py creates the directory for the API, but scripts run from the
+# same image (e.g. send_appointment_reminders.py) inherit the variable too
+if os.environ.get(MULTIPROC_DIR_ENV):
+    os.makedirs(os.environ[MULTIPROC_DIR_ENV], exist_ok=True)
+
+# Latency buckets (seconds) for API requests and for slower background work
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "API request latency by route template",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled right now", ["method"], multiprocess_mode="livesum",
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request by route template",
+    ["method", "route"], buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pooled connections per engine by state (checked_out, idle, overflow)",
+    ["engine", "state"], multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a connection from the pool",
+    ["engine"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection", ["engine"],
+)
+
+AUDIT_QUEUE_DEPTH = Gauge(
+    "audit_log_queue_depth", "Audit events waiting to be written", multiprocess_mode="livesum",
+)
+
+PDF_RENDER_SECONDS = Histogram(
+    "pdf_render_seconds", "Time to render a PDF, including waiting for the render pool",
+    ["kind"], buckets=REQUEST_BUCKETS,
+)
+PDF_RENDER_FAILURES = Counter(
+    "pdf_render_failures_total", "PDF renders rejected or timed out", ["kind", "reason"],
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth", "Password hash/verify operations queued or running", multiprocess_mode="livesum",
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Time to hash or verify a password, including waiting for the pool",
+    ["operation"], buckets=REQUEST_BUCKETS,
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Password operations refused because the hashing queue was full", ["operation"],
+)
+
+NOTIFICATIONS_SENT = Counter(
+    "notifications_sent_total", "Outbox delivery attempts by outcome (sent, retry, failed)", ["channel", "result"],
+)
+
+NOTIFICATION_STREAM_SUBSCRIBERS = Gauge(
+    "notification_stream_subscribers", "Open department notification streams", multiprocess_mode="livesum",
+)
+
+EXPORT_JOB_SECONDS = Histogram(
+    "export_job_duration_seconds", "Background export job run time", ["kind", "status"], buckets=JOB_BUCKETS,
+)
+
+# Callables that refresh gauges from in-process state. They run after every
+# request, so each worker keeps its own share of a livesum gauge current
+_gauge_refreshers: List[Callable[[], None]] = []
+
+
+def gauge_refresher(function: Callable[[], None]) -> Callable[[], None]:
+    _gauge_refreshers.append(function)
+    return function
+
+
+def refresh_gauges():
+    for refresh in _gauge_refreshers:
+        refresh()
+
+
+def set_pool_gauges(stats: Dict[str, Dict]):
+    for engine, pool in stats.items():
+        if "checked_out" not in pool:
+            continue
+        DB_POOL_CONNECTIONS.labels(engine, "checked_out").set(pool["checked_out"])
+        DB_POOL_CONNECTIONS.labels(engine, "idle").set(pool["checked_in"])
+        DB_POOL_CONNECTIONS.labels(engine, "overflow").set(max(0, pool["overflow"]))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The exposition text for a scrape, merged across workers in multiprocess mode."""
+    refresh_gauges()
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
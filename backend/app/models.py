@@ -1,4 +1,4 @@
-from sqlalchemy import Column, JSON, Integer, String, Date, DateTime, Float, ForeignKey, Text, DECIMAL, Numeric, Table, event, Enum, Boolean
+from sqlalchemy import Column, JSON, Integer, String, Date, DateTime, Float, ForeignKey, Text, DECIMAL, Numeric, Table, event, Enum, Boolean, UniqueConstraint, Index, Identity
 
 from .enums import FeeTypeEnum, PaymentStatusEnum # Use relative import
 from sqlalchemy.dialects.postgresql import ARRAY
@@ -9,12 +9,12 @@ from sqlalchemy.orm import validates
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timedelta
 from decimal import Decimal
-from passlib.context import CryptContext
 from app.database import Base  # This should be a single import point for the Base class
+from app.id_allocator import hospital_reg_number_allocator, patient_id_allocator
+from app.services.password_hasher import password_hasher
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 import random
-import string
 import json
 
 # Many-to-Many Association Table for User and Roles (Allowing multiple roles for each user)
@@ -42,12 +42,12 @@ class User(Base):
     doctor = relationship("Doctor", back_populates="user", uselist=False)
 
     def set_password(self, password: str):
-        """Hash the password before saving it."""
-        self.password_hash = pwd_context.hash(password)
+        """Hash the password (in the hashing pool) before saving it."""
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password: str):
-        """Verify the given password against the stored hash."""
-        return pwd_context.verify(password, self.password_hash)
+        """Verify the given password against the stored hash (in the hashing pool)."""
+        return password_hasher.verify(password, self.password_hash)
 
     def __repr__(self):
         return f"User(username={self.username}, full_name={self.full_name})"
@@ -148,22 +148,18 @@ class Patient(Base):
 def generate_ids(mapper, connection, target):
     # Ensure patient_id and hospital_reg_number are set before the insert
     if not target.patient_id:  # If patient_id is not already set
-        target.patient_id = generate_patient_id(target.id)
+        target.patient_id = generate_patient_id(connection)
     
     if not target.hospital_reg_number:  # If hospital_reg_number is not set
-        target.hospital_reg_number = generate_hospital_reg_number(target.id)
+        target.hospital_reg_number = generate_hospital_reg_number(connection)
 
-# Function to generate patient_id (Example)
-def generate_patient_id(patient_id):
-    # We can't use the patient_id during 'before_insert' as it's None. So we can use a fallback.
-    # Example: Concatenate a random string with a prefix
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f"PAT-{random_str}"  # Format without using target.id
+# Function to generate patient_id from the patient_id_seq sequence, e.g. PAT-00000018
+def generate_patient_id(connection):
+    return patient_id_allocator.next_identifier(connection)
 
-# Function to generate hospital_reg_number (Example)
-def generate_hospital_reg_number(patient_id):
-    # Example: Generate a hospital registration number with a fallback logic.
-    return f"REG-{random.randint(10000, 99999)}"  # Use a random number instead of patient_id
+# Function to generate hospital_reg_number from the hospital_reg_number_seq sequence
+def generate_hospital_reg_number(connection):
+    return hospital_reg_number_allocator.next_identifier(connection)
 
 
 # Drug Model
@@ -201,6 +197,33 @@ class Stock(Base):
     def is_available(self, requested_quantity):
         return self.quantity >= requested_quantity
 
+# Append-only stock ledger; see services/stock_service.py
+class StockMovement(Base):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (Index('ix_stock_movements_drug_id_id', 'drug_id', 'id'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    drug_id = Column(Integer, ForeignKey('drugs.id', ondelete="CASCADE"), nullable=False)
+    movement_type = Column(String(20), nullable=False)  # 'receipt', 'dispense', 'sale', 'adjustment'
+    quantity = Column(Integer, nullable=False)  # Signed change: positive adds stock, negative removes it
+    reference = Column(String(100), nullable=True)  # e.g. "pharmacy_record:42", "walkin:WALKIN-..."
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<StockMovement(drug_id={self.drug_id}, type={self.movement_type}, quantity={self.quantity})>"
+
+# Stock level of a drug after all movements up to last_movement_id
+class StockSnapshot(Base):
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (Index('ix_stock_snapshots_drug_id_taken_at', 'drug_id', 'taken_at'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    drug_id = Column(Integer, ForeignKey('drugs.id', ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    last_movement_id = Column(Integer, nullable=False, default=0)
+    taken_at = Column(DateTime, nullable=False)
+
 class PharmacyRecord(Base):
     __tablename__ = 'pharmacy_records'
 
@@ -257,14 +280,19 @@ class PharmacyRecord(Base):
 # Appointment model
 class Appointment(Base):
     __tablename__ = 'appointments'
+    # Serves the calendar's date-window scans (app/services/appointment_calendar.py)
+    __table_args__ = (Index('ix_appointments_appointment_date_patient_id', 'appointment_date', 'patient_id'),)
 
-    appointment_id = Column(Integer, primary_key=True, autoincrement=True)
+    # Assigned by the database (identity column), never computed by the app
+    appointment_id = Column(Integer, Identity(), primary_key=True)
     patient_id = Column(String, ForeignKey('patients.patient_id'), nullable=False)
     appointment_date = Column(DateTime, nullable=False)
     reason_for_visit = Column(String, nullable=True)
     diagnosis = Column(String, nullable=True)
     treatment_plan = Column(String, nullable=True)
     notes = Column(Text, nullable=True)
+    # When the reminder was queued (app/services/appointment_reminders.py); cleared on reschedule
+    reminder_sent_at = Column(DateTime, nullable=True)
 
     patient = relationship("Patient", back_populates="appointments")
 
@@ -367,7 +395,8 @@ class Billing(Base):
     def generate_invoice(self):
         """Generate invoice number and update invoice status."""
         if not self.invoice_number:
-            self.invoice_number = f"INV-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+            # The billing id keeps invoices created in the same second distinct
+            self.invoice_number = f"INV-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{self.billing_id}"
             self.invoice_date = datetime.utcnow()
             self.invoice_status = 'generated'
         return self.invoice_number
@@ -377,6 +406,13 @@ class Billing(Base):
         if self.invoice_status == 'generated':
             self.invoice_status = 'sent'
 
+    def update_payment_status(self):
+        """Mark the billing as Paid once recorded payments cover the total bill."""
+        total_paid = sum((payment.amount_paid or Decimal('0.00')) for payment in self.payments)
+        if self.status != "Paid" and self.total_bill and total_paid >= self.total_bill:
+            self.status = "Paid"
+        return self.status
+
 
 class PaymentHistory(Base):
     __tablename__ = 'payment_histories'
@@ -407,6 +443,22 @@ class PaymentHistory(Base):
     def __repr__(self):
         return f"<PaymentHistory(billing_id={self.billing_id}, amount_paid={self.amount_paid}, payment_date={self.payment_date})>"
 
+# Daily revenue rollup, maintained by services/revenue_rollup.py
+class DailyRevenue(Base):
+    __tablename__ = 'daily_revenue'
+    __table_args__ = (UniqueConstraint('day', 'doctor_id', 'fee_type', name='uq_daily_revenue_day_doctor_fee_type'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False, index=True)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete="CASCADE"), nullable=False)
+    fee_type = Column(String(50), nullable=False)  # FeeTypeEnum value, or 'total' for the whole billing
+    revenue = Column(Numeric(12, 2), nullable=False, default=Decimal('0.00'))
+    billing_count = Column(Integer, nullable=False, default=0)
+    payments_received = Column(Numeric(12, 2), nullable=False, default=Decimal('0.00'))  # 'total' rows only
+
+    def __repr__(self):
+        return f"<DailyRevenue(day={self.day}, doctor_id={self.doctor_id}, fee_type={self.fee_type}, revenue={self.revenue})>"
+
 # Mental Health model
 class MentalHealthNote(Base):
     __tablename__ = 'mental_health'
@@ -515,15 +567,50 @@ class NursesNote(Base):
 # Notification model
 class Notification(Base):
     __tablename__ = "notifications"
+    # Department catch-up queries (receiver_departments @> ARRAY[...]); see services/department_notifications.py
+    __table_args__ = (Index('ix_notifications_receiver_departments', 'receiver_departments', postgresql_using='gin'),)
 
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))  # Who sent the notification
-    receiver_departments = Column(ARRAY(String), nullable=False)  # Multiple departments
+    receiver_departments = Column(ARRAY(String).with_variant(JSON, "sqlite"), nullable=False)  # Multiple departments (JSON on a SQLite stand-in)
     message = Column(String, nullable=False)
     responses = Column(JSON, default=[])  # Stores responses as JSON list
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
 
+# Append-only log of department notification activity; its ids are the
+# resume cursor of the notification stream (services/department_notifications.py)
+class NotificationEvent(Base):
+    __tablename__ = "notification_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # 'created' or 'response'
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    notification = relationship("Notification")
+
+# Transactional outbox of outgoing email/SMS; see services/notification_outbox.py
+class NotificationOutbox(Base):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    channel = Column(String(10), nullable=False)  # 'email' or 'sms'
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=True)
+    body = Column(Text, nullable=False)
+    dedupe_key = Column(String(255), nullable=True, unique=True)  # Enqueueing the same key twice sends once
+    status = Column(String(10), nullable=False, default="pending")  # 'pending', 'sending', 'sent', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Due time, or lease expiry while sending
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificationOutbox(id={self.id}, channel={self.channel}, status={self.status})>"
+
 # Laboratory Record model
 class LaboratoryRecord(Base):
     __tablename__ = 'laboratory_records'
@@ -621,10 +708,6 @@ class SocialWorkRecord(Base):
         return self.billing.calculate_total_bill() if self.billing else Decimal('0.00')
 
 
-# Define the password context for password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 
 # 2. Role Model
 class Role(Base):
@@ -0,0 +1,112 @@
+# app/pagination.py
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Date, DateTime, Numeric, literal, tuple_
+
+# Response header carrying the opaque cursor for the next page
+CURSOR_HEADER = "X-Next-Cursor"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort-key values of the last row into an opaque cursor."""
+    payload = []
+    for value in values:
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload.append(value)
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    """Decode a cursor back into typed values for the given sort columns."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match sort key")
+        return [_restore(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _restore(value, column):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, Numeric):
+        return Decimal(value)
+    return value
+
+
+def keyset_paginate(
+    query,
+    columns: Sequence,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    descending: bool = False,
+):
+    """
+    Return one page of `query` ordered by `columns` plus the cursor of the next page.
+
+    `columns` must form a unique, stable sort key (end it with the primary key).
+    Rows are located with a row-value comparison on the key instead of OFFSET,
+    so deep pages cost the same as the first and no COUNT(*) is issued.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        bound = tuple_(*[literal(value, type_=column.type) for value, column in zip(values, columns)])
+        query = query.filter(key < bound if descending else key > bound)
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return rows, next_cursor
+
+
+def paginate_list(
+    query,
+    response: Response,
+    columns: Sequence,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = False,
+) -> List:
+    """
+    Opt-in keyset pagination for endpoints that return a plain list.
+
+    Without `cursor` or `limit` the full ordered result is returned as before.
+    Otherwise one page is returned and the next cursor is sent in the
+    X-Next-Cursor header (absent on the last page).
+    """
+    if cursor is None and limit is None:
+        ordering = [column.desc() if descending else column.asc() for column in columns]
+        return query.order_by(*ordering).all()
+
+    rows, next_cursor = keyset_paginate(
+        query, columns, cursor=cursor, limit=limit or DEFAULT_PAGE_SIZE, descending=descending
+    )
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return rows
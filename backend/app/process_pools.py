@@ -0,0 +1,22 @@
+# Shared settings of the CPU process pools (password hashing, PDF rendering,
+# exports). Each gunicorn worker owns its pools, so a pool's default size is
+# this worker's share of the host's cores, not all of them.
+import multiprocessing
+import os
+
+from app.config import settings
+
+
+def pool_context():
+    """
+    Start method for pool processes. The API worker already runs background
+    threads (audit writer, LISTEN listeners, notification dispatcher) and
+    holds pooled database connections, none of which survive a fork intact,
+    so pool processes are started from a clean forkserver by default.
+    """
+    return multiprocessing.get_context(settings.PROCESS_POOL_START_METHOD)
+
+
+def cores_per_worker() -> int:
+    """This worker's share of the host's cores (at least one)."""
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WEB_CONCURRENCY))
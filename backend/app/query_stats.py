@@ -0,0 +1,181 @@
+# Per-request SQL instrumentation: how many statements a request ran, how
+# long they took, and which statement shapes repeated (the N+1 signature of
+# a lazy load inside a loop). Counting hooks into every Engine through
+# cursor events; the request middleware in app/main opens a QueryStats
+# per request and reports it.
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Response headers set when QUERY_STATS_HEADERS is on
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Time-Ms"
+QUERY_REPEAT_HEADER = "X-DB-Max-Repeat"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|\?|:\w+|\$\d+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """The shape of a statement: literals, parameters and IN lists collapsed, so N+1 loads look alike."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _POSTCOMPILE.sub("(?)", shape)
+    shape = _PARAMETER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Statements run by one request (or one query_budget block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        shape = fingerprint(statement)
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[shape] += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration * 1000
+
+    @property
+    def max_repeat(self) -> int:
+        return max(self.fingerprints.values(), default=0)
+
+    def repeated(self, threshold: int = 2) -> List[Tuple[str, int]]:
+        """Statement shapes run at least `threshold` times, most frequent first."""
+        return [(shape, n) for shape, n in self.fingerprints.most_common() if n >= threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or query_budget block ran more SQL than allowed."""
+
+
+class RouteQueryStats:
+    """Totals per route for this worker, for the admin endpoint and metrics."""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, route: str, stats: QueryStats):
+        with self._lock:
+            totals = self._routes.setdefault(route, {
+                "requests": 0, "queries": 0, "db_seconds": 0.0, "max_queries": 0, "max_repeat": 0,
+            })
+            totals["requests"] += 1
+            totals["queries"] += stats.count
+            totals["db_seconds"] += stats.duration
+            totals["max_queries"] = max(totals["max_queries"], stats.count)
+            totals["max_repeat"] = max(totals["max_repeat"], stats.max_repeat)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {route: dict(totals) for route, totals in self._routes.items()}
+
+
+route_query_stats = RouteQueryStats()
+
+# The QueryStats of the current request. A mutable object rather than a
+# counter, because sync dependencies and endpoints run in threadpool copies
+# of the context
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def begin_query_stats() -> QueryStats:
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def check_budget(stats: QueryStats, max_queries: Optional[int] = None, max_repeat: Optional[int] = None,
+                 max_ms: Optional[float] = None) -> List[str]:
+    """Human-readable reasons `stats` is over budget (empty when within it)."""
+    problems = []
+    if max_queries is not None and stats.count > max_queries:
+        problems.append(f"{stats.count} queries (budget {max_queries})")
+    if max_ms is not None and stats.duration_ms > max_ms:
+        problems.append(f"{stats.duration_ms:.1f} ms in the database (budget {max_ms:.0f} ms)")
+    if max_repeat is not None:
+        for shape, n in stats.repeated(max_repeat + 1):
+            problems.append(f"{n}x {shape[:200]}")
+    return problems
+
+
+@contextmanager
+def query_budget(max_queries: Optional[int] = None, max_repeat: Optional[int] = None, max_ms: Optional[float] = None):
+    """
+    Count the SQL run inside the block and raise QueryBudgetExceeded when it
+    goes over budget. Meant for tests of services and helpers:
+
+        with query_budget(max_queries=12, max_repeat=1):
+            DashboardService(db).get_patient_dashboard_data("P1")
+
+    Requests through the app are checked by the middleware instead, which
+    raises over the QUERY_*_WARN thresholds when ENVIRONMENT is "test".
+    """
+    outer = _current.get()
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if outer is not None:
+            with outer._lock:
+                outer.count += stats.count
+                outer.duration += stats.duration
+                outer.fingerprints.update(stats.fingerprints)
+    problems = check_budget(stats, max_queries, max_repeat, max_ms)
+    if problems:
+        raise QueryBudgetExceeded("Query budget exceeded: " + "; ".join(problems))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_stats_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("query_stats_start")
+    if stats is not None and starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_failed_statement(context):
+    # Only failures of a statement that before_cursor_execute already timed
+    if context.connection is None or context.execution_context is None or context.is_pre_ping:
+        return
+    starts = context.connection.info.get("query_stats_start")
+    if starts:
+        starts.pop()
@@ -2,24 +2,29 @@ import logging
 from fastapi import APIRouter, HTTPException, Depends, Query, status, Request
 from pydantic import ValidationError
 
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
 
 from sqlalchemy.exc import SQLAlchemyError
-from app.models import User, Role, Doctor, Staff, Nurse, Drug, Stock, AuditLog
+from app.models import User, Role, Doctor, Staff, Nurse, Drug, Stock
 from app.schemas import (
     UserCreate, UserUpdate, UserOut, PasswordChange,
     RoleCreate, RoleUpdate, RoleOut,
     DoctorCreate, DoctorUpdate, DoctorOut,
     StaffCreate, StaffUpdate, StaffOut,
     NurseCreate, NurseUpdate, NurseOut, UserLogin,
-    DrugOut, DrugCreate, DrugUpdate, StockResponse, StockUpdate
+    DrugOut, DrugCreate, DrugUpdate, StockResponse, StockUpdate, DrugOrder
 )
-from app.database import get_db
+from app.database import get_db, pool_stats
+from app.query_stats import route_query_stats
+from app.services.audit_logger import audit_log_writer
+from app.services.drug_catalog import drug_catalog_cache
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import Principal, principal_cache
+from app.services.stock_service import StockLedger, StockReservationService, InsufficientStockError, SALE
 from typing import List, Optional
-from passlib.context import CryptContext
 import jwt
 
 # Setup Logger
@@ -36,16 +41,12 @@ ALGORITHM = "HS256"
 
 router = APIRouter()
 
-# Initialize the password hashing context
-# Initialize the password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/admin/v1/auth/login")
 
-# Function to hash a password
+# Function to hash a password (runs in the hashing pool)
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 # Helper function to handle database errors
 def handle_db_error(e: Exception, action: str):
@@ -77,8 +78,10 @@ def decode_token(token: str):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-# Dependency to get the current user from the JWT token
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Dependency to get the current user from the JWT token. Returns a cached
+# Principal (id, username, full_name, role names), not the ORM User; load the
+# User explicitly when the handler needs to change it
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -92,29 +95,43 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except jwt.PyJWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    principal = principal_cache.get(db, username)
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
+
+def _load_login_user(db: Session, username: str) -> Optional[User]:
+    return db.query(User).options(joinedload(User.roles)).filter(User.username == username).first()
 
-# Login Endpoint
+def _store_rehashed_password(db: Session, db_user: User, password_hash: str):
+    try:
+        db_user.password_hash = password_hash
+        db.commit()
+    except SQLAlchemyError as e:
+        # The old hash still works; try again at the next login
+        db.rollback()
+        logger.warning(f"Could not store rehashed password for user {db_user.username}: {e}")
+
+# Login Endpoint. Async so that waiting for bcrypt in the hashing pool does not
+# hold a threadpool thread; the database work is handed to the threadpool
 @router.post("/v1/auth/login")
-def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
-    # Fetch the user from the database
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
+    # Fetch the user (with roles) from the database
+    db_user = await run_in_threadpool(_load_login_user, db, user.username)
 
     # Check if the user exists and the password is correct
-    if not db_user or not pwd_context.verify(user.password, db_user.password_hash):
+    valid, new_hash = False, None
+    if db_user:
+        valid, new_hash = await password_hasher.verify_and_update_async(user.password, db_user.password_hash)
+    if not valid:
         # Log failed login attempt
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="login_failed",
             user_id=db_user.id if db_user else None,
             description=f"Failed login attempt for username: {user.username}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
@@ -130,18 +147,16 @@ def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
     access_token = create_access_token(data=user_data)
 
     # Log successful login
-    audit_log = AuditLog(
+    audit_log_writer.enqueue(
         action="login_success",
         user_id=db_user.id,
         description=f"User logged in successfully",
         ip_address=request.client.host,
         user_agent=request.headers.get("user-agent")
     )
-    db.add(audit_log)
-    db.commit()
 
-    # Return response with token
-    return {
+    # Response with token (built before the commit below expires db_user)
+    body = {
         "success": True,
         "access_token": access_token,
         "token_type": "bearer",
@@ -153,29 +168,36 @@ def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
         },
     }
 
+    # Hashed with a different cost than BCRYPT_ROUNDS: store the fresh hash
+    if new_hash:
+        await run_in_threadpool(_store_rehashed_password, db, db_user, new_hash)
+
+    return body
+
 # Password Change Endpoint
 @router.put("/users/change-password")
 def change_password(
     password_data: PasswordChange,
     request: Request,  # Move this up
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     try:
         logger.info(f"Attempting to change password for user: {current_user.username}")
-        
+        user = db.query(User).filter(User.id == current_user.id).first()
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
         # Verify the current password
-        if not current_user.verify_password(password_data.current_password):
+        if not user.verify_password(password_data.current_password):
             # Log failed password change attempt
-            audit_log = AuditLog(
+            audit_log_writer.enqueue(
                 action="password_change_failed",
                 user_id=current_user.id,
                 description="Incorrect current password provided",
                 ip_address=request.client.host,
                 user_agent=request.headers.get("user-agent")
             )
-            db.add(audit_log)
-            db.commit()
             
             logger.warning(f"Failed password change attempt for user: {current_user.username}")
             raise HTTPException(status_code=400, detail="Current password is incorrect")
@@ -183,32 +205,29 @@ def change_password(
         # Validate the new password
         if len(password_data.new_password) < 8:
             # Log invalid new password attempt
-            audit_log = AuditLog(
+            audit_log_writer.enqueue(
                 action="password_change_rejected",
                 user_id=current_user.id,
                 description="New password too short (less than 8 characters)",
                 ip_address=request.client.host,
                 user_agent=request.headers.get("user-agent")
             )
-            db.add(audit_log)
-            db.commit()
             
             logger.warning(f"New password too short for user: {current_user.username}")
             raise HTTPException(status_code=400, detail="New password must be at least 8 characters long")
 
         # Update the password
-        current_user.set_password(password_data.new_password)
+        user.set_password(password_data.new_password)
+        db.commit()
         
         # Log successful password change
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="password_changed",
             user_id=current_user.id,
             description="Password changed successfully",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.info(f"Password successfully changed for user: {current_user.username}")
 
@@ -287,9 +306,26 @@ def get_users(
 
 # Get Current User Details
 @router.get("/users/me", response_model=UserOut)
-def get_current_user_details(current_user: User = Depends(get_current_user)):
+def get_current_user_details(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Fetching details for user: {current_user.username} (ID: {current_user.id})")
-    return current_user
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+# Connection pool sizes and checkout wait times of this worker
+@router.get("/db/pool")
+def get_pool_stats(current_user: Principal = Depends(get_current_user)):
+    if not current_user.has_role("Admin"):
+        raise HTTPException(status_code=403, detail="Only admin users can view pool statistics")
+    return pool_stats()
+
+# SQL statements per route in this worker (see app/query_stats.py)
+@router.get("/db/query-stats")
+def get_query_stats(current_user: Principal = Depends(get_current_user)):
+    if not current_user.has_role("Admin"):
+        raise HTTPException(status_code=403, detail="Only admin users can view query statistics")
+    return route_query_stats.snapshot()
 
 @router.get("/users/{user_id}", response_model=UserOut)
 def get_user(user_id: int, db: Session = Depends(get_db)):
@@ -313,6 +349,7 @@ def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
         if not db_user:
             logger.warning(f"User with ID {user_id} not found")
             raise HTTPException(status_code=404, detail="User not found")
+        previous_username = db_user.username
 
         # Update user fields
         for key, value in user.dict(exclude_unset=True).items():
@@ -327,6 +364,7 @@ def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
             db_user.roles = roles
 
         db.commit()
+        principal_cache.invalidate(previous_username)
         db.refresh(db_user)
         return UserOut.from_orm(db_user)
     except SQLAlchemyError as e:
@@ -346,6 +384,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="User not found")
         db.delete(db_user)
         db.commit()
+        principal_cache.invalidate(db_user.username)
         logger.info(f"User with ID {user_id} deleted successfully")
     except SQLAlchemyError as e:
         db.rollback()
@@ -370,6 +409,7 @@ def create_drug(drug: DrugCreate, db: Session = Depends(get_db)):
 
         db_drug = Drug(**drug_data)
         db.add(db_drug)
+        drug_catalog_cache.invalidate(db)
         db.commit()
         db.refresh(db_drug)
 
@@ -394,35 +434,8 @@ def create_drug(drug: DrugCreate, db: Session = Depends(get_db)):
 @router.get("/v1/admin/drugs/", response_model=List[DrugOut])
 def get_drugs(db: Session = Depends(get_db)):
     try:
-        # Fetch drugs and their total stock in one optimized query
-        drugs = (
-            db.query(
-                Drug,
-                func.coalesce(func.sum(Stock.quantity), 0).label("total_stock")  # Calculate total stock
-            )
-            .outerjoin(Stock, Drug.id == Stock.drug_id)  # Join with Stock table
-            .group_by(Drug.id)
-            .all()
-        )
-
-        # Format results properly
-        drugs_with_stock = [
-            DrugOut(
-                id=drug.id,
-                name=drug.name,
-                description=drug.description,
-                dosage=drug.dosage,
-                instructions=drug.instructions,
-                prescribed_date=drug.prescribed_date,
-                price=drug.price,
-                is_active=bool(drug.is_active),
-                expiration_date=drug.expiration_date,
-                total_stock=total_stock  # Computed dynamically
-            )
-            for drug, total_stock in drugs
-        ]
-
-        return drugs_with_stock
+        # Served from the per-worker catalog cache (drugs with summed stock)
+        return drug_catalog_cache.drugs(db)
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -437,6 +450,7 @@ def update_drug(drug_id: int, drug: DrugUpdate, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Drug not found")
         for key, value in drug.dict(exclude_unset=True).items():
             setattr(db_drug, key, value)
+        drug_catalog_cache.invalidate(db)
         db.commit()
         db.refresh(db_drug)
         return DrugOut.from_orm(db_drug)
@@ -455,6 +469,7 @@ def delete_drug(drug_id: int, db: Session = Depends(get_db)):
         if not db_drug:
             raise HTTPException(status_code=404, detail="Drug not found")
         db.delete(db_drug)
+        drug_catalog_cache.invalidate(db)
         db.commit()
     except SQLAlchemyError as e:
         db.rollback()
@@ -473,12 +488,12 @@ def update_stock(drug_id: int, stock_update: StockUpdate, db: Session = Depends(
         if not db_stock:
             raise HTTPException(status_code=404, detail="Stock not found for given drug")
 
-        # If the stock_update contains a quantity, increment the current stock quantity by the new quantity
+        # If the stock_update contains a quantity, apply it and record it in the stock ledger
         if stock_update.quantity:
-            db_stock.quantity += stock_update.quantity  # Increment the stock
-
-        # Update the last_updated field to current time
-        db_stock.last_updated = datetime.utcnow()
+            StockLedger(db).adjust(drug_id, stock_update.quantity)
+        else:
+            # Update the last_updated field to current time
+            db_stock.last_updated = datetime.utcnow()
 
         # Commit changes to the database
         db.commit()
@@ -502,15 +517,11 @@ def sell_drug(drug_id: int, stock_update: StockUpdate, db: Session = Depends(get
         if not db_stock:
             raise HTTPException(status_code=404, detail="Stock not found for given drug")
         
-        # Check if there is enough stock to sell
-        if db_stock.quantity < stock_update.quantity:
+        # Lock, check and decrease the stock, recording the sale in the stock ledger
+        try:
+            StockReservationService(db).reserve([DrugOrder(drug_id=drug_id, quantity=stock_update.quantity)], SALE)
+        except InsufficientStockError:
             raise HTTPException(status_code=400, detail="Not enough stock to sell")
-        
-        # Decrease the stock by the quantity sold
-        db_stock.quantity -= stock_update.quantity
-
-        # Update the last_updated field to current time
-        db_stock.last_updated = datetime.utcnow()
 
         # Commit changes to the database
         db.commit()
@@ -576,6 +587,8 @@ def update_role(role_id: int, role: RoleUpdate, db: Session = Depends(get_db)):
         for key, value in role.dict(exclude_unset=True).items():
             setattr(db_role, key, value)
         db.commit()
+        # Role names are part of every principal holding the role
+        principal_cache.invalidate()
         db.refresh(db_role)
         return RoleOut.from_orm(db_role)
     except SQLAlchemyError as e:
@@ -593,6 +606,7 @@ def delete_role(role_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Role not found")
         db.delete(db_role)
         db.commit()
+        principal_cache.invalidate()
         logger.info(f"Role with ID {role_id} deleted successfully")
     except SQLAlchemyError as e:
         db.rollback()
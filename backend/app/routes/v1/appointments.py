@@ -1,23 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import date
 import uuid
 
 from app.models import Appointment, Patient
 from app.schemas import AppointmentCreate, AppointmentUpdate, AppointmentOut, PatientOut
 from app.database import get_db
+from app.pagination import paginate_list, CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.appointment_calendar import AppointmentCalendarService
 from sqlalchemy import String
 
 router = APIRouter()
 
-# Helper function to generate unique appointment ID (as an integer)
-def generate_appointment_id(db: Session):
-    last_appointment = db.query(Appointment).order_by(Appointment.appointment_id.desc()).first()
-    if last_appointment:
-        return last_appointment.appointment_id + 1  # Increment from the last appointment ID
-    return 1  # Start from 1 if no appointments exist
-
 # POST: Add an appointment for a specific patient
 @router.post("/v1/patients/{patient_id}/appointments", response_model=AppointmentOut)
 def add_appointment_for_patient(patient_id: str, appointment: AppointmentCreate, db: Session = Depends(get_db)):
@@ -27,9 +22,8 @@ def add_appointment_for_patient(patient_id: str, appointment: AppointmentCreate,
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
 
-        # Create the appointment and link it to the patient
+        # Create the appointment and link it to the patient (appointment_id is assigned by the database)
         new_appointment = Appointment(
-            appointment_id=generate_appointment_id(db),  # Generate unique appointment ID
             patient_id=patient_id,  # Link to the patient using the patient_id from URL
             appointment_date=appointment.appointment_date,
             reason_for_visit=appointment.reason_for_visit,
@@ -52,7 +46,13 @@ def add_appointment_for_patient(patient_id: str, appointment: AppointmentCreate,
 
 # GET: Retrieve all appointments for a specific patient
 @router.get("/v1/patients/{patient_id}/appointments", response_model=List[AppointmentOut])
-def get_appointments_for_patient(patient_id: str, db: Session = Depends(get_db)):
+def get_appointments_for_patient(
+    patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     try:
         # Ensure that patient exists
         patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
@@ -60,7 +60,8 @@ def get_appointments_for_patient(patient_id: str, db: Session = Depends(get_db))
             raise HTTPException(status_code=404, detail="Patient not found")
 
         # Retrieve all appointments linked to the patient
-        appointments = db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
+        query = db.query(Appointment).filter(Appointment.patient_id == patient_id)
+        appointments = paginate_list(query, response, [Appointment.appointment_id], cursor, limit)
 
         if not appointments:
             raise HTTPException(status_code=404, detail="No appointments found for this patient")
@@ -70,6 +71,25 @@ def get_appointments_for_patient(patient_id: str, db: Session = Depends(get_db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving appointments for patient: {str(e)}")
 
+# GET: Calendar view (day or week) of appointments, optionally for one clinician or patient
+@router.get("/calendar", response_model=List[AppointmentOut])
+def get_appointment_calendar(
+    response: Response,
+    view: str = "day",
+    day: Optional[date] = Query(None, alias="date"),
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    appointments, next_cursor = AppointmentCalendarService(db).view(
+        view, day or date.today(), doctor_id=doctor_id, patient_id=patient_id, cursor=cursor, limit=limit
+    )
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return appointments
+
 # GET: Retrieve an appointment by appointment_id
 @router.get("/{appointment_id}", response_model=AppointmentOut)
 def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
@@ -78,18 +98,28 @@ def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Appointment not found")
     return appointment  # Return the found appointment
 
-# GET: Retrieve all appointments with filter type (upcoming/past)
+# GET: Retrieve appointments with filter type (upcoming/past). Upcoming and
+# past are always paged (soonest / most recent first); 'all' pages when asked to
 @router.get("/", response_model=List[AppointmentOut])
-def get_all_appointments(filter_type: str = 'all', db: Session = Depends(get_db)):
-    query = db.query(Appointment)
-
-    if filter_type == 'past':
-        query = query.filter(Appointment.appointment_date < datetime.now())
-    elif filter_type == 'upcoming':
-        query = query.filter(Appointment.appointment_date >= datetime.now())
+def get_all_appointments(
+    response: Response,
+    filter_type: str = 'all',
+    doctor_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    calendar = AppointmentCalendarService(db)
+
+    if filter_type in ('past', 'upcoming'):
+        read = calendar.past if filter_type == 'past' else calendar.upcoming
+        appointments, next_cursor = read(doctor_id=doctor_id, cursor=cursor, limit=limit or DEFAULT_PAGE_SIZE)
+        if next_cursor:
+            response.headers[CURSOR_HEADER] = next_cursor
+        return appointments
 
-    appointments = query.all()
-    return appointments  # Return a list of all appointments
+    query = calendar.query(doctor_id=doctor_id)
+    return paginate_list(query, response, [Appointment.appointment_date, Appointment.appointment_id], cursor, limit)
 
 # PUT: Update an existing appointment for a specific patient
 @router.put("/{patient_id}/appointments/{appointment_id}")
@@ -105,6 +135,10 @@ def update_appointment(patient_id: str, appointment_id: int, updated_appointment
     if db_appointment.patient_id != patient_id:
         raise HTTPException(status_code=400, detail="Appointment does not belong to the provided patient")
 
+    # A rescheduled appointment gets a fresh reminder
+    if db_appointment.appointment_date != updated_appointment.appointment_date:
+        db_appointment.reminder_sent_at = None
+
     # Update the fields with the new data
     db_appointment.appointment_date = updated_appointment.appointment_date
     db_appointment.reason_for_visit = updated_appointment.reason_for_visit
@@ -1,39 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.models import AuditLog, User
 from app.schemas import AuditLogSchema, UserAuditLogSchema
-from app.database import get_db
+from app.database import get_read_db
+from app.pagination import keyset_paginate, CURSOR_HEADER, MAX_PAGE_SIZE
+from app.services.principal_cache import Principal
 from .admin import get_current_user
 
 router = APIRouter(tags=["Audit Logs"])
 
-@router.get("/audit-logs/", response_model=List[UserAuditLogSchema])
-def get_audit_logs(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    time_frame: Optional[str] = Query(None, description="Time frame filter (day, week, month, year, total)"),
-    start_date: Optional[str] = Query(None, description="Start date for custom range (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date for custom range (YYYY-MM-DD)"),
-    action: Optional[str] = Query(None, description="Filter by action type (e.g., 'login', 'patient_create')"),
-    entity_type: Optional[str] = Query(None, description="Filter by entity type (e.g., 'Patient', 'Billing')"),
-    entity_id: Optional[str] = Query(None, description="Filter by specific entity ID"),
-    user_id: Optional[int] = Query(None, description="Filter by user ID who performed the action"),
-    limit: Optional[int] = Query(100, description="Maximum number of logs to return (default: 100)"),
-    include_user: Optional[bool] = Query(True, description="Include detailed user information")
-):
-    """
-    Retrieve audit logs with various filtering options.
-    Requires admin privileges.
-    """
-    # Verify admin access
-    if not any(role.name == "Admin" for role in current_user.roles):
+def require_admin(current_user: Principal):
+    """Verify admin access"""
+    if not current_user.has_role("Admin"):
         raise HTTPException(
             status_code=403,
             detail="Only admin users can access audit logs"
         )
 
+def audit_log_query(
+    db: Session,
+    time_frame: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    action: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    include_user: Optional[bool] = True,
+):
+    """Filtered audit log query shared by the sync and async audit log endpoints."""
     query = db.query(AuditLog)
     
     # Join with user table if we need user details
@@ -77,13 +74,40 @@ def get_audit_logs(
             query = query.filter(AuditLog.timestamp >= start, AuditLog.timestamp <= end)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    
-    # Apply ordering and limit
-    query = query.order_by(AuditLog.timestamp.desc())
-    if limit:
-        query = query.limit(limit)
-    
-    # Execute query
-    logs = query.all()
-    
+
+    return query
+
+@router.get("/audit-logs/", response_model=List[UserAuditLogSchema])
+def get_audit_logs(
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+    time_frame: Optional[str] = Query(None, description="Time frame filter (day, week, month, year, total)"),
+    start_date: Optional[str] = Query(None, description="Start date for custom range (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date for custom range (YYYY-MM-DD)"),
+    action: Optional[str] = Query(None, description="Filter by action type (e.g., 'login', 'patient_create')"),
+    entity_type: Optional[str] = Query(None, description="Filter by entity type (e.g., 'Patient', 'Billing')"),
+    entity_id: Optional[str] = Query(None, description="Filter by specific entity ID"),
+    user_id: Optional[int] = Query(None, description="Filter by user ID who performed the action"),
+    limit: Optional[int] = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of logs to return (default: 100)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    include_user: Optional[bool] = Query(True, description="Include detailed user information")
+):
+    """
+    Retrieve audit logs with various filtering options.
+    Requires admin privileges.
+    """
+    require_admin(current_user)
+
+    query = audit_log_query(
+        db, time_frame, start_date, end_date, action, entity_type, entity_id, user_id, include_user
+    )
+
+    # Newest first, keyed on (timestamp, id) so deep pages don't need OFFSET
+    logs, next_cursor = keyset_paginate(
+        query, [AuditLog.timestamp, AuditLog.id], cursor=cursor, limit=limit or 100, descending=True
+    )
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+
     return logs
\ No newline at end of file
@@ -1,23 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, Response, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Response, Request, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List, Optional
 import logging
 from datetime import datetime, timedelta
 from decimal import Decimal
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Image, TableStyle
-import requests
+from app.services.principal_cache import Principal
 from app.routes.v1.admin import get_current_user 
 
-from app.models import Billing, Patient, Doctor, Fee, PaymentHistory, User, AuditLog
-from app.database import get_db
+from app.models import Billing, Patient, Doctor, Fee, PaymentHistory
+from app.database import get_db, get_read_db
+from app.services.patient_search_service import PatientSearchService
+from app.services.audit_logger import audit_log_writer
+from app.services.revenue_rollup import RevenueRollupService
+from app.services.pdf_renderer import pdf_renderer, BILLING_RECEIPT, MAX_BATCH_RECEIPTS
+from app.pagination import keyset_paginate, paginate_list, CURSOR_HEADER, MAX_PAGE_SIZE
 from app.schemas import (
     BillingCreate, BillingUpdate, BillingOut, PatientSearchResponse, 
-    PaymentHistoryBase, PaymentHistoryCreate
+    PaymentHistoryBase, PaymentHistoryCreate, ReceiptBatchRequest
 )
 from sqlalchemy import func
 
@@ -47,80 +47,25 @@ def get_billing_or_404(db: Session, billing_id: int, patient_id: str) -> Billing
     return billing
 
 
-def paginate(query, page: int, size: int):
-    """Helper function to paginate query results."""
-    return query.offset((page - 1) * size).limit(size).all()
+def billing_receipt_data(billing, patient, doctor) -> dict:
+    """Plain receipt fields for the PDF renderer."""
+    return {
+        "patient_name": f"{patient.surname}, {patient.other_names}",
+        "doctor_name": doctor.full_name if doctor else "",
+        "invoice_number": billing.invoice_number,
+        "invoice_date": billing.invoice_date,
+        "total_bill": billing.total_bill or Decimal("0.00"),
+        "discount_percentage": billing.discount_percentage or Decimal("0.00"),
+        "discount_amount": billing.discount_amount or Decimal("0.00"),
+        "amount_due": billing.amount_due or Decimal("0.00"),
+        "status": billing.status,
+        "fees": [(getattr(fee.fee_type, "value", fee.fee_type), fee.amount or Decimal("0.00")) for fee in billing.fees],
+    }
 
 
-def generate_receipt_pdf(billing, patient, doctor, logo_url="https://emr-5esm.vercel.app/renewal.png"):
+def generate_receipt_pdf(billing, patient, doctor):
     """Generate a PDF receipt for a billing."""
-    buffer = BytesIO()
-    pdf = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    content = []
-
-    # Try to fetch the logo
-    try:
-        response = requests.get(logo_url, timeout=10)
-        response.raise_for_status()
-        logo_img = Image(BytesIO(response.content), width=200, height=100)
-        content.append(logo_img)
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"Could not load logo image: {e}")
-        content.append(Paragraph("Billing Receipt", styles['Title']))
-
-    content.append(Spacer(1, 12))
-
-    # Add a title
-    title = Paragraph("Billing Receipt", styles['Title'])
-    content.append(title)
-    content.append(Spacer(1, 12))
-
-    # Add billing details
-    billing_details = [
-        f"Patient: {patient.surname}, {patient.other_names}",
-        f"Doctor: {doctor.full_name}",
-        f"Invoice Number: {billing.invoice_number}",
-        f"Invoice Date: {billing.invoice_date}",
-        f"Total Bill: NGN{billing.total_bill:.2f}",
-        f"Discount %: NGN{billing.discount_percentage:.2f}",
-        f"Discount Amt: NGN{billing.discount_amount:.2f}",
-        f"Amount Due: NGN{billing.amount_due:.2f}",
-        f"Status: {billing.status}",
-    ]
-    for detail in billing_details:
-        content.append(Paragraph(detail, styles['BodyText']))
-        content.append(Spacer(1, 6))
-
-    # Add a table for fees
-    fees = [["Fee Type", "Amount"]]
-    for fee in billing.fees:
-        fees.append([fee.fee_type, f"NGN{fee.amount:.2f}"])
-
-    table = Table(fees)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    content.append(Spacer(1, 12))
-    content.append(table)
-
-    # Add a footer
-    footer = Paragraph("Thank you for choosing our service. For inquiries, contact support@example.com.", styles['Italic'])
-    content.append(Spacer(1, 12))
-    content.append(footer)
-
-    # Build the PDF
-    pdf.build(content)
-
-    # Return the PDF as bytes
-    buffer.seek(0)
-    return buffer.getvalue()
+    return pdf_renderer.render(BILLING_RECEIPT, billing_receipt_data(billing, patient, doctor))
 
 
 # Endpoints
@@ -136,43 +81,27 @@ def search_patients(
     db: Session = Depends(get_db)
 ):
     """Search for patients by filters."""
-    query = db.query(Patient)
-
-    # Apply filters
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    total = query.count()
-    patients = paginate(query, page, size)
-
-    if not patients:
-        logger.warning("No patients found with the given filters")
-        raise HTTPException(status_code=404, detail="No patients found")
-
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "patients": patients,
-    }
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+    )
 
 
 @router.get("/v1/billings/", response_model=List[BillingOut])
 def search_billings(
+    response: Response,
     patient_id: Optional[str] = None,
     doctor_id: Optional[int] = None,
     invoice_number: Optional[str] = None,
-    page: int = 1,
-    size: int = 50,
+    cursor: Optional[str] = None,
+    size: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
-    """Search for billings by filters."""
+    """Search for billings by filters. The next page's cursor is returned in the X-Next-Cursor header."""
     query = db.query(Billing)
 
     # Apply filters
@@ -183,19 +112,16 @@ def search_billings(
     if invoice_number:
         query = query.filter(Billing.invoice_number.ilike(f"%{invoice_number}%"))
 
-    total = query.count()
-    billings = paginate(query, page, size)
+    billings, next_cursor = keyset_paginate(query, [Billing.billing_id], cursor=cursor, limit=size)
 
     if not billings:
         logger.warning("No billings found with the given filters")
         raise HTTPException(status_code=404, detail="No billings found")
 
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "billings": billings,
-    }
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+
+    return billings
 
 # Create billing
 @router.post("/v1/patients/{patient_id}/billings", response_model=BillingOut)
@@ -204,7 +130,7 @@ def create_billing(
     billing: BillingCreate,
     request: Request,  # Added for audit logging
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Added to track who created the billing
+    current_user: Principal = Depends(get_current_user)  # Added to track who created the billing
 ):
     """Create a new billing for a patient."""
     try:
@@ -212,15 +138,13 @@ def create_billing(
         doctor = db.query(Doctor).filter(Doctor.id == billing.doctor_id).first()
         if not doctor:
             # Log failed attempt
-            audit_log = AuditLog(
+            audit_log_writer.enqueue(
                 action="billing_creation_failed",
                 user_id=current_user.id,
                 description=f"Doctor not found: {billing.doctor_id}",
                 ip_address=request.client.host,
                 user_agent=request.headers.get("user-agent")
             )
-            db.add(audit_log)
-            db.commit()
             
             logger.error(f"Doctor not found: {billing.doctor_id}")
             raise HTTPException(status_code=404, detail="Doctor not found")
@@ -258,30 +182,26 @@ def create_billing(
         db.refresh(new_billing)
 
         # Log successful creation
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_created",
             user_id=current_user.id,
             description=f"Created billing {invoice_number} for patient {patient_id} (Amount: {new_billing.total_bill})",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return new_billing
 
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_creation_error",
             user_id=current_user.id,
             description=f"Database error while creating billing: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Database error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
@@ -289,15 +209,13 @@ def create_billing(
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_creation_error",
             user_id=current_user.id,
             description=f"Unexpected error while creating billing: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
@@ -305,11 +223,15 @@ def create_billing(
 @router.get("/v1/patients/{patient_id}/billings", response_model=List[BillingOut])
 def get_billing_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     """Retrieve billing history for a patient."""
     patient = get_patient_or_404(db, patient_id)
-    records = db.query(Billing).filter(Billing.patient_id == patient_id).all()
+    query = db.query(Billing).filter(Billing.patient_id == patient_id)
+    records = paginate_list(query, response, [Billing.billing_id], cursor, limit)
     return records if records else []
 
 # Update billing
@@ -350,11 +272,15 @@ def update_billing(
                 )
                 db.add(fee_record)
 
-        # Commit the changes to the database
-        db.commit()
+        # Flush, not commit: the new totals and the revenue rollup commit
+        # together with the edit, so a billing set to Paid has its rollup rows
+        db.flush()
+        db.expire(existing_billing, ["fees"])
         # Recalculate the total bill and generate invoice
         existing_billing.calculate_total_bill()
         existing_billing.generate_invoice()
+        if existing_billing.status == "Paid":
+            RevenueRollupService(db).record_paid_billing(existing_billing)
         db.commit()
         db.refresh(existing_billing)
 
@@ -376,7 +302,7 @@ def delete_billing(
     billing_id: int,
     request: Request,  # Added for audit logging
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Added to track who deleted the billing
+    current_user: Principal = Depends(get_current_user)  # Added to track who deleted the billing
 ):
     """Delete a billing record."""
     patient = get_patient_or_404(db, patient_id)
@@ -390,34 +316,32 @@ def delete_billing(
             "patient_id": billing.patient_id
         }
         
+        if billing.status == "Paid":
+            RevenueRollupService(db).record_paid_billing(billing, sign=-1)
         db.delete(billing)
         db.commit()
         
         # Log successful deletion
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_deleted",
             user_id=current_user.id,
             description=f"Deleted billing {billing_details['invoice_number']} (Amount: {billing_details['amount']})",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         return {"message": "Billing record deleted successfully"}
 
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_deletion_error",
             user_id=current_user.id,
             description=f"Database error while deleting billing: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Database error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
@@ -425,15 +349,13 @@ def delete_billing(
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="billing_deletion_error",
             user_id=current_user.id,
             description=f"Unexpected error while deleting billing: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
@@ -459,12 +381,15 @@ def create_payment(
         new_payment.generate_receipt_number(db)
 
         db.add(new_payment)
-        db.commit()
-        db.refresh(new_payment)
+        db.flush()
 
-        billing.update_payment_status()
+        rollup = RevenueRollupService(db)
+        rollup.record_payment(new_payment, billing)
+        was_paid = billing.status == "Paid"
+        if billing.update_payment_status() == "Paid" and not was_paid:
+            rollup.record_paid_billing(billing)
         db.commit()
-        db.refresh(billing)
+        db.refresh(new_payment)
 
         return new_payment
 
@@ -492,6 +417,7 @@ def mark_billing_as_paid(
         raise HTTPException(status_code=400, detail="Billing is already marked as paid")
 
     billing.status = "Paid"
+    RevenueRollupService(db).record_paid_billing(billing)
     db.commit()
     db.refresh(billing)
 
@@ -523,13 +449,43 @@ def download_receipt(
     }
     return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
+@router.post("/v1/billings/receipts/batch")
+def download_receipt_batch(
+    batch: ReceiptBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """Print many paid billing receipts as one multi-page PDF (e.g. all of a day's receipts)."""
+    query = (
+        db.query(Billing)
+        .options(selectinload(Billing.fees), joinedload(Billing.patient), joinedload(Billing.doctor))
+        .filter(Billing.status == "Paid")
+    )
+    if batch.ids:
+        query = query.filter(Billing.billing_id.in_(batch.ids))
+    if batch.day:
+        query = query.filter(func.date(Billing.invoice_date) == batch.day)
+    billings = query.order_by(Billing.invoice_date, Billing.billing_id).limit(MAX_BATCH_RECEIPTS + 1).all()
+
+    if not billings:
+        raise HTTPException(status_code=404, detail="No paid billings found")
+
+    pdf_bytes = pdf_renderer.render_batch([
+        (BILLING_RECEIPT, billing_receipt_data(billing, billing.patient, billing.doctor)) for billing in billings
+    ])
+    filename = f"receipts_{batch.day or datetime.utcnow().date()}.pdf"
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @router.get("/v1/billings/revenue-by-user")
 def get_revenue_by_user(
     time_frame: str = "total",  # Can be 'day', 'week', 'month', 'year', or 'total'
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     doctor_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get revenue generated by each user (doctor) filtered by time period.
@@ -544,55 +500,32 @@ def get_revenue_by_user(
     - List of dictionaries containing doctor info and revenue
     """
     try:
-        # Base query
-        query = db.query(
-            Doctor.id.label("doctor_id"),
-            Doctor.full_name.label("doctor_name"),
-            func.sum(Billing.total_bill).label("total_revenue"),
-            func.count(Billing.billing_id).label("billing_count")
-        ).join(
-            Billing, Doctor.id == Billing.doctor_id
-        ).filter(
-            Billing.status == "Paid"  # Only count paid billings
-        ).group_by(
-            Doctor.id, Doctor.full_name
-        )
-
-        # Apply doctor filter if provided
-        if doctor_id:
-            query = query.filter(Doctor.id == doctor_id)
-
-        # Handle time frame filtering
+        start = end = None
         if time_frame != "total":
-            now = datetime.utcnow()
-            
+            today = datetime.utcnow().date()
+
             if start_date and end_date:
-                # Custom date range
+                # Custom date range (inclusive)
                 try:
-                    start = datetime.strptime(start_date, "%Y-%m-%d")
-                    end = datetime.strptime(end_date, "%Y-%m-%d")
-                    query = query.filter(Billing.invoice_date.between(start, end))
+                    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+                    end = datetime.strptime(end_date, "%Y-%m-%d").date()
                 except ValueError:
                     raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
             else:
                 # Predefined time frames
                 if time_frame == "day":
-                    today = now.date()
-                    query = query.filter(func.date(Billing.invoice_date) == today)
+                    start = today
                 elif time_frame == "week":
-                    start_of_week = now - timedelta(days=now.weekday())
-                    query = query.filter(Billing.invoice_date >= start_of_week)
+                    start = today - timedelta(days=today.weekday())
                 elif time_frame == "month":
-                    start_of_month = now.replace(day=1)
-                    query = query.filter(Billing.invoice_date >= start_of_month)
+                    start = today.replace(day=1)
                 elif time_frame == "year":
-                    start_of_year = now.replace(month=1, day=1)
-                    query = query.filter(Billing.invoice_date >= start_of_year)
+                    start = today.replace(month=1, day=1)
                 else:
                     raise HTTPException(status_code=400, detail="Invalid time_frame. Use 'day', 'week', 'month', 'year', or 'total'")
 
-        # Execute query
-        results = query.all()
+        # Read from the daily revenue rollup instead of scanning billings
+        results = RevenueRollupService(db).revenue_by_doctor(start, end, doctor_id)
 
         # Format response
         response = []
@@ -609,6 +542,8 @@ def get_revenue_by_user(
 
         return response
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         logger.error(f"Database error in revenue_by_user: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
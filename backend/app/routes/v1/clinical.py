@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
 from app.models import Patient, ClinicalNote
 from app.schemas import PatientSearchResponse, ClinicalCreate, ClinicalOut
 from app.database import get_db
+from app.services.patient_search_service import PatientSearchService
+from app.pagination import paginate_list, MAX_PAGE_SIZE
 from typing import List, Optional
 
 router = APIRouter()
@@ -17,29 +19,14 @@ def search_patients(
     page: int = 1, size: int = 50,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Patient)
-    
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    total = query.count()
-    patients = query.offset((page - 1) * size).limit(size).all()
-    
-    if not patients:
-        raise HTTPException(status_code=404, detail="No patients found")
-    
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "patients": patients,
-    }
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+    )
 
 # 2. POST: Add a clinical record to a selected patient
 @router.post("/{patient_id}/clinical", response_model=ClinicalOut)
@@ -85,6 +72,9 @@ def add_clinical_record_to_patient(
 @router.get("/{patient_id}/clinical", response_model=List[ClinicalOut])
 def get_clinical_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     # Check if the patient exists
@@ -93,7 +83,8 @@ def get_clinical_history_for_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Retrieve all clinical notes associated with the patient
-    clinical_notes = db.query(ClinicalNote).filter(ClinicalNote.patient_id == patient_id).all()
+    query = db.query(ClinicalNote).filter(ClinicalNote.patient_id == patient_id)
+    clinical_notes = paginate_list(query, response, [ClinicalNote.id], cursor, limit)
     
     if not clinical_notes:
         return []  # Return empty list instead of 404 error for no records found
@@ -3,11 +3,11 @@ from sqlalchemy.orm import Session
 from typing import List
 import random  
 import logging
-from passlib.context import CryptContext  # ✅ Import password hashing
 
 from app.models import Doctor, User
 from app.schemas import DoctorCreate, DoctorUpdate, DoctorOut
 from app.database import get_db
+from app.services.password_hasher import password_hasher
 
 # FastAPI Router
 router = APIRouter()
@@ -16,11 +16,9 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# Password hashing (runs in the hashing pool)
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 
 # **POST: Create a new doctor**
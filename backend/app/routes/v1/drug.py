@@ -6,12 +6,16 @@ from sqlalchemy import func
 from typing import List, Optional
 from pydantic import BaseModel, validator
 import logging
+from app.services.principal_cache import Principal
 from .admin import get_current_user 
 
 # Import models and schemas
-from app.models import Drug, Stock, User, AuditLog
-from app.schemas import DrugCreate, DrugUpdate, DrugOut, StockUpdate, StockResponse
+from app.models import Drug, Stock
+from app.schemas import DrugCreate, DrugUpdate, DrugOut, StockUpdate, StockResponse, DrugOrder
 from app.database import get_db
+from app.services.audit_logger import audit_log_writer
+from app.services.drug_catalog import drug_catalog_cache
+from app.services.stock_service import StockLedger, StockReservationService, InsufficientStockError, SALE
 
 # Initialize logging
 logger = logging.getLogger(__name__)
@@ -60,7 +64,7 @@ def create_drug(
     drug: DrugCreate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new drug and its stock with audit logging"""
     try:
@@ -75,6 +79,7 @@ def create_drug(
         # Create the drug
         db_drug = Drug(**drug_data)
         db.add(db_drug)
+        drug_catalog_cache.invalidate(db)
         db.commit()
         db.refresh(db_drug)
 
@@ -88,42 +93,36 @@ def create_drug(
         db.commit()
 
         # Log successful creation
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_created",
             user_id=current_user.id,
             description=f"Created drug {db_drug.name} (ID: {db_drug.id})",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return DrugOut.from_orm(db_drug)
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_creation_error",
             user_id=current_user.id,
             description=f"Database error while creating drug: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         handle_database_error(e, "create")
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_creation_error",
             user_id=current_user.id,
             description=f"Unexpected error while creating drug: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         logger.error(f"Unexpected error while creating drug: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error creating drug: {str(e)}")
 
@@ -134,7 +133,7 @@ def update_drug(
     drug: DrugUpdate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Update a drug with audit logging"""
     try:
@@ -157,6 +156,7 @@ def update_drug(
             db_drug.is_active = False
             logger.info(f"Drug {db_drug.name} (ID: {drug_id}) is expired and marked as inactive.")
 
+        drug_catalog_cache.invalidate(db)
         db.commit()
         db.refresh(db_drug)
 
@@ -167,42 +167,36 @@ def update_drug(
                 changes.append(f"{field}: {original_value} → {getattr(db_drug, field)}")
 
         # Log successful update
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_updated",
             user_id=current_user.id,
             description=f"Updated drug {db_drug.name} (ID: {drug_id}). Changes: {', '.join(changes)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return DrugOut.from_orm(db_drug)
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_update_error",
             user_id=current_user.id,
             description=f"Database error while updating drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         handle_database_error(e, "update", drug_id)
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_update_error",
             user_id=current_user.id,
             description=f"Unexpected error while updating drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         logger.error(f"Unexpected error while updating drug {drug_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error updating drug: {str(e)}")
 
@@ -212,7 +206,7 @@ def delete_drug(
     drug_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a drug with audit logging"""
     try:
@@ -220,45 +214,40 @@ def delete_drug(
         drug_name = db_drug.name
         
         db.delete(db_drug)
+        drug_catalog_cache.invalidate(db)
         db.commit()
 
         # Log successful deletion
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_deleted",
             user_id=current_user.id,
             description=f"Deleted drug {drug_name} (ID: {drug_id})",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         logger.info(f"Drug {drug_name} (ID: {drug_id}) deleted successfully.")
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_deletion_error",
             user_id=current_user.id,
             description=f"Database error while deleting drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         handle_database_error(e, "delete", drug_id)
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_deletion_error",
             user_id=current_user.id,
             description=f"Unexpected error while deleting drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         logger.error(f"Unexpected error while deleting drug {drug_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error deleting drug: {str(e)}")
 
@@ -269,7 +258,7 @@ def update_stock(
     stock_update: StockUpdate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Update stock levels with audit logging"""
     try:
@@ -278,56 +267,48 @@ def update_stock(
         
         original_quantity = db_stock.quantity
 
-        # Ensure stock quantity does not go below zero
-        if stock_update.quantity and (db_stock.quantity + stock_update.quantity < 0):
-            raise HTTPException(status_code=400, detail="Stock quantity cannot be negative")
-
-        # Update the stock quantity
+        # Apply the change and record it in the stock ledger; refuses to go below zero
         if stock_update.quantity:
-            db_stock.quantity += stock_update.quantity
-
-        # Update the last_updated field
-        db_stock.last_updated = datetime.utcnow()
+            StockLedger(db).adjust(drug_id, stock_update.quantity, user_id=current_user.id)
+        else:
+            db_stock.last_updated = datetime.utcnow()
         db.commit()
         db.refresh(db_stock)
 
         # Log stock update
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="stock_updated",
             user_id=current_user.id,
             description=f"Updated stock for {drug.name} (ID: {drug_id}). Quantity: {original_quantity} → {db_stock.quantity}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return db_stock
+    except HTTPException:
+        db.rollback()
+        raise
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="stock_update_error",
             user_id=current_user.id,
             description=f"Database error while updating stock for drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         handle_database_error(e, "update stock", drug_id)
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="stock_update_error",
             user_id=current_user.id,
             description=f"Unexpected error while updating stock for drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         logger.error(f"Unexpected error while updating stock for drug {drug_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error updating stock: {str(e)}")
 
@@ -338,70 +319,77 @@ def sell_drug(
     stock_update: StockUpdate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Sell a drug with audit logging"""
     try:
         db_stock = get_stock_by_drug_id(db, drug_id)
-        drug = db.query(Drug).filter(Drug.id == drug_id).first()
-        original_quantity = db_stock.quantity
 
-        # Check if there is enough stock to sell
-        if db_stock.quantity < stock_update.quantity:
+        # Lock, check and decrease the stock quantity, recording the sale in the ledger
+        try:
+            reserved = StockReservationService(db).reserve(
+                [DrugOrder(drug_id=drug_id, quantity=stock_update.quantity)], SALE, user_id=current_user.id
+            )
+        except InsufficientStockError as e:
             # Log failed sale attempt
-            audit_log = AuditLog(
+            audit_log_writer.enqueue(
                 action="drug_sale_failed",
                 user_id=current_user.id,
-                description=f"Insufficient stock to sell {stock_update.quantity} of {drug.name} (ID: {drug_id}). Current stock: {db_stock.quantity}",
+                description=f"Insufficient stock to sell {stock_update.quantity} of {e.drug.name} (ID: {drug_id}). Current stock: {e.available}",
                 ip_address=request.client.host,
                 user_agent=request.headers.get("user-agent")
             )
-            db.add(audit_log)
-            db.commit()
             raise HTTPException(status_code=400, detail="Not enough stock to sell")
-
-        # Decrease the stock quantity
-        db_stock.quantity -= stock_update.quantity
-        db_stock.last_updated = datetime.utcnow()
+        drug = reserved[0].drug
         db.commit()
         db.refresh(db_stock)
 
         # Log successful sale
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_sold",
             user_id=current_user.id,
             description=f"Sold {stock_update.quantity} of {drug.name} (ID: {drug_id}). Remaining stock: {db_stock.quantity}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return db_stock
+    except HTTPException:
+        db.rollback()
+        raise
     except SQLAlchemyError as e:
         db.rollback()
         # Log database error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_sale_error",
             user_id=current_user.id,
             description=f"Database error while selling drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         handle_database_error(e, "sell drug", drug_id)
     except Exception as e:
         db.rollback()
         # Log unexpected error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="drug_sale_error",
             user_id=current_user.id,
             description=f"Unexpected error while selling drug {drug_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         logger.error(f"Unexpected error while selling drug {drug_id}: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error selling drug: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Error selling drug: {str(e)}")
+
+# Stock level from the ledger, optionally as of a past moment (for audits)
+@router.get("/drugs/{drug_id}/stock/level")
+def get_stock_level(
+    drug_id: int,
+    at: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Stock of a drug rebuilt from the latest snapshot plus later stock movements"""
+    get_drug_by_id(db, drug_id)
+    quantity = StockLedger(db).levels([drug_id], at=at)[drug_id]
+    return {"drug_id": drug_id, "quantity": quantity, "as_of": at or datetime.utcnow()}
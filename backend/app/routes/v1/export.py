@@ -1,26 +1,30 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-import openpyxl
 from sqlalchemy import inspect
 from sqlalchemy.orm import DeclarativeMeta
-from typing import List, Type, Optional, Dict, Any
+from typing import List, Type, Optional, Dict, Any, Callable
 from io import BytesIO, StringIO
-from fastapi.responses import StreamingResponse
-from app.database import get_db
+from fastapi.responses import StreamingResponse, FileResponse
+from app.database import get_db, get_read_db, open_read_session
+from app.services.export_jobs import export_job_manager, EXPORT_KINDS
+from app.services.pdf_renderer import pdf_renderer, PATIENT_EXPORT
 from app.models import (
     Patient, ClinicalNote, MentalHealthNote, PharmacyRecord,
     LaboratoryRecord, OccupationalTherapyRecord, PsychologyRecord,
     SocialWorkRecord
 )
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from datetime import datetime, date
 import json
 import csv
+import itertools
+import tempfile
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from pydantic import BaseModel
@@ -44,6 +48,24 @@ class ExportConfig(BaseModel):
 # Current configuration (could be loaded from DB or config file)
 export_config = ExportConfig()
 
+class ExportJobRequest(BaseModel):
+    kind: str  # one of EXPORT_KINDS
+    patient_id: Optional[str] = None
+    skip: int = 0
+    limit: int = 100
+    sex: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+
+class ExportJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    progress: int
+    created_at: str
+    updated_at: str
+    error: Optional[str] = None
+
 # Utility Functions
 def get_exportable_fields(model_class: Type[DeclarativeMeta]) -> List[str]:
     """Get all columns except relationships and internal fields"""
@@ -163,80 +185,95 @@ def generate_excel(data: Dict[str, Any], include_related: bool = True) -> BytesI
     excel_file.seek(0)
     return excel_file
 
-def generate_all_patients_excel(
-    db: Session,
-    skip: int = 0,
-    limit: int = 100,
-    filters: Optional[Dict] = None
-) -> BytesIO:
-    """Generate Excel file with paginated list of all patients including their related records"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "All Patients"
-    
-    # Style definitions
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = "4472C4"  # Blue color
-    patient_header_font = Font(bold=True, italic=True)
-    record_header_font = Font(bold=True, color="000000")
-    thin_border = Border(left=Side(style='thin'), 
-                        right=Side(style='thin'), 
-                        top=Side(style='thin'), 
-                        bottom=Side(style='thin'))
-    
-    # Add metadata
-    ws.append(["COMPREHENSIVE PATIENT RECORDS EXPORT"])
-    ws.append(["Exported at", datetime.utcnow().strftime(export_config.datetime_format)])
-    ws.append(["Page", f"{skip//limit + 1} (records {skip}-{skip+limit})"])
-    ws.append([])
-    
-    # Define patient export fields
-    patient_fields = [
-        ('patient_id', 'Patient ID'),
-        ('surname', 'Surname'),
-        ('other_names', 'Other Names'),
-        ('date_of_birth', 'Date of Birth'),
-        ('sex', 'Gender'),
-        ('age', 'Age'),
-        ('marital_status', 'Marital Status'),
-        ('residential_address', 'Address'),
-        ('residential_phone', 'Phone'),
-        ('next_of_kin', 'Next of Kin')
-    ]
-    
-    # Define related models to include
-    related_models = {
-        "Clinical Notes": ClinicalNote,
-        "Mental Health Notes": MentalHealthNote,
-        "Pharmacy Records": PharmacyRecord,
-        "Laboratory Records": LaboratoryRecord,
-        "Occupational Therapy": OccupationalTherapyRecord,
-        "Psychology Records": PsychologyRecord,
-        "Social Work Records": SocialWorkRecord
+# Streaming "all patients" export
+ALL_PATIENTS_FIELDS = [
+    ('patient_id', 'Patient ID'),
+    ('surname', 'Surname'),
+    ('other_names', 'Other Names'),
+    ('date_of_birth', 'Date of Birth'),
+    ('sex', 'Gender'),
+    ('age', 'Age'),
+    ('marital_status', 'Marital Status'),
+    ('residential_address', 'Address'),
+    ('residential_phone', 'Phone'),
+    ('next_of_kin', 'Next of Kin')
+]
+
+ALL_PATIENTS_RELATED_MODELS = {
+    "Clinical Notes": ClinicalNote,
+    "Mental Health Notes": MentalHealthNote,
+    "Pharmacy Records": PharmacyRecord,
+    "Laboratory Records": LaboratoryRecord,
+    "Occupational Therapy": OccupationalTherapyRecord,
+    "Psychology Records": PsychologyRecord,
+    "Social Work Records": SocialWorkRecord
+}
+
+EXPORT_BATCH_SIZE = 200      # Patients per server-side fetch / related-record IN query
+WIDTH_SAMPLE_SIZE = 50       # Patients used to estimate column widths
+MAX_COLUMN_WIDTH = 60
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _load_related_records(db: Session, patient_ids: List[str]) -> Dict[str, Dict[str, list]]:
+    """Load related records for a batch of patients with one IN query per model"""
+    related = {}
+    for model_name, model in ALL_PATIENTS_RELATED_MODELS.items():
+        grouped: Dict[str, list] = {}
+        records = db.query(model).filter(model.patient_id.in_(patient_ids)).all()
+        for record in records:
+            grouped.setdefault(record.patient_id, []).append(record)
+        related[model_name] = grouped
+    return related
+
+
+def _patient_rows(patient, related: Dict[str, Dict[str, list]], related_fields: Dict[str, List[str]]):
+    """Yield the summary row for a patient followed by its related-record rows"""
+    row = []
+    for field, _ in ALL_PATIENTS_FIELDS:
+        value = getattr(patient, field)
+        if field == 'date_of_birth' and value:
+            value = value.strftime(export_config.date_format)
+        row.append(value)
+
+    patient_records = {
+        model_name: related[model_name].get(patient.patient_id, [])
+        for model_name in ALL_PATIENTS_RELATED_MODELS
     }
-    
-    # Build headers - start with patient fields
-    headers = [col[1] for col in patient_fields]
-    
-    # Add headers for related records counts
-    for model_name in related_models.keys():
-        headers.append(f"{model_name} Count")
-    
-    # Add main headers
-    ws.append(headers)
-    
-    # Apply styles to headers
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=5, column=col)
-        cell.font = header_font
-        cell.fill = openpyxl.styles.PatternFill(start_color=header_fill, end_color=header_fill, fill_type="solid")
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Build query
-    query = db.query(Patient).order_by(Patient.surname)
-    
-    # Apply filters if provided
+    row.extend(len(records) for records in patient_records.values())
+    yield row
+
+    max_records = max((len(records) for records in patient_records.values()), default=0)
+    for i in range(max_records):
+        # Empty cells for patient info and the count columns
+        record_row = [""] * (len(ALL_PATIENTS_FIELDS) + len(ALL_PATIENTS_RELATED_MODELS))
+        for model_name, records in patient_records.items():
+            fields = related_fields[model_name]
+            if i < len(records):
+                record_row.extend(format_field_value(getattr(records[i], field)) for field in fields)
+            else:
+                record_row.extend([""] * len(fields))
+        yield record_row
+
+    # Empty row between patients for readability
+    yield []
+
+
+def _estimate_column_widths(header: List[str], sample_rows: List[list]) -> List[float]:
+    """Estimate column widths from the header and a sample of rows instead of every cell"""
+    widths = [len(str(value)) for value in header]
+    for row in sample_rows:
+        for index, value in enumerate(row):
+            length = len(str(value)) if value is not None else 0
+            if index >= len(widths):
+                widths.append(length)
+            elif length > widths[index]:
+                widths[index] = length
+    return [min((width + 2) * 1.2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def _filtered_patients_query(db: Session, filters: Optional[Dict] = None):
+    query = db.query(Patient)
     if filters:
         if 'sex' in filters:
             query = query.filter(Patient.sex == filters['sex'])
@@ -244,78 +281,115 @@ def generate_all_patients_excel(
             query = query.filter(Patient.age >= filters['min_age'])
         if 'max_age' in filters:
             query = query.filter(Patient.age <= filters['max_age'])
-    
-    # Apply pagination
-    patients = query.offset(skip).limit(limit).all()
-    
-    if not patients:
-        ws.append(["No patients found matching criteria"])
-    else:
-        for patient in patients:
-            # Start with patient data
-            row = []
-            for field, _ in patient_fields:
-                value = getattr(patient, field)
-                if field == 'date_of_birth' and value:
-                    value = value.strftime(export_config.date_format)
-                row.append(value)
-            
-            # Get all related records for this patient
-            related_records = {}
-            for model_name, model in related_models.items():
-                records = db.query(model).filter(model.patient_id == patient.patient_id).all()
-                related_records[model_name] = records
-                # Add count of records
-                row.append(len(records))
-            
-            # Add patient row
-            ws.append(row)
-            
-            # Add related records for this patient
-            max_records = max(len(records) for records in related_records.values()) if related_records else 0
-            
-            for i in range(max_records):
-                record_row = [""] * len(patient_fields)  # Empty cells for patient info
-                
-                # Add record counts again (empty for visual alignment)
-                for model_name in related_models.keys():
-                    record_row.append("")
-                
-                # Add related records data
-                for model_name, model in related_models.items():
-                    records = related_records[model_name]
-                    if i < len(records):
-                        record = records[i]
-                        for field in get_exportable_fields(model):
-                            value = getattr(record, field)
-                            record_row.append(format_field_value(value))
-                    else:
-                        # Add empty cells if no record at this index
-                        for _ in get_exportable_fields(model):
-                            record_row.append("")
-                
-                ws.append(record_row)
-            
-            # Add empty row between patients for readability
-            ws.append([])
-    
-    # Auto-size columns
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2) * 1.2
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    excel_file = BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-    return excel_file
+    return query
+
+
+def count_all_patients(db: Session, skip: int = 0, filters: Optional[Dict] = None) -> int:
+    """Number of patients an all-patients export will contain before `limit` is applied"""
+    return max(0, _filtered_patients_query(db, filters).count() - skip)
+
+
+def has_patients(db: Session, skip: int = 0, filters: Optional[Dict] = None) -> bool:
+    """Whether an all-patients export would contain any patient; probes one row instead of counting"""
+    query = _filtered_patients_query(db, filters).with_entities(Patient.id)
+    return query.order_by(Patient.id).offset(skip).limit(1).first() is not None
+
+
+def iter_all_patients_excel(
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[Dict] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    progress: Optional[Callable[[int], None]] = None
+):
+    """
+    Yield an Excel file with a range of patients and their related records.
+
+    Uses a write-only worksheet fed by a server-side cursor, so memory stays flat
+    regardless of the number of patients. Related records are loaded per batch of
+    patients with one IN query per model. The finished workbook is saved to a
+    temporary file and only then yielded in chunks: an xlsx is a zip whose
+    directory is written last, so the first byte goes out after all database
+    work is done. The generator owns its session because it keeps running
+    after the request handler has returned. `progress`, when given, is called
+    with the number of patients written after each batch.
+    """
+    db = open_read_session()
+    try:
+        query = _filtered_patients_query(db, filters).order_by(Patient.surname, Patient.id)
+        query = query.offset(skip).limit(limit).execution_options(stream_results=True).yield_per(batch_size)
+
+        related_fields = {name: get_exportable_fields(model) for name, model in ALL_PATIENTS_RELATED_MODELS.items()}
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="All Patients")
+
+        header = [label for _, label in ALL_PATIENTS_FIELDS]
+        header.extend(f"{model_name} Count" for model_name in ALL_PATIENTS_RELATED_MODELS)
+
+        batches = _iter_patient_batches(db, query, batch_size)
+        first_batch = next(batches, None)
+
+        # Column widths must be set before any row is written in write-only mode
+        sample_rows = []
+        if first_batch:
+            patients, related = first_batch
+            for patient in patients[:WIDTH_SAMPLE_SIZE]:
+                sample_rows.extend(_patient_rows(patient, related, related_fields))
+        for index, width in enumerate(_estimate_column_widths(header, sample_rows), start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+        ws.append(["COMPREHENSIVE PATIENT RECORDS EXPORT"])
+        ws.append(["Exported at", datetime.utcnow().strftime(export_config.datetime_format)])
+        ws.append(["Page", f"{skip//limit + 1} (records {skip}-{skip+limit})"])
+        ws.append([])
+        ws.append([_styled_header_cell(ws, title) for title in header])
+
+        if not first_batch:
+            ws.append(["No patients found matching criteria"])
+        else:
+            written = 0
+            for patients, related in itertools.chain([first_batch], batches):
+                for patient in patients:
+                    for row in _patient_rows(patient, related, related_fields):
+                        ws.append(row)
+                written += len(patients)
+                if progress:
+                    progress(written)
+
+        with tempfile.TemporaryFile() as output:
+            wb.save(output)
+            output.seek(0)
+            while True:
+                chunk = output.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        db.close()
+
+
+def _iter_patient_batches(db: Session, query, batch_size: int):
+    """Yield (patients, related_records) for each batch read from the server-side cursor"""
+    iterator = iter(query)
+    while True:
+        patients = list(itertools.islice(iterator, batch_size))
+        if not patients:
+            return
+        yield patients, _load_related_records(db, [patient.patient_id for patient in patients])
+
+
+def _styled_header_cell(ws, value: str) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = Font(bold=True, color="FFFFFF")
+    cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    cell.border = Border(left=Side(style='thin'),
+                         right=Side(style='thin'),
+                         top=Side(style='thin'),
+                         bottom=Side(style='thin'))
+    cell.alignment = Alignment(horizontal='center')
+    return cell
+
 
 # PDF Generation
 def generate_pdf(data: Dict[str, Any]) -> BytesIO:
@@ -437,9 +511,9 @@ def generate_csv(data: Dict[str, Any]) -> BytesIO:
 
 # FastAPI Endpoints
 @router.get("/patients/{patient_id}", summary="Get patient data")
-async def get_patient(
+def get_patient(
     patient_id: str, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Get comprehensive patient data including all related records"""
@@ -448,11 +522,11 @@ async def get_patient(
 
 @router.get("/patients/{patient_id}/excel", response_class=StreamingResponse)
 @limiter.limit("10/minute")
-async def export_patient_excel(
+def export_patient_excel(
     request: Request,
     patient_id: str,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Export patient data to Excel format"""
     verify_access(credentials)
@@ -471,17 +545,17 @@ async def export_patient_excel(
 
 @router.get("/patients/{patient_id}/pdf", response_class=StreamingResponse)
 @limiter.limit("10/minute")
-async def export_patient_pdf(
+def export_patient_pdf(
     request: Request,
     patient_id: str,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Export patient data to PDF format"""
     verify_access(credentials)
     try:
         data = get_patient_data(patient_id, db)
-        pdf_file = generate_pdf(data)
+        pdf_file = BytesIO(pdf_renderer.render(PATIENT_EXPORT, data))
         return StreamingResponse(
             pdf_file,
             media_type="application/pdf",
@@ -494,11 +568,11 @@ async def export_patient_pdf(
 
 @router.get("/patients/{patient_id}/csv", response_class=StreamingResponse)
 @limiter.limit("10/minute")
-async def export_patient_csv(
+def export_patient_csv(
     request: Request,
     patient_id: str,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Export patient data to CSV format"""
     verify_access(credentials)
@@ -517,7 +591,7 @@ async def export_patient_csv(
 
 @router.get("/all/excel", response_class=StreamingResponse)
 @limiter.limit("5/minute")
-async def export_all_patients_excel(
+def export_all_patients_excel(
     request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
@@ -525,33 +599,94 @@ async def export_all_patients_excel(
     min_age: Optional[int] = None,
     max_age: Optional[int] = None,
     credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_read_db)
+):
+    """Export paginated list of all patients to Excel format, sent in chunks once the workbook is built"""
+    verify_access(credentials)
+    # Build filters
+    filters = {}
+    if sex:
+        filters['sex'] = sex
+    if min_age is not None:
+        filters['min_age'] = min_age
+    if max_age is not None:
+        filters['max_age'] = max_age
+
+    # Checked up front: once streaming starts the status code is already sent
+    if not has_patients(db, skip, filters):
+        raise HTTPException(
+            status_code=404,
+            detail="No patients found matching the specified criteria"
+        )
+
+    excel_stream = iter_all_patients_excel(skip, limit, filters)
+    return StreamingResponse(
+        excel_stream,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": "attachment; filename=all_patients.xlsx"}
+    )
+
+
+# Background export jobs
+@router.post("/jobs", response_model=ExportJobStatus, status_code=202)
+@limiter.limit("10/minute")
+def submit_export_job(
+    request: Request,
+    job: ExportJobRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
-    """Export paginated list of all patients to Excel format"""
+    """Queue an export to run in the background; identical requests reuse the cached artifact"""
     verify_access(credentials)
-    try:
-        # Build filters
+    if job.kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export kind. Use one of: {', '.join(EXPORT_KINDS)}")
+
+    if job.kind == "all_patients_excel":
+        if job.skip < 0 or not 1 <= job.limit <= export_config.max_export_records:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {export_config.max_export_records}")
         filters = {}
-        if sex:
-            filters['sex'] = sex
-        if min_age is not None:
-            filters['min_age'] = min_age
-        if max_age is not None:
-            filters['max_age'] = max_age
-        
-        excel_file = generate_all_patients_excel(db, skip, limit, filters)
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=all_patients.xlsx"}
-        )
-    except Exception as e:
-        if "No patients found" in str(e):
-            raise HTTPException(
-                status_code=404,
-                detail="No patients found matching the specified criteria"
-            )
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate export: {str(e)}"
-        )
\ No newline at end of file
+        if job.sex:
+            filters['sex'] = job.sex
+        if job.min_age is not None:
+            filters['min_age'] = job.min_age
+        if job.max_age is not None:
+            filters['max_age'] = job.max_age
+        params = {"skip": job.skip, "limit": job.limit, "filters": filters}
+    else:
+        if not job.patient_id:
+            raise HTTPException(status_code=400, detail="patient_id is required for single-patient exports")
+        if not db.query(Patient.id).filter(Patient.patient_id == job.patient_id).first():
+            raise HTTPException(status_code=404, detail="Patient not found")
+        params = {"patient_id": job.patient_id}
+
+    return export_job_manager.submit(db, job.kind, params)
+
+@router.get("/jobs/{job_id}", response_model=ExportJobStatus)
+def get_export_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Poll the status and progress (0-100) of an export job"""
+    verify_access(credentials)
+    status = export_job_manager.get_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return status
+
+@router.get("/jobs/{job_id}/download")
+def download_export_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Download the artifact of a completed export job"""
+    verify_access(credentials)
+    status = export_job_manager.get_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if status["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {status['status']}")
+    return FileResponse(
+        export_job_manager.artifact_path(job_id),
+        media_type=status["media_type"],
+        filename=status["filename"]
+    )
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
 from app.models import LaboratoryRecord, Patient
 from app.schemas import LaboratoryCreate, LaboratoryUpdate, LaboratoryOut, PatientSearchResponse
 from app.database import get_db
+from app.services.patient_search_service import PatientSearchService
+from app.services.pdf_renderer import pdf_renderer, LAB_REPORT
+from app.pagination import paginate_list, MAX_PAGE_SIZE
 from typing import List, Optional
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 import json
 import os
 from datetime import datetime
-from reportlab.pdfgen import canvas
 from io import BytesIO
-import requests  # For downloading the image
-from PIL import Image  # For image processing
-from reportlab.lib.utils import ImageReader  # For adding image to PDF
 
 router = APIRouter()
 
@@ -26,30 +25,14 @@ def search_patients(
     page: int = 1, size: int = 50,  # Pagination parameters
     db: Session = Depends(get_db)
 ):
-    query = db.query(Patient)
-
-    # Filter the query based on the search parameters provided
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    total = query.count()
-    patients = query.offset((page - 1) * size).limit(size).all()
-
-    if not patients:
-        raise HTTPException(status_code=404, detail="No patients found")
-
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "patients": patients,
-    }
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+    )
 
 # 2. Create Laboratory Record: When a healthcare provider wants to record a laboratory test
 @router.post("/{patient_id}/laboratory", response_model=LaboratoryOut)
@@ -88,6 +71,9 @@ def create_laboratory_record(
 @router.get("/{patient_id}/laboratory", response_model=List[LaboratoryOut])
 def get_laboratory_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     # Check if the patient exists
@@ -96,7 +82,8 @@ def get_laboratory_history_for_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Retrieve all laboratory records associated with the patient
-    records = db.query(LaboratoryRecord).filter(LaboratoryRecord.patient_id == patient_id).all()
+    query = db.query(LaboratoryRecord).filter(LaboratoryRecord.patient_id == patient_id)
+    records = paginate_list(query, response, [LaboratoryRecord.id], cursor, limit)
 
     if not records:
         return []  # Return empty list instead of 404 for no records found
@@ -181,66 +168,20 @@ async def download_laboratory_result(
         raise HTTPException(status_code=404, detail="Laboratory record not found")
 
     if format == "pdf":
-        # Create a PDF version of the report
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer)
-        
-        # Add image at the top center
-        image_url = "https://emr-5esm.vercel.app/renewal.png"
-        try:
-            # Download the image
-            import requests
-            from PIL import Image
-            from reportlab.lib.utils import ImageReader
-            
-            response = requests.get(image_url)
-            img = Image.open(BytesIO(response.content))
-            img_reader = ImageReader(img)
-            
-            # Calculate center position (assuming A4 page: 595x842 points)
-            img_width, img_height = img.size
-            scale_factor = min(500/img_width, 100/img_height)  # Limit to 500pt width or 100pt height
-            img_width *= scale_factor
-            img_height *= scale_factor
-            x_pos = (595 - img_width) / 2  # Center horizontally
-            
-            # Draw the image
-            p.drawImage(img_reader, x_pos, 750, width=img_width, height=img_height, preserveAspectRatio=True)
-            y_position = 740 - img_height  # Position content below the image
-        except Exception as e:
-            # If image fails to load, just continue without it
-            print(f"Failed to load image: {e}")
-            y_position = 800  # Start at the top if no image
-        
-        # Add content to PDF below the image
-        p.drawString(100, y_position, f"Laboratory Report for {patient.surname}, {patient.other_names}")
-        p.drawString(100, y_position - 20, f"Patient ID: {patient.patient_id}")
-        p.drawString(100, y_position - 40, f"Report Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        p.drawString(100, y_position - 60, "----------------------------------------")
-        
-        p.drawString(100, y_position - 80, "Tests Requested:")
-        p.drawString(120, y_position - 100, record.tests_requested_by_physicians)
-        
-        p.drawString(100, y_position - 120, "Test Results:")
-        p.drawString(120, y_position - 140, record.test_results)
-        
-        p.drawString(100, y_position - 160, "Reference Ranges:")
-        p.drawString(120, y_position - 180, record.reference_ranges)
-        
-        p.drawString(100, y_position - 200, "Pathologist Comments:")
-        p.drawString(120, y_position - 220, record.pathologist_comments)
-        
-        p.drawString(100, y_position - 240, "Specimen Type:")
-        p.drawString(120, y_position - 260, record.specimen_type)
-        
-        p.drawString(100, y_position - 280, "Collection Date:")
-        p.drawString(120, y_position - 300, str(record.date_time_of_collection))
-        
-        p.showPage()
-        p.save()
-        
-        buffer.seek(0)
-        
+        # Render in the PDF pool so the event loop is not blocked
+        pdf_bytes = await pdf_renderer.render_async(LAB_REPORT, {
+            "patient_name": f"{patient.surname}, {patient.other_names}",
+            "patient_id": patient.patient_id,
+            "report_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "tests_requested": record.tests_requested_by_physicians,
+            "test_results": record.test_results,
+            "reference_ranges": record.reference_ranges,
+            "pathologist_comments": record.pathologist_comments,
+            "specimen_type": record.specimen_type,
+            "collection_date": record.date_time_of_collection,
+        })
+        buffer = BytesIO(pdf_bytes)
+
         # Create a filename with patient and record info
         filename = f"lab_result_{patient.surname}_{record_id}_{datetime.now().date()}.pdf"
         
@@ -1,8 +1,20 @@
 from fastapi import HTTPException
 from smtplib import SMTPException
 from twilio.rest import Client
+import asyncio
 import logging
-from fastapi import APIRouter
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import SessionLocal, get_db
+from app.routes.v1.admin import decode_token, get_current_user
+from app.schemas import (
+    DepartmentNotificationCreate, DepartmentNotificationEvent, DepartmentNotificationOut, DepartmentNotificationReply
+)
+from app.services.department_notifications import DepartmentNotificationService, department_event_hub
+from app.services.principal_cache import Principal, principal_cache
 
 # Create the APIRouter instance
 router = APIRouter()
@@ -57,3 +69,109 @@ def send_notification(notification_type: str, recipient: str, message: str):
         send_push_notification(recipient, message)
     else:
         raise HTTPException(status_code=400, detail="Invalid notification type")
+
+# Department notifications
+
+@router.post("/departments", response_model=DepartmentNotificationOut, status_code=201)
+def create_department_notification(
+    notification: DepartmentNotificationCreate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return DepartmentNotificationService(db).create(
+        current_user.id, notification.receiver_departments, notification.message
+    )
+
+@router.post("/departments/{notification_id}/responses", response_model=DepartmentNotificationOut)
+def respond_to_department_notification(
+    notification_id: int,
+    reply: DepartmentNotificationReply,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return DepartmentNotificationService(db).respond(
+        notification_id, current_user.id, current_user.username, reply.message
+    )
+
+# Catch-up for a department: its events after `after_id`, oldest first
+@router.get("/departments/{department}/events", response_model=List[DepartmentNotificationEvent])
+def get_department_events(
+    department: str,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return DepartmentNotificationService(db).events_since(department, after_id, limit)
+
+def _authenticate(token: str) -> Optional[Principal]:
+    try:
+        username = decode_token(token).get("sub")
+    except HTTPException:
+        return None
+    if not username:
+        return None
+    db = SessionLocal()
+    try:
+        return principal_cache.get(db, username)
+    finally:
+        db.close()
+
+def _backlog(department: str, after_id: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        return DepartmentNotificationService(db).events_since(
+            department, after_id, settings.NOTIFICATION_STREAM_BACKLOG
+        )
+    finally:
+        db.close()
+
+async def _close_on_disconnect(websocket: WebSocket, subscription):
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        subscription.close()
+
+# Live department notifications. Each message is a DepartmentNotificationEvent;
+# reconnect with last_id set to the last event_id received to replay what was missed
+@router.websocket("/ws/{department}")
+async def department_notification_stream(
+    websocket: WebSocket,
+    department: str,
+    token: str = Query(...),
+    last_id: Optional[int] = Query(None, ge=0),
+):
+    principal = await run_in_threadpool(_authenticate, token)
+    if principal is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    # Subscribe before catching up, so nothing committed in between is lost
+    subscription = department_event_hub.subscribe(department)
+    watcher = asyncio.create_task(_close_on_disconnect(websocket, subscription))
+    try:
+        replayed = set()
+        while last_id is not None:
+            backlog = await run_in_threadpool(_backlog, department, last_id)
+            for payload in backlog:
+                await websocket.send_json(payload)
+                replayed.add(payload["event_id"])
+                last_id = payload["event_id"]
+            if len(backlog) < settings.NOTIFICATION_STREAM_BACKLOG:
+                break
+        while True:
+            payload = await subscription.get()
+            if payload is None:
+                break
+            if payload["event_id"] not in replayed:
+                await websocket.send_json(payload)
+        if not watcher.done():
+            # Fell behind or the worker is stopping: the client should resume
+            await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        department_event_hub.unsubscribe(subscription)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.models import OccupationalTherapyRecord, Patient
 from app.schemas import OccupationalTherapyCreate, OccupationalTherapyUpdate, OccupationalTherapyOut, PatientSearchResponse
 from app.database import get_db
+from app.services.patient_search_service import PatientSearchService
+from app.pagination import paginate_list, MAX_PAGE_SIZE
 from typing import List, Optional
 
 router = APIRouter()
@@ -18,30 +20,14 @@ def search_patients(
     page: int = 1, size: int = 50,  # Pagination parameters
     db: Session = Depends(get_db)
 ):
-    query = db.query(Patient)
-
-    # Filter the query based on the search parameters provided
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    total = query.count()
-    patients = query.offset((page - 1) * size).limit(size).all()
-
-    if not patients:
-        raise HTTPException(status_code=404, detail="No patients found")
-
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "patients": patients,
-    }
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+    )
 
 # 2. Add Occupational Therapy Record: Create a new occupational therapy record for a patient
 @router.post("/v1/patients/{patient_id}/occupationaltherapy", response_model=OccupationalTherapyOut)
@@ -83,6 +69,9 @@ def create_occupational_record(
 @router.get("/v1/patients/{patient_id}/occupationaltherapy", response_model=List[OccupationalTherapyOut])
 def get_occupational_therapy_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     # Check if the patient exists
@@ -91,7 +80,8 @@ def get_occupational_therapy_history_for_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Retrieve all occupational therapy records associated with the patient
-    records = db.query(OccupationalTherapyRecord).filter(OccupationalTherapyRecord.patient_id == patient_id).all()
+    query = db.query(OccupationalTherapyRecord).filter(OccupationalTherapyRecord.patient_id == patient_id)
+    records = paginate_list(query, response, [OccupationalTherapyRecord.id], cursor, limit)
 
     if not records:
         return []  # Return empty list instead of 404 for no records found
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
 from sqlalchemy.orm import Session
-from typing import List
-from app.models import Patient, AuditLog, User
+from typing import List, Optional
+from app.models import Patient
 from app.schemas import PatientCreate, PatientUpdate, PatientOut
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.pagination import paginate_list, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.services.dashboard_service import DashboardService  # Import the DashboardService
 import logging
 from pydantic import ValidationError
 from fastapi import HTTPException  # Import HTTPException
+from app.services.principal_cache import Principal
 from app.routes.v1.admin import get_current_user 
+from app.services.audit_logger import audit_log_writer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -27,7 +30,7 @@ def create_patient(
     patient: PatientCreate, 
     request: Request,  # Moved request before default arguments
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Add current user dependency
+    current_user: Principal = Depends(get_current_user)  # Add current user dependency
 ):
     try:
         logger.info(f"Creating new patient entry. User: {current_user.username}")
@@ -40,15 +43,13 @@ def create_patient(
         db.refresh(new_patient)
         
         # Generate audit log for successful creation
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="patient_created",
             user_id=current_user.id,
             description=f"Created patient {new_patient.surname} {new_patient.other_names} (ID: {new_patient.patient_id})",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         patient_id = new_patient.patient_id
         hospital_reg_number = new_patient.hospital_reg_number
@@ -71,15 +72,13 @@ def create_patient(
 
     except ValidationError as e:
         # Log failed attempt with validation error
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="patient_creation_failed",
             user_id=current_user.id if current_user else None,
             description=f"Validation error while creating patient: {str(e.errors())}",
             ip_address=request.client.host if request else None,
             user_agent=request.headers.get("user-agent") if request else None
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Validation error while creating patient: {e.errors()}")
         raise HTTPException(
@@ -91,15 +90,13 @@ def create_patient(
         db.rollback()
         
         # Log system error during creation
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="patient_creation_error",
             user_id=current_user.id if current_user else None,
             description=f"System error while creating patient: {str(e)}",
             ip_address=request.client.host if request else None,
             user_agent=request.headers.get("user-agent") if request else None
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Error registering patient: {e}")
         raise HTTPException(
@@ -120,10 +117,20 @@ def get_patient(patient_id: str, db: Session = Depends(get_db)):
 
 # GET: Retrieve all patients
 @router.get("/", response_model=List[PatientOut])
-def get_all_patients(db: Session = Depends(get_db)):
+def get_all_patients(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     try:
-        patients = db.query(Patient).all()
+        # Always paged, ordered by (surname, id); follow X-Next-Cursor for the next page
+        patients = paginate_list(
+            db.query(Patient), response, [Patient.surname, Patient.id], cursor, limit or DEFAULT_PAGE_SIZE
+        )
         return patients
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="An error occurred while fetching patients.")
 
@@ -162,12 +169,17 @@ def delete_patient(patient_id: str, db: Session = Depends(get_db)):
 
 # GET: Retrieve a patient's dashboard data
 @router.get("/{patient_id}/dashboard")
-def get_patient_dashboard(patient_id: str, db: Session = Depends(get_db)):
+def get_patient_dashboard(patient_id: str, response: Response, db: Session = Depends(get_read_db)):
     try:
         # Initialize DashboardService and fetch the data
         dashboard_service = DashboardService(db)
         patient_dashboard_data = dashboard_service.get_patient_dashboard_data(patient_id)
 
+        # Per-phase timings, readable in the browser's network panel
+        response.headers["Server-Timing"] = ", ".join(
+            f"{section};dur={duration}" for section, duration in dashboard_service.timings.items()
+        )
+
         # Check if there's an error in the data and raise HTTPException if needed
         if "error" in patient_dashboard_data:
             raise HTTPException(status_code=404, detail=patient_dashboard_data["error"])
@@ -175,6 +187,8 @@ def get_patient_dashboard(patient_id: str, db: Session = Depends(get_db)):
         # Return the dashboard data if everything is fine
         return patient_dashboard_data
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the exception with more details
         logger.error(f"Error while fetching dashboard data for patient {patient_id}: {e}", exc_info=True)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, status, Response, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, date
 from typing import List, Optional
@@ -7,23 +8,23 @@ from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 import json
 import logging
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from io import BytesIO
-import requests
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 # Add to imports at the top
 import random
 import string
+from app.services.principal_cache import Principal
 from app.routes.v1.admin import get_current_user 
 
-from app.models import PharmacyRecord, Drug, Patient, Billing, Stock, User, AuditLog
+from app.models import PharmacyRecord, Patient, Billing, Stock
 from app.database import get_db
+from app.services.patient_search_service import PatientSearchService
+from app.services.audit_logger import audit_log_writer
+from app.services.drug_catalog import drug_catalog_cache
+from app.services.pdf_renderer import pdf_renderer, PHARMACY_RECEIPT, WALKIN_RECEIPT, MAX_BATCH_RECEIPTS
+from app.services.stock_service import StockReservationService, InsufficientStockError, DISPENSE, SALE
+from app.pagination import paginate_list, MAX_PAGE_SIZE
 from app.schemas import (
     PharmacyRecordCreate, PharmacyRecordUpdate, PharmacyOut, 
-    DrugOut, PatientSearchResponse, BillingOut, DrugOrder, ReceiptTemplate
+    DrugOut, PatientSearchResponse, BillingOut, DrugOrder, ReceiptTemplate, ReceiptBatchRequest
 )
 
 router = APIRouter()
@@ -53,11 +54,11 @@ def get_pharmacy_record(record_id: int, patient_id: str, db: Session):
 
 # Dependency to get drug by ID
 def get_drug(drug_id: int, db: Session):
-    drug = db.query(Drug).filter(Drug.id == drug_id).first()
-    if not drug:
+    try:
+        return drug_catalog_cache.get_drug(db, drug_id)
+    except HTTPException:
         logger.error(f"Drug with ID {drug_id} not found")
-        raise HTTPException(status_code=404, detail=f"Drug with ID {drug_id} not found")
-    return drug
+        raise
 
 # Dependency to get stock by drug ID
 def get_stock(drug_id: int, db: Session):
@@ -87,30 +88,15 @@ def search_patients(
     sort_by: Optional[str] = 'surname',
     db: Session = Depends(get_db)
 ):
-    query = db.query(Patient)
-
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    if sort_by == "surname":
-        query = query.order_by(Patient.surname)
-    elif sort_by == "hospital_reg_number":
-        query = query.order_by(Patient.hospital_reg_number)
-
-    total = query.order_by(None).count()
-    patients = query.offset((page - 1) * size).limit(size).all()
-
-    if not patients:
-        logger.warning("No patients found for the given search criteria")
-        raise HTTPException(status_code=404, detail="No patients found")
-
-    return {"total_records": total, "page": page, "size": size, "patients": patients}
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+        sort_by=sort_by,
+    )
 
 # 2. Create Pharmacy Record
 @router.post("/patients/{patient_id}/pharmacy", response_model=PharmacyOut)
@@ -119,7 +105,7 @@ def create_pharmacy_record(
     pharmacy: PharmacyRecordCreate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new pharmacy record with audit logging"""
     try:
@@ -131,69 +117,49 @@ def create_pharmacy_record(
         if not billing:
             billing = Billing(patient_id=patient_id, amount=Decimal("0.00"), doctor_id=1, invoice_status='not_generated', status='Unpaid')
             db.add(billing)
-            db.commit()
-            db.refresh(billing)
+            db.flush()
 
         # Explicit check for billing ID
         if not billing or not billing.billing_id:
-            audit_log = AuditLog(
+            audit_log_writer.enqueue(
                 action="pharmacy_record_failed",
                 user_id=current_user.id,
                 description=f"Failed to create/get billing record for patient {patient_id}",
                 ip_address=request.client.host,
                 user_agent=request.headers.get("user-agent")
             )
-            db.add(audit_log)
-            db.commit()
             raise HTTPException(
                 status_code=500,
                 detail="Failed to process billing information"
             )
 
-        # Rest of the existing code remains exactly the same...
-        # Process drug orders
-        drug_orders_list = []
-        total_price = Decimal("0.00")
-        drugs_processed = []
-
-        for drug_order in pharmacy.drug_orders:
-            drug = get_drug(drug_order.drug_id, db)
-            stock = get_stock(drug_order.drug_id, db)
-
-            if stock.quantity < drug_order.quantity:
-                audit_log = AuditLog(
-                    action="pharmacy_record_failed",
-                    user_id=current_user.id,
-                    description=f"Insufficient stock for drug {drug.name} (Available: {stock.quantity}, Requested: {drug_order.quantity})",
-                    ip_address=request.client.host,
-                    user_agent=request.headers.get("user-agent")
-                )
-                db.add(audit_log)
-                db.commit()
-                
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Insufficient stock for drug {drug.name}. Available: {stock.quantity}, Requested: {drug_order.quantity}"
-                )
-
-            price = drug_order.price if drug_order.price is not None else drug.price
-            total_price += round(Decimal(str(price)) * Decimal(str(drug_order.quantity)), 2)
-
-            stock.quantity -= drug_order.quantity
-            db.commit()
-
-            drugs_processed.append({
-                "name": drug.name,
-                "quantity": drug_order.quantity,
-                "price": str(price)
-            })
-
-            drug_orders_list.append({
-                "drug_id": drug_order.drug_id,
-                "drug_name": drug.name,
-                "quantity": drug_order.quantity,
-                "price": float(price)
-            })
+        # Lock, validate and decrement stock for the whole basket at once
+        try:
+            reserved = StockReservationService(db).reserve(
+                pharmacy.drug_orders, DISPENSE, reference=f"billing:{billing.billing_id}", user_id=current_user.id
+            )
+        except InsufficientStockError as e:
+            audit_log_writer.enqueue(
+                action="pharmacy_record_failed",
+                user_id=current_user.id,
+                description=f"Insufficient stock for drug {e.drug.name} (Available: {e.available}, Requested: {e.requested})",
+                ip_address=request.client.host,
+                user_agent=request.headers.get("user-agent")
+            )
+            raise
+
+        total_price = sum((line.total for line in reserved), Decimal("0.00"))
+        drugs_processed = [{
+            "name": line.drug.name,
+            "quantity": line.quantity,
+            "price": str(line.price)
+        } for line in reserved]
+        drug_orders_list = [{
+            "drug_id": line.drug.id,
+            "drug_name": line.drug.name,
+            "quantity": line.quantity,
+            "price": float(line.price)
+        } for line in reserved]
 
         # Create new pharmacy record
         new_record = PharmacyRecord(
@@ -207,16 +173,17 @@ def create_pharmacy_record(
         )
 
         db.add(new_record)
-        db.commit()
-        db.refresh(new_record)
 
         # Update billing
         billing.amount = (billing.amount or Decimal("0.00")) + total_price
+
+        # Stock, record and billing are committed together
         db.commit()
+        db.refresh(new_record)
 
         # Fixed f-string syntax for drug list
         drug_list = ", ".join([f"{d['name']} (x{d['quantity']})" for d in drugs_processed])
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_created",
             user_id=current_user.id,
             description=(
@@ -226,22 +193,21 @@ def create_pharmacy_record(
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return new_record
 
+    except HTTPException:
+        db.rollback()
+        raise
     except SQLAlchemyError as e:
         db.rollback()
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_error",
             user_id=current_user.id,
             description=f"Database error while creating pharmacy record: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Database error while creating pharmacy record: {str(e)}")
         raise HTTPException(
@@ -251,15 +217,13 @@ def create_pharmacy_record(
 
     except Exception as e:
         db.rollback()
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_error",
             user_id=current_user.id,
             description=f"Unexpected error while creating pharmacy record: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(
@@ -271,10 +235,14 @@ def create_pharmacy_record(
 @router.get("/patients/{patient_id}/pharmacy", response_model=List[PharmacyOut])
 def get_pharmacy_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     patient = get_patient(patient_id, db)
-    records = db.query(PharmacyRecord).filter(PharmacyRecord.patient_id == patient_id).all()
+    query = db.query(PharmacyRecord).filter(PharmacyRecord.patient_id == patient_id)
+    records = paginate_list(query, response, [PharmacyRecord.pharmacy_id], cursor, limit)
 
     for record in records:
         if record.drug_orders is None:
@@ -323,7 +291,7 @@ def delete_pharmacy_record(
     record_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a pharmacy record with audit logging"""
     try:
@@ -339,7 +307,7 @@ def delete_pharmacy_record(
         db.commit()
 
         # Create audit log
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_deleted",
             user_id=current_user.id,
             description=(
@@ -349,22 +317,18 @@ def delete_pharmacy_record(
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
 
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     except SQLAlchemyError as e:
         db.rollback()
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_delete_error",
             user_id=current_user.id,
             description=f"Database error while deleting pharmacy record {record_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Database error while deleting pharmacy record: {str(e)}")
         raise HTTPException(
@@ -374,15 +338,13 @@ def delete_pharmacy_record(
 
     except Exception as e:
         db.rollback()
-        audit_log = AuditLog(
+        audit_log_writer.enqueue(
             action="pharmacy_record_delete_error",
             user_id=current_user.id,
             description=f"Unexpected error while deleting pharmacy record {record_id}: {str(e)}",
             ip_address=request.client.host,
             user_agent=request.headers.get("user-agent")
         )
-        db.add(audit_log)
-        db.commit()
         
         logger.error(f"Unexpected error while deleting pharmacy record: {str(e)}")
         raise HTTPException(
@@ -392,12 +354,16 @@ def delete_pharmacy_record(
 
 # 6. Get All Drugs
 @router.get("/drugs", response_model=List[DrugOut])
-def get_all_drugs(db: Session = Depends(get_db)):
-    drugs = db.query(Drug).all()
-    if not drugs:
+def get_all_drugs(request: Request, response: Response, db: Session = Depends(get_db)):
+    catalog = drug_catalog_cache.get(db)
+    if not catalog.drugs:
         logger.warning("No drugs found in the database")
         raise HTTPException(status_code=404, detail="No drugs found")
-    return drugs
+    # The pharmacy screen re-fetches the catalog on every patient switch
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=304, headers={"ETag": catalog.etag})
+    response.headers["ETag"] = catalog.etag
+    return catalog.drugs
 
 # 7. Mark Pharmacy Record as Paid (Cannot Be Undone)
 @router.patch("/patients/{patient_id}/pharmacy/{record_id}/mark-as-paid", response_model=PharmacyOut)
@@ -421,81 +387,24 @@ def mark_pharmacy_record_as_paid(
     return record
 
 # 8. Download Receipt (Updated with better formatting and drug name)
-def generate_receipt_pdf(record, patient, db: Session, logo_url="https://emr-5esm.vercel.app/renewal.png"):
-    buffer = BytesIO()
-    pdf = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    content = []
-
-    # Try to fetch the logo
-    try:
-        response = requests.get(logo_url, timeout=10)
-        response.raise_for_status()
-        logo_img = Image(BytesIO(response.content), width=200, height=100)
-        content.append(logo_img)
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"Could not load logo image: {e}")
-        content.append(Paragraph("Pharmacy Receipt", styles['Title']))
-
-    content.append(Spacer(1, 12))
-
-    # Add a title
-    title = Paragraph("Pharmacy Receipt", styles['Title'])
-    content.append(title)
-    content.append(Spacer(1, 12))
-
-    # Add patient and record details
-    patient_details = [
-        f"Patient: {patient.surname}, {patient.other_names}",
-        f"Medication: {record.medication_name}",
-        f"Dosage and Route: {record.dosage_and_route}",
-        f"Frequency: {record.frequency}",
-        f"Dispensation Date: {record.dispensation_date}",
-    ]
-    for detail in patient_details:
-        content.append(Paragraph(detail, styles['BodyText']))
-        content.append(Spacer(1, 6))
-
-    # Add a table for drug orders
-    drug_orders = [["Drug Name", "Quantity", "Price"]]
-    for order in record.drug_orders:
+def pharmacy_receipt_data(record, patient, db: Session) -> dict:
+    """Plain receipt fields for the PDF renderer, with drug names filled in from the catalog."""
+    drug_orders = []
+    for order in record.drug_orders or []:
         # Ensure drug_name exists in the order
-        if "drug_name" not in order:
-            drug = get_drug(order["drug_id"], db)
-            order["drug_name"] = drug.name  # Fetch drug name from the database
-
-        drug_orders.append([order["drug_name"], order["quantity"], f"NGN{order['price']:.2f}"])
-
-    table = Table(drug_orders)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    content.append(Spacer(1, 12))
-    content.append(table)
-
-    # Add total cost
-    total_cost = sum(order["price"] * order["quantity"] for order in record.drug_orders)
-    total_cost_paragraph = Paragraph(f"Total Cost: NGN{total_cost:.2f}", styles['BodyText'])
-    content.append(Spacer(1, 12))
-    content.append(total_cost_paragraph)
-
-    # Add a footer
-    footer = Paragraph("Thank you for choosing our pharmacy. For inquiries, contact support@example.com.", styles['Italic'])
-    content.append(Spacer(1, 12))
-    content.append(footer)
-
-    # Build the PDF
-    pdf.build(content)
-
-    # Return the PDF as bytes
-    buffer.seek(0)
-    return buffer.getvalue()
+        drug_name = order.get("drug_name") or get_drug(order["drug_id"], db).name
+        drug_orders.append({"drug_name": drug_name, "quantity": order["quantity"], "price": order["price"]})
+    return {
+        "patient_name": f"{patient.surname}, {patient.other_names}",
+        "medication_name": record.medication_name,
+        "dosage_and_route": record.dosage_and_route,
+        "frequency": record.frequency,
+        "dispensation_date": record.dispensation_date,
+        "drug_orders": drug_orders,
+    }
+
+def generate_receipt_pdf(record, patient, db: Session):
+    return pdf_renderer.render(PHARMACY_RECEIPT, pharmacy_receipt_data(record, patient, db))
 
 @router.get("/patients/{patient_id}/pharmacy/{record_id}/download-receipt")
 def download_receipt(
@@ -521,6 +430,36 @@ def download_receipt(
     return Response(pdf_bytes, headers=headers)
 
 
+@router.post("/receipts/batch", response_class=Response)
+def download_receipt_batch(
+    batch: ReceiptBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """Print many paid pharmacy receipts as one multi-page PDF (e.g. all of a day's dispensing)."""
+    query = (
+        db.query(PharmacyRecord)
+        .options(joinedload(PharmacyRecord.patient))
+        .filter(PharmacyRecord.is_paid.is_(True))
+    )
+    if batch.ids:
+        query = query.filter(PharmacyRecord.pharmacy_id.in_(batch.ids))
+    if batch.day:
+        query = query.filter(func.date(PharmacyRecord.dispensation_date) == batch.day)
+    records = query.order_by(PharmacyRecord.dispensation_date, PharmacyRecord.pharmacy_id).limit(MAX_BATCH_RECEIPTS + 1).all()
+
+    if not records:
+        raise HTTPException(status_code=404, detail="No paid pharmacy records found")
+
+    pdf_bytes = pdf_renderer.render_batch([
+        (PHARMACY_RECEIPT, pharmacy_receipt_data(record, record.patient, db)) for record in records
+    ])
+    headers = {
+        "Content-Disposition": f"attachment; filename=pharmacy_receipts_{batch.day or datetime.utcnow().date()}.pdf",
+        "Content-Type": "application/pdf",
+    }
+    return Response(pdf_bytes, headers=headers)
+
+
 # 9. Process Walk-in Sale
 class WalkInOrder(BaseModel):
     drug_orders: List[DrugOrder]
@@ -536,47 +475,20 @@ def process_walkin_sale(
     invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{''.join(random.choices(string.digits, k=8))}"
 
     # Process drug orders
-    drug_orders_list = []
     total_price = Decimal("0.00")
     receipt_items = []
 
     try:
-        for drug_order in order.drug_orders:
-            drug = get_drug(drug_order.drug_id, db)
-            stock = get_stock(drug_order.drug_id, db)
-
-            # Check if sufficient stock is available
-            if stock.quantity < drug_order.quantity:
-                logger.error(f"Insufficient stock for drug {drug.name}. Available: {stock.quantity}, Requested: {drug_order.quantity}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Insufficient stock for drug {drug.name}. Available: {stock.quantity}, Requested: {drug_order.quantity}"
-                )
-
-            # Use provided price or fetch from Drug model
-            price = drug_order.price if drug_order.price is not None else drug.price
-
-            # Calculate total price for this drug order
-            item_total = round(Decimal(str(price)) * Decimal(str(drug_order.quantity)), 2)
-            total_price += item_total
-
-            # Reduce stock quantity (this will be committed if everything succeeds)
-            stock.quantity -= drug_order.quantity
+        # Lock, validate and decrement stock for the whole basket at once
+        reserved = StockReservationService(db).reserve(order.drug_orders, SALE, reference=f"walkin:{pharmacy_id}")
 
-            # Add to receipt items
+        for line in reserved:
+            total_price += line.total
             receipt_items.append({
-                "name": drug.name,
-                "quantity": drug_order.quantity,
-                "unit_price": float(price),
-                "total": float(item_total)
-            })
-
-            # Add drug order to the list (for potential rollback)
-            drug_orders_list.append({
-                "drug_id": drug_order.drug_id,
-                "drug_name": drug.name,
-                "quantity": drug_order.quantity,
-                "price": float(price)
+                "name": line.drug.name,
+                "quantity": line.quantity,
+                "unit_price": float(line.price),
+                "total": float(line.total)
             })
 
         # Commit all stock deductions at once
@@ -598,81 +510,22 @@ def process_walkin_sale(
         }
         return Response(pdf_bytes, headers=headers)
 
+    except HTTPException as e:
+        db.rollback()
+        logger.error(f"Error processing walk-in sale: {e.detail}")
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error processing walk-in sale: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def generate_walkin_receipt(pharmacy_id: str, invoice_number: str, customer_name: str, items: list, total: float, logo_url="http://localhost:3000/renewal.png"):
-    buffer = BytesIO()
-    pdf = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    content = []
-
-    # Try to fetch the logo
-    try:
-        response = requests.get(logo_url, timeout=10)
-        response.raise_for_status()
-        logo_img = Image(BytesIO(response.content), width=200, height=100)
-        content.append(logo_img)
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"Could not load logo image: {e}")
-        content.append(Paragraph("Pharmacy Receipt", styles['Title']))
-
-    content.append(Spacer(1, 12))
-
-    # Add receipt title and info
-    title = Paragraph("PHARMACY RECEIPT (WALK-IN SALE)", styles['Title'])
-    content.append(title)
-    content.append(Spacer(1, 12))
-
-    # Add receipt details
-    details = [
-        f"Receipt ID: {pharmacy_id}",
-        f"Invoice Number: {invoice_number}",
-        f"Customer: {customer_name}",
-        f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-    ]
-    for detail in details:
-        content.append(Paragraph(detail, styles['BodyText']))
-        content.append(Spacer(1, 6))
-
-    content.append(Spacer(1, 12))
-
-    # Add items table
-    table_data = [["Item", "Qty", "Unit Price", "Total"]]
-    for item in items:
-        table_data.append([
-            item["name"],
-            str(item["quantity"]),
-            f"NGN{item['unit_price']:.2f}",
-            f"NGN{item['total']:.2f}"
-        ])
-
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    content.append(table)
-    content.append(Spacer(1, 12))
-
-    # Add total
-    total_paragraph = Paragraph(f"TOTAL: NGN{total:.2f}", styles['Heading2'])
-    content.append(total_paragraph)
-    content.append(Spacer(1, 24))
-
-    # Add footer
-    footer = Paragraph("Thank you for your purchase! This is a walk-in sale receipt.", styles['Italic'])
-    content.append(footer)
-
-    # Build PDF
-    pdf.build(content)
-    buffer.seek(0)
-    return buffer.getvalue()
+def generate_walkin_receipt(pharmacy_id: str, invoice_number: str, customer_name: str, items: list, total: float):
+    return pdf_renderer.render(WALKIN_RECEIPT, {
+        "pharmacy_id": pharmacy_id,
+        "invoice_number": invoice_number,
+        "customer_name": customer_name,
+        "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "items": items,
+        "total": total,
+    })
 
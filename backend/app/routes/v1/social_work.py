@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.models import SocialWorkRecord, Patient
 from app.schemas import SocialWorkCreate, SocialWorkUpdate, SocialWorkOut, PatientSearchResponse
 from app.database import get_db
+from app.services.patient_search_service import PatientSearchService
+from app.pagination import paginate_list, MAX_PAGE_SIZE
 from typing import List, Optional
 
 router = APIRouter()
@@ -18,30 +20,14 @@ def search_patients(
     page: int = 1, size: int = 50,  # Pagination parameters
     db: Session = Depends(get_db)
 ):
-    query = db.query(Patient)
-
-    # Filter the query based on the search parameters provided
-    if patient_id:
-        query = query.filter(Patient.patient_id.ilike(f"%{patient_id}%"))
-    if surname:
-        query = query.filter(Patient.surname.ilike(f"%{surname}%"))
-    if other_names:
-        query = query.filter(Patient.other_names.ilike(f"%{other_names}%"))
-    if hospital_reg_number:
-        query = query.filter(Patient.hospital_reg_number.ilike(f"%{hospital_reg_number}%"))
-
-    total = query.count()
-    patients = query.offset((page - 1) * size).limit(size).all()
-
-    if not patients:
-        raise HTTPException(status_code=404, detail="No patients found")
-
-    return {
-        "total_records": total,
-        "page": page,
-        "size": size,
-        "patients": patients,
-    }
+    return PatientSearchService(db).search(
+        patient_id=patient_id,
+        surname=surname,
+        other_names=other_names,
+        hospital_reg_number=hospital_reg_number,
+        page=page,
+        size=size,
+    )
 
 # 2. Add Social Work Record: When a healthcare provider wants to record new social work information for a patient
 @router.post("/v1/patients/{patient_id}/socialwork", response_model=SocialWorkOut)
@@ -82,6 +68,9 @@ def create_social_work_record(
 @router.get("/v1/patients/{patient_id}/socialwork", response_model=List[SocialWorkOut])
 def get_social_work_history_for_patient(
     patient_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
     # Check if the patient exists
@@ -90,7 +79,8 @@ def get_social_work_history_for_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Retrieve all social work records associated with the patient
-    records = db.query(SocialWorkRecord).filter(SocialWorkRecord.patient_id == patient_id).all()
+    query = db.query(SocialWorkRecord).filter(SocialWorkRecord.patient_id == patient_id)
+    records = paginate_list(query, response, [SocialWorkRecord.id], cursor, limit)
 
     if not records:
         return []  # Return empty list instead of 404 for no records found
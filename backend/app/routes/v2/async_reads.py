@@ -0,0 +1,178 @@
+# Async variants of the hottest read endpoints. They run on the event loop
+# with an AsyncSession (asyncpg), so a request waiting on a slow database
+# holds no threadpool thread. Query logic is shared with the sync routes via
+# AsyncSession.run_sync, and rows are converted to response schemas inside
+# run_sync so nothing lazy-loads after it returns.
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal, get_async_db
+from app.models import (
+    Appointment, AuditLog, Billing, ClinicalNote, LaboratoryRecord, MentalHealthNote, NursesNote,
+    OccupationalTherapyRecord, Patient, PharmacyRecord, SocialWorkRecord
+)
+from app.pagination import keyset_paginate, paginate_list, CURSOR_HEADER, MAX_PAGE_SIZE
+from app.services.principal_cache import Principal
+from app.routes.v1.admin import get_current_user
+from app.routes.v1.audit_logs import audit_log_query, require_admin
+from app.schemas import (
+    AppointmentOut, BillingOut, ClinicalOut, DrugOut, LaboratoryOut, MentalHealthOut, NursesNoteOut,
+    OccupationalTherapyOut, PatientOut, PatientSearchResponse, PharmacyOut, SocialWorkOut, UserAuditLogSchema
+)
+from app.services.drug_catalog import drug_catalog_cache, stock_totals
+from app.services.patient_search_service import PatientSearchService
+
+router = APIRouter()
+
+# History section -> (model, response schema, keyset sort key), matching the v1 department routes
+HISTORY_SECTIONS = {
+    "appointments": (Appointment, AppointmentOut, [Appointment.appointment_id]),
+    "billings": (Billing, BillingOut, [Billing.billing_id]),
+    "clinical-notes": (ClinicalNote, ClinicalOut, [ClinicalNote.id]),
+    "laboratory": (LaboratoryRecord, LaboratoryOut, [LaboratoryRecord.id]),
+    "mental-health": (MentalHealthNote, MentalHealthOut, [MentalHealthNote.mental_health_id]),
+    "nurses-notes": (NursesNote, NursesNoteOut, [NursesNote.id]),
+    "occupational-therapy": (OccupationalTherapyRecord, OccupationalTherapyOut, [OccupationalTherapyRecord.id]),
+    "pharmacy": (PharmacyRecord, PharmacyOut, [PharmacyRecord.pharmacy_id]),
+    "social-work": (SocialWorkRecord, SocialWorkOut, [SocialWorkRecord.id]),
+}
+
+
+def patient_history(
+    session: Session,
+    patient_id: str,
+    section: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> list:
+    """
+    Records of one HISTORY_SECTIONS section as response schemas. Several
+    schemas (and nested ones such as FeeOut) do not set from_attributes, so
+    ORM rows are validated with from_attributes=True, as response_model would.
+    """
+    model, schema, columns = HISTORY_SECTIONS[section]
+    query = session.query(model).filter(model.patient_id == patient_id)
+    records = paginate_list(query, response, columns, cursor, limit)
+    if model is PharmacyRecord:
+        return [_pharmacy_out(record) for record in records]
+    return [schema.model_validate(record, from_attributes=True) for record in records]
+
+
+def _pharmacy_out(record: PharmacyRecord) -> PharmacyOut:
+    # As the v1 pharmacy history: dispensation_date is stored as a DateTime
+    # and drug_orders may be NULL
+    fields = {name: getattr(record, name) for name in PharmacyOut.model_fields}
+    if isinstance(record.dispensation_date, datetime):
+        fields["dispensation_date"] = record.dispensation_date.date()
+    fields["drug_orders"] = record.drug_orders or []
+    return PharmacyOut.model_validate(fields)
+
+
+@router.get("/patients/search", response_model=PatientSearchResponse)
+async def search_patients(
+    patient_id: Optional[str] = None,
+    surname: Optional[str] = None,
+    other_names: Optional[str] = None,
+    hospital_reg_number: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    size: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    sort_by: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    def search(session):
+        result = PatientSearchService(session).search(
+            patient_id=patient_id,
+            surname=surname,
+            other_names=other_names,
+            hospital_reg_number=hospital_reg_number,
+            page=page,
+            size=size,
+            sort_by=sort_by,
+        )
+        return PatientSearchResponse.model_validate(result)
+
+    return await db.run_sync(search)
+
+
+@router.get("/patients/{patient_id}", response_model=PatientOut)
+async def get_patient(patient_id: str, db: AsyncSession = Depends(get_async_db)):
+    patient = (await db.execute(select(Patient).where(Patient.patient_id == patient_id))).scalar_one_or_none()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return patient
+
+
+@router.get("/patients/{patient_id}/{section}")
+async def get_patient_history(
+    patient_id: str,
+    section: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """One history section of a patient (pharmacy, laboratory, clinical-notes, ...), optionally paged."""
+    if section not in HISTORY_SECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown history section: {section}")
+    return await db.run_sync(patient_history, patient_id, section, response, cursor, limit)
+
+
+def _load_drugs() -> List[DrugOut]:
+    db = SessionLocal()
+    try:
+        return drug_catalog_cache.drugs(db)
+    finally:
+        db.close()
+
+
+@router.get("/drugs", response_model=List[DrugOut])
+async def get_drugs(db: AsyncSession = Depends(get_async_db)):
+    # Drug attributes come from the catalog cache and stock totals from one
+    # GROUP BY. A miss loads on a threadpool thread with the sync engine: the
+    # cache's load lock is a threading.Lock, and holding it across an await
+    # (run_sync) would deadlock the event loop
+    catalog = drug_catalog_cache.cached()
+    if catalog is None:
+        return await run_in_threadpool(_load_drugs)
+    return catalog.with_stock(await db.run_sync(stock_totals)).drugs
+
+
+@router.get("/audit-logs", response_model=List[UserAuditLogSchema])
+async def get_audit_logs(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    time_frame: Optional[str] = Query(None, description="Time frame filter (day, week, month, year, total)"),
+    start_date: Optional[str] = Query(None, description="Start date for custom range (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date for custom range (YYYY-MM-DD)"),
+    action: Optional[str] = Query(None, description="Filter by action type (e.g., 'login', 'patient_create')"),
+    entity_type: Optional[str] = Query(None, description="Filter by entity type (e.g., 'Patient', 'Billing')"),
+    entity_id: Optional[str] = Query(None, description="Filter by specific entity ID"),
+    user_id: Optional[int] = Query(None, description="Filter by user ID who performed the action"),
+    limit: Optional[int] = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of logs to return (default: 100)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    include_user: Optional[bool] = Query(True, description="Include detailed user information")
+):
+    """Async variant of /v1/audit/audit-logs/. Requires admin privileges."""
+    require_admin(current_user)
+
+    def logs_page(session):
+        query = audit_log_query(
+            session, time_frame, start_date, end_date, action, entity_type, entity_id, user_id, include_user
+        )
+        logs, next_cursor = keyset_paginate(
+            query, [AuditLog.timestamp, AuditLog.id], cursor=cursor, limit=limit or 100, descending=True
+        )
+        return [UserAuditLogSchema.model_validate(log) for log in logs], next_cursor
+
+    logs, next_cursor = await db.run_sync(logs_page)
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return logs
@@ -697,6 +697,31 @@ class UpdateNotificationStatusSchema(BaseModel):
     class Config:
         from_attributes = True
 
+# Department notifications (pushed over /v1/notifications/ws/{department})
+class DepartmentNotificationCreate(BaseModel):
+    receiver_departments: List[str]
+    message: str
+
+class DepartmentNotificationReply(BaseModel):
+    message: str
+
+class DepartmentNotificationOut(BaseModel):
+    id: int
+    sender_id: Optional[int] = None
+    receiver_departments: List[str]
+    message: str
+    responses: List[dict] = []
+    is_read: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class DepartmentNotificationEvent(DepartmentNotificationOut):
+    event_id: int
+    event: str  # 'created' or 'response'
+    created_at: Optional[str] = None
+
 #dashboard service
 from pydantic import BaseModel
 
@@ -841,6 +866,17 @@ class ReceiptTemplate(BaseModel):
     dispensation_date: date
     drug_orders: List[DrugOrderTemplate]
 
+class ReceiptBatchRequest(BaseModel):
+    """Receipts to print in one PDF: explicit IDs, or everything paid on a day."""
+    ids: Optional[List[int]] = None
+    day: Optional[date] = None
+
+    @validator("day", always=True)
+    def ids_or_day(cls, day, values):
+        if not values.get("ids") and day is None:
+            raise ValueError("Provide receipt ids or a day")
+        return day
+
 class PasswordChange(BaseModel):
     current_password: str
     new_password: str
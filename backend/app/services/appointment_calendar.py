@@ -0,0 +1,108 @@
+# services/appointment_calendar.py
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models import Appointment, Patient
+from app.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+
+# Calendar views and the length of their window
+VIEWS = {
+    "day": timedelta(days=1),
+    "week": timedelta(days=7),
+}
+
+# Sort key of every calendar listing: chronological, ties broken by id
+CALENDAR_ORDER = [Appointment.appointment_date, Appointment.appointment_id]
+
+
+def calendar_window(view: str, day: date) -> Tuple[datetime, datetime]:
+    """The [start, end) datetimes of the `view` containing `day`; weeks start on Monday."""
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown calendar view '{view}'. Use one of: {', '.join(VIEWS)}")
+    if view == "week":
+        day = day - timedelta(days=day.weekday())
+    start = datetime.combine(day, time.min)
+    return start, start + VIEWS[view]
+
+
+class AppointmentCalendarService:
+    """
+    Date-window reads of appointments, one page at a time.
+
+    Every listing is bounded by a date window or a page size, so the
+    appointments table is never loaded whole. The window is a range scan on
+    ix_appointments_appointment_date_patient_id, and pages are keyset pages
+    on (appointment_date, appointment_id), so a deep page costs the same as
+    the first. Clinician filtering goes through the patient's assigned
+    doctor; appointments do not record a clinician of their own.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def window(
+        self,
+        start: datetime,
+        end: datetime,
+        doctor_id: Optional[int] = None,
+        patient_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[List[Appointment], Optional[str]]:
+        """Appointments in [start, end) in chronological order, plus the next page's cursor."""
+        if end <= start:
+            raise HTTPException(status_code=400, detail="The calendar window must end after it starts")
+        query = self.query(doctor_id, patient_id).filter(
+            Appointment.appointment_date >= start, Appointment.appointment_date < end
+        )
+        return keyset_paginate(query, CALENDAR_ORDER, cursor=cursor, limit=limit)
+
+    def view(
+        self,
+        view: str,
+        day: date,
+        doctor_id: Optional[int] = None,
+        patient_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[List[Appointment], Optional[str]]:
+        start, end = calendar_window(view, day)
+        return self.window(start, end, doctor_id, patient_id, cursor, limit)
+
+    def upcoming(
+        self,
+        doctor_id: Optional[int] = None,
+        patient_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        now: Optional[datetime] = None,
+    ) -> Tuple[List[Appointment], Optional[str]]:
+        """Appointments from now on, soonest first."""
+        query = self.query(doctor_id, patient_id).filter(Appointment.appointment_date >= (now or datetime.now()))
+        return keyset_paginate(query, CALENDAR_ORDER, cursor=cursor, limit=limit)
+
+    def past(
+        self,
+        doctor_id: Optional[int] = None,
+        patient_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        now: Optional[datetime] = None,
+    ) -> Tuple[List[Appointment], Optional[str]]:
+        """Appointments before now, most recent first."""
+        query = self.query(doctor_id, patient_id).filter(Appointment.appointment_date < (now or datetime.now()))
+        return keyset_paginate(query, CALENDAR_ORDER, cursor=cursor, limit=limit, descending=True)
+
+    def query(self, doctor_id: Optional[int] = None, patient_id: Optional[str] = None):
+        """All appointments, optionally narrowed to one clinician or patient."""
+        query = self.db.query(Appointment)
+        if patient_id:
+            query = query.filter(Appointment.patient_id == patient_id)
+        if doctor_id is not None:
+            query = query.join(Patient, Patient.patient_id == Appointment.patient_id).filter(
+                Patient.doctor_id == doctor_id
+            )
+        return query
@@ -0,0 +1,107 @@
+# services/appointment_reminders.py
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Appointment, Patient, User
+from app.services.notification_outbox import EMAIL, SMS, enqueue_notifications
+
+logger = logging.getLogger(__name__)
+
+REMINDER_SUBJECT = "Appointment Reminder"
+
+
+def reminder_message(appointment_date: datetime) -> str:
+    return f"Reminder: Your appointment is scheduled for {appointment_date.strftime('%Y-%m-%d %H:%M:%S')}."
+
+
+def reminder_dedupe_key(appointment_id: int, appointment_date: datetime, channel: str) -> str:
+    """One reminder per appointment, time and channel; rescheduling yields a new key."""
+    return f"appointment-reminder:{appointment_id}:{appointment_date.isoformat()}:{channel}"
+
+
+class AppointmentReminderService:
+    """
+    Queues reminders for appointments starting within `lead_time`.
+
+    Each pass reads the due appointments a batch at a time: one query over
+    the appointment-date index joined to the patient's phone and email, one
+    multi-row outbox insert per channel, and one UPDATE stamping
+    reminder_sent_at, all committed together. Stamped appointments leave the
+    window, so a reminder is queued once even when passes overlap; rows are
+    claimed with SKIP LOCKED, so several schedulers can run side by side.
+    Rescheduling clears the stamp. Delivery itself is the outbox
+    dispatcher's job (services/notification_outbox.py).
+    """
+
+    def __init__(self, db: Session, lead_time: Optional[timedelta] = None, batch_size: Optional[int] = None):
+        self.db = db
+        self.lead_time = lead_time if lead_time is not None else timedelta(hours=settings.REMINDER_LEAD_HOURS)
+        self.batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+
+    def send_due(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Queue reminders for every due appointment; returns counts of appointments and messages per channel."""
+        now = now or datetime.now()
+        totals = {"appointments": 0, EMAIL: 0, SMS: 0}
+        while True:
+            counts = self._send_batch(now)
+            for key, value in counts.items():
+                totals[key] += value
+            if counts["appointments"] < self.batch_size:
+                return totals
+
+    def _send_batch(self, now: datetime) -> Dict[str, int]:
+        try:
+            due = (
+                self.db.query(
+                    Appointment.appointment_id,
+                    Appointment.appointment_date,
+                    Patient.residential_phone,
+                    User.email,
+                )
+                .join(Patient, Patient.patient_id == Appointment.patient_id)
+                .outerjoin(User, User.id == Patient.user_id)
+                .filter(
+                    Appointment.appointment_date >= now,
+                    Appointment.appointment_date < now + self.lead_time,
+                    Appointment.reminder_sent_at.is_(None),
+                )
+                .order_by(Appointment.appointment_date)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True, of=Appointment)
+                .all()
+            )
+            if not due:
+                self.db.rollback()
+                return {"appointments": 0, EMAIL: 0, SMS: 0}
+
+            by_channel = {EMAIL: [], SMS: []}
+            for appointment_id, appointment_date, phone, email in due:
+                body = reminder_message(appointment_date)
+                if phone:
+                    by_channel[SMS].append(dict(
+                        channel=SMS, recipient=phone, body=body,
+                        dedupe_key=reminder_dedupe_key(appointment_id, appointment_date, SMS),
+                    ))
+                if email:
+                    by_channel[EMAIL].append(dict(
+                        channel=EMAIL, recipient=email, body=body, subject=REMINDER_SUBJECT,
+                        dedupe_key=reminder_dedupe_key(appointment_id, appointment_date, EMAIL),
+                    ))
+            for messages in by_channel.values():
+                enqueue_notifications(self.db, messages)
+
+            self.db.execute(
+                update(Appointment)
+                .where(Appointment.appointment_id.in_([row.appointment_id for row in due]))
+                .values(reminder_sent_at=datetime.utcnow())
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return {"appointments": len(due), EMAIL: len(by_channel[EMAIL]), SMS: len(by_channel[SMS])}
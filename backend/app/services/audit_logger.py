@@ -1,9 +1,159 @@
 # services/audit_logger.py
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app.models import AuditLog, User
 from fastapi import Request
 
+from app.config import settings
+from app.database import SessionLocal
+from app.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """
+    In-process audit pipeline.
+
+    Routes enqueue audit events and return immediately; a background thread
+    drains the queue and writes events in batches with a single multi-row
+    INSERT per batch, in its own session. The queue is bounded: when it is
+    full, producers block for up to `enqueue_timeout` seconds and then write
+    their event synchronously, so a slow database slows requests down rather
+    than losing audit records. `shutdown()` drains everything still queued.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        enqueue_timeout: float,
+        max_retries: int = 3,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop the worker and durably write every event still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._flush(self._drain(None))
+
+    def enqueue(
+        self,
+        action: str,
+        user_id: Optional[int],
+        description: Optional[str] = None,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[Any] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ):
+        """Queue an audit event; the timestamp is taken now, not at write time."""
+        event = {
+            "action": action,
+            "user_id": user_id,
+            "description": description,
+            "entity_type": entity_type,
+            "entity_id": str(entity_id) if entity_id is not None else None,
+            "ip_address": ip_address,
+            "user_agent": user_agent[:255] if user_agent else None,
+            "timestamp": datetime.utcnow(),
+        }
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning("Audit log queue is full; writing event synchronously")
+            self._flush([event])
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first] + self._drain(self.batch_size - 1)
+            self._flush(batch)
+
+    def _drain(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        events = []
+        while limit is None or len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _flush(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        for attempt in range(self.max_retries):
+            try:
+                self._insert(events)
+                return
+            except Exception as e:
+                logger.warning(f"Audit log batch of {len(events)} failed (attempt {attempt + 1}): {e}")
+                time.sleep(min(2 ** attempt * 0.5, 5))
+
+        # The batch keeps failing: isolate the bad rows instead of losing the whole batch
+        for event in events:
+            try:
+                self._insert([event])
+            except Exception as e:
+                logger.error(f"Dropping audit log event {json.dumps(event, default=str)}: {e}")
+
+    @staticmethod
+    def _insert(events: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(AuditLog), events)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+audit_log_writer = AuditLogWriter(
+    max_queue_size=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    enqueue_timeout=settings.AUDIT_ENQUEUE_TIMEOUT,
+)
+atexit.register(audit_log_writer.shutdown)
+
+
 class AuditLogger:
     @staticmethod
     def log(
@@ -17,9 +167,9 @@ class AuditLogger:
     ):
         """
         Create an audit log entry
-        
+
         Args:
-            db: Database session
+            db: Database session (unused; entries are written by the audit log writer)
             user_id: ID of user performing action
             action: Type of action (e.g., "login", "patient_create")
             description: Detailed description of action
@@ -29,20 +179,17 @@ class AuditLogger:
         """
         ip_address = None
         user_agent = None
-        
+
         if request:
             ip_address = request.client.host
             user_agent = request.headers.get("user-agent")
-        
-        log_entry = AuditLog(
+
+        audit_log_writer.enqueue(
             action=action,
             user_id=user_id,
             description=description,
             entity_type=entity_type,
-            entity_id=str(entity_id) if entity_id else None,
+            entity_id=entity_id,
             ip_address=ip_address,
             user_agent=user_agent
         )
-        
-        db.add(log_entry)
-        db.commit()
\ No newline at end of file
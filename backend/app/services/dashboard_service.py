@@ -1,39 +1,202 @@
-from sqlalchemy.orm import Session
-from app.models import Patient, Billing, Appointment, MentalHealthNote, ClinicalNote, PharmacyRecord, LaboratoryRecord, OccupationalTherapyRecord, PsychologyRecord, SocialWorkRecord, Notification
-from app.utils import calculate_total_fee
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Iterable
+
+from sqlalchemy import func, case, select
+from sqlalchemy.orm import Session, selectinload
+from app.models import Patient, Billing, Fee, PaymentHistory, Appointment, MentalHealthNote, ClinicalNote, PharmacyRecord, LaboratoryRecord, OccupationalTherapyRecord, PsychologyRecord, SocialWorkRecord
 from fastapi import HTTPException  # Import HTTPException
 
+ZERO = Decimal("0.00")
+
+
 class DashboardService:
+    """
+    Builds the patient overview.
+
+    The patient and every record section are loaded in one pass with
+    selectinload (one query per section, no lazy loads), and the totals of all
+    billings referenced by the patient's records are computed once in SQL.
+    Time spent in each phase is kept in `self.timings` (milliseconds).
+    """
+
     def __init__(self, db: Session):
         self.db = db
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def _timed(self, section: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[section] = round((time.perf_counter() - start) * 1000, 2)
 
     def get_patient_dashboard_data(self, patient_id: str):
         """
         Retrieves a comprehensive set of patient data for the dashboard, including appointments, billing details,
         mental health records, clinical notes, and more.
         """
-        patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        
+        self.timings = {}
+
+        with self._timed("records"):
+            patient = (
+                self.db.query(Patient)
+                .options(
+                    selectinload(Patient.appointments).load_only(
+                        Appointment.appointment_id, Appointment.appointment_date, Appointment.reason_for_visit
+                    ),
+                    selectinload(Patient.bills).load_only(
+                        Billing.billing_id, Billing.total_bill, Billing.discount_percentage, Billing.discount_amount
+                    ),
+                    selectinload(Patient.mental_health_records).load_only(
+                        MentalHealthNote.present_complaints, MentalHealthNote.past_psychiatric_history, MentalHealthNote.billing_id
+                    ),
+                    selectinload(Patient.clinical_notes).load_only(
+                        ClinicalNote.temperature, ClinicalNote.blood_pressure, ClinicalNote.pulse_rate,
+                        ClinicalNote.progress_notes, ClinicalNote.billing_id
+                    ),
+                    selectinload(Patient.pharmacy_records).load_only(
+                        PharmacyRecord.medication_name, PharmacyRecord.dosage_and_route, PharmacyRecord.billing_id
+                    ),
+                    selectinload(Patient.laboratory_records).load_only(
+                        LaboratoryRecord.test_results, LaboratoryRecord.billing_id
+                    ),
+                    selectinload(Patient.occupational_therapy_records).load_only(
+                        OccupationalTherapyRecord.long_term_goals, OccupationalTherapyRecord.improvements_observed,
+                        OccupationalTherapyRecord.billing_id
+                    ),
+                    selectinload(Patient.psychology_records).load_only(PsychologyRecord.billing_id),
+                    selectinload(Patient.social_work_records).load_only(
+                        SocialWorkRecord.housing_status, SocialWorkRecord.employment_status, SocialWorkRecord.billing_id
+                    ),
+                )
+                .filter(Patient.patient_id == patient_id)
+                .first()
+            )
+
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
-        
-        patient_data = {
-            "patient_info": self._get_patient_info(patient),
-            "appointments": self._get_appointments(patient),
-            "billing": self._get_billing(patient),
-            "mental_health": self._get_mental_health(patient),
-            "clinical_notes": self._get_clinical_notes(patient),
-            "pharmacy": self._get_pharmacy(patient),
-            "laboratory": self._get_laboratory(patient),
-            "occupational_therapy": self._get_occupational_therapy(patient),
-            "psychology": self._get_psychology(patient),
-            "social_work": self._get_social_work(patient),
-            "notifications": self._get_notifications(patient),
-            "total_fee": self._calculate_total_fee(patient)  # Calculate total fee based on all records
-        }
+
+        billing = min(patient.bills, key=lambda bill: bill.billing_id) if patient.bills else None
+        if not billing:
+            raise HTTPException(status_code=404, detail="Billing record not found")
+
+        with self._timed("fees"):
+            record_sections = [
+                patient.clinical_notes, patient.pharmacy_records, patient.laboratory_records,
+                patient.occupational_therapy_records, patient.psychology_records, patient.social_work_records,
+                patient.mental_health_records,
+            ]
+            billing_ids = {billing.billing_id}
+            for records in record_sections:
+                billing_ids.update(record.billing_id for record in records if record.billing_id)
+            totals = self._billing_totals(billing_ids)
+
+        with self._timed("assemble"):
+            def fee_of(record):
+                return totals[record.billing_id]["total"] if record.billing_id in totals else ZERO
+
+            clinical_notes = [{"temperature": note.temperature,
+                               "blood_pressure": note.blood_pressure,
+                               "pulse_rate": note.pulse_rate,
+                               "notes": note.progress_notes,
+                               "total_fee": fee_of(note)} for note in patient.clinical_notes]
+            pharmacy = [{"medication_name": record.medication_name,
+                         "dosage_and_route": record.dosage_and_route,
+                         "total_fee": fee_of(record)} for record in patient.pharmacy_records]
+            laboratory = [{"test_results": record.test_results,
+                           "total_fee": fee_of(record)} for record in patient.laboratory_records]
+            occupational_therapy = [{"long_term_goals": record.long_term_goals,
+                                     "improvements_observed": record.improvements_observed,
+                                     "total_fee": fee_of(record)} for record in patient.occupational_therapy_records]
+            psychology = [{"total_fee": fee_of(record)} for record in patient.psychology_records]
+            social_work = [{"housing_status": record.housing_status,
+                            "employment_status": record.employment_status,
+                            "total_fee": fee_of(record)} for record in patient.social_work_records]
+
+            billing_totals = totals[billing.billing_id]
+            total_fee = (billing.total_bill or ZERO) + sum(
+                (entry["total_fee"] for section in (clinical_notes, pharmacy, laboratory, occupational_therapy, psychology, social_work)
+                 for entry in section),
+                ZERO
+            )
+
+            patient_data = {
+                "patient_info": self._get_patient_info(patient),
+                "appointments": [{"appointment_id": appointment.appointment_id,
+                                  "appointment_date": appointment.appointment_date,
+                                  "reason_for_visit": appointment.reason_for_visit} for appointment in patient.appointments],
+                "billing": {
+                    "total_bill": billing.total_bill,
+                    "is_paid": billing_totals["payments"] > 0,  # Derived from payment history
+                    "discount": billing.discount_percentage or billing.discount_amount,  # Show discount applied
+                    "fees": {
+                        "consultation_fee": billing.total_bill,
+                        "other_fees": billing_totals["fees"],  # Sum of all fee records
+                    }
+                },
+                "mental_health": self._get_mental_health(patient.mental_health_records, fee_of),
+                "clinical_notes": clinical_notes,
+                "pharmacy": pharmacy,
+                "laboratory": laboratory,
+                "occupational_therapy": occupational_therapy,
+                "psychology": psychology,
+                "social_work": social_work,
+                # Notifications are addressed to departments and carry no patient reference
+                "notifications": [],
+                "total_fee": total_fee
+            }
 
         return patient_data
 
+    def _billing_totals(self, billing_ids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Fee sum, payment count and discounted total for each billing, in one query.
+
+        Mirrors Billing.calculate_total_bill: a percentage discount wins over a
+        fixed amount and the total never drops below zero.
+        """
+        fee_sums = (
+            select(Fee.billing_id, func.coalesce(func.sum(Fee.amount), 0).label("fees"))
+            .where(Fee.billing_id.in_(billing_ids))
+            .group_by(Fee.billing_id)
+            .subquery()
+        )
+        payment_counts = (
+            select(PaymentHistory.billing_id, func.count(PaymentHistory.payment_id).label("payments"))
+            .where(PaymentHistory.billing_id.in_(billing_ids))
+            .group_by(PaymentHistory.billing_id)
+            .subquery()
+        )
+        fees = func.coalesce(fee_sums.c.fees, 0)
+        discount = case(
+            (Billing.discount_percentage > 0, fees * Billing.discount_percentage / 100),
+            (Billing.discount_amount > 0, Billing.discount_amount),
+            else_=0,
+        )
+        rows = self.db.execute(
+            select(
+                Billing.billing_id,
+                fees.label("fees"),
+                func.coalesce(payment_counts.c.payments, 0).label("payments"),
+                (fees - discount).label("total"),
+            )
+            .outerjoin(fee_sums, fee_sums.c.billing_id == Billing.billing_id)
+            .outerjoin(payment_counts, payment_counts.c.billing_id == Billing.billing_id)
+            .where(Billing.billing_id.in_(billing_ids))
+        ).all()
+
+        return {
+            row.billing_id: {
+                "fees": Decimal(row.fees).quantize(ZERO),
+                "payments": row.payments,
+                "total": max(Decimal(row.total).quantize(ZERO), ZERO),
+            }
+            for row in rows
+        }
+
     def _get_patient_info(self, patient: Patient):
         """Returns basic patient details."""
         return {
@@ -56,103 +219,13 @@ class DashboardService:
             }
         }
 
-    def _get_appointments(self, patient: Patient):
-        """Returns a list of the patient's appointments."""
-        appointments = self.db.query(Appointment).filter(Appointment.patient_id == patient.patient_id).all()
-        return [{"appointment_id": appointment.appointment_id, 
-                 "appointment_date": appointment.appointment_date, 
-                 "reason_for_visit": appointment.reason_for_visit} for appointment in appointments]
-
-    def _get_billing(self, patient: Patient):
-        """Returns the patient's billing details and total fee."""
-        billing = self.db.query(Billing).filter(Billing.patient_id == patient.patient_id).first()
-        if billing:
-        # Check if there are any payments, and consider the bill as paid if there's a payment history
-            is_paid = len(billing.payments) > 0
-
-            return {
-                "total_bill": billing.total_bill,
-                "is_paid": is_paid,  # Derived from payment history
-                "discount": billing.discount_percentage or billing.discount_amount,  # Show discount applied
-                "fees": {
-                    "consultation_fee": billing.total_bill,  # You can use specific fields if available, such as a breakdown
-                    "other_fees": sum(fee.amount for fee in billing.fees),  # Sum of all fee records
-                }
-            }
-        raise HTTPException(status_code=404, detail="Billing record not found")
-
-    def _get_mental_health(self, patient: Patient):
-        """Returns mental health records, if available."""
-        mental_health_notes = self.db.query(MentalHealthNote).filter(MentalHealthNote.patient_id == patient.patient_id).first()
+    def _get_mental_health(self, mental_health_notes, fee_of):
+        """Returns the first mental health record, if available."""
         if mental_health_notes:
+            note = min(mental_health_notes, key=lambda record: record.mental_health_id)
             return {
-                "present_complaints": mental_health_notes.present_complaints,
-                "past_psychiatric_history": mental_health_notes.past_psychiatric_history,
-                "psychological_assessment_fee": mental_health_notes.psychological_assessment_fee,
-                "total_fee": mental_health_notes.total_fee
+                "present_complaints": note.present_complaints,
+                "past_psychiatric_history": note.past_psychiatric_history,
+                "total_fee": fee_of(note)
             }
         return {"error": "Mental health record not found"}
-
-    def _get_clinical_notes(self, patient: Patient):
-        """Returns clinical notes, if available."""
-        clinical_notes = self.db.query(ClinicalNote).filter(ClinicalNote.patient_id == patient.patient_id).all()
-        return [{"temperature": note.temperature,
-                 "blood_pressure": note.blood_pressure,
-                 "pulse_rate": note.pulse_rate,
-                 "notes": note.progress_notes,
-                 "total_fee": note.total_fee} for note in clinical_notes]
-
-    def _get_pharmacy(self, patient: Patient):
-        """Returns pharmacy records and total fee."""
-        pharmacy_records = self.db.query(PharmacyRecord).filter(PharmacyRecord.patient_id == patient.patient_id).all()
-        return [{"medication_name": record.medication_name,
-                 "dosage_and_route": record.dosage_and_route,
-                 "total_fee": record.total_fee} for record in pharmacy_records]
-
-    def _get_laboratory(self, patient: Patient):
-        """Returns laboratory records and total fee."""
-        laboratory_records = self.db.query(LaboratoryRecord).filter(LaboratoryRecord.patient_id == patient.patient_id).all()
-        return [{"test_results": record.test_results,
-                 "laboratory_fee": record.laboratory_fee,
-                 "total_fee": record.total_fee} for record in laboratory_records]
-
-    def _get_occupational_therapy(self, patient: Patient):
-        """Returns occupational therapy records and total fee."""
-        occupational_therapy_records = self.db.query(OccupationalTherapyRecord).filter(OccupationalTherapyRecord.patient_id == patient.patient_id).all()
-        return [{"long_term_goals": record.long_term_goals,
-                 "improvements_observed": record.improvements_observed,
-                 "total_fee": record.total_fee} for record in occupational_therapy_records]
-
-    def _get_psychology(self, patient: Patient):
-        """Returns psychology records and fee details."""
-        psychology_records = self.db.query(PsychologyRecord).filter(PsychologyRecord.patient_id == patient.patient_id).all()
-        return [{"psychology_fee": record.psychology_fee,
-                 "total_fee": record.total_fee} for record in psychology_records]
-
-    def _get_social_work(self, patient: Patient):
-        """Returns social work records and total fee."""
-        social_work_records = self.db.query(SocialWorkRecord).filter(SocialWorkRecord.patient_id == patient.patient_id).all()
-        return [{"housing_status": record.housing_status,
-                 "employment_status": record.employment_status,
-                 "social_welfare_fee": record.social_welfare_fee,
-                 "total_fee": record.total_fee} for record in social_work_records]
-
-    def _get_notifications(self, patient: Patient):
-        """Returns the list of notifications for the patient."""
-        notifications = self.db.query(Notification).filter(Notification.patient_id == patient.patient_id).all()
-        return [{"message": notification.message,
-                 "status": notification.status,
-                 "sent_at": notification.sent_at} for notification in notifications]
-
-    def _calculate_total_fee(self, patient: Patient):
-        """Calculates total fee from all records"""
-        total_fees = 0
-        total_fees += self._get_billing(patient).get("total_bill", 0)
-        total_fees += sum(note['total_fee'] for note in self._get_clinical_notes(patient))
-        total_fees += sum(record['total_fee'] for record in self._get_pharmacy(patient))
-        total_fees += sum(record['total_fee'] for record in self._get_laboratory(patient))
-        total_fees += sum(record['total_fee'] for record in self._get_occupational_therapy(patient))
-        total_fees += sum(record['total_fee'] for record in self._get_psychology(patient))
-        total_fees += sum(record['total_fee'] for record in self._get_social_work(patient))
-
-        return total_fees
@@ -0,0 +1,308 @@
+# services/department_notifications.py
+import asyncio
+import logging
+import select
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import NOTIFICATION_STREAM_SUBSCRIBERS
+from app.models import Notification, NotificationEvent
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel carrying the ids of new notification events
+NOTIFY_CHANNEL = "department_notification_events"
+
+# Event kinds
+CREATED = "created"
+RESPONSE = "response"
+
+# Session.info key: event ids recorded in the current transaction
+_PENDING = "department_notification_events"
+
+# Advisory lock serialising event inserts, so event ids are in commit order
+EVENT_ORDER_LOCK = 0x6E6F7466
+
+
+def event_payload(notification_event: NotificationEvent, notification: Notification) -> dict:
+    """What stream subscribers receive: the notification as it is now, tagged with the event."""
+    return {
+        "event_id": notification_event.id,
+        "event": notification_event.kind,
+        "id": notification.id,
+        "sender_id": notification.sender_id,
+        "receiver_departments": list(notification.receiver_departments),
+        "message": notification.message,
+        "responses": notification.responses or [],
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def _addressed_to(db: Session, department: str):
+    if db.get_bind().dialect.name == "postgresql":
+        # receiver_departments @> ARRAY[department], served by the GIN index
+        return Notification.receiver_departments.contains([department])
+    # JSON list on a SQLite stand-in
+    departments = func.json_each(Notification.receiver_departments).table_valued("value")
+    return departments.select().where(departments.c.value == department).exists()
+
+
+class DepartmentNotificationService:
+    """
+    Department-to-department notifications and their responses.
+
+    Every change appends a NotificationEvent in the same transaction; the
+    event ids order a department's activity and are what stream clients
+    resume from. On commit the events reach every worker's stream
+    subscribers through department_event_hub.
+
+    Resuming after the highest id seen is only safe if ids become visible in
+    order, so on Postgres the event is inserted under a transaction-scoped
+    advisory lock held until commit: a later id cannot commit before an
+    earlier one. It is the last lock a writer takes, so it cannot deadlock,
+    and it is held only from the event insert to the commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, sender_id: int, departments: List[str], message: str) -> Notification:
+        departments = sorted({department.strip() for department in departments if department.strip()})
+        if not departments:
+            raise HTTPException(status_code=400, detail="At least one receiving department is required")
+        notification = Notification(
+            sender_id=sender_id, receiver_departments=departments, message=message, responses=[],
+        )
+        self.db.add(notification)
+        self.db.flush()
+        self._record(notification, CREATED)
+        self.db.commit()
+        self.db.refresh(notification)
+        return notification
+
+    def respond(self, notification_id: int, user_id: int, username: str, message: str) -> Notification:
+        notification = (
+            self.db.query(Notification).filter(Notification.id == notification_id).with_for_update().first()
+        )
+        if notification is None:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        # A new list, so the JSON column is seen as changed
+        notification.responses = list(notification.responses or []) + [{
+            "user_id": user_id,
+            "username": username,
+            "message": message,
+            "created_at": datetime.utcnow().isoformat(),
+        }]
+        self._record(notification, RESPONSE)
+        self.db.commit()
+        self.db.refresh(notification)
+        return notification
+
+    def events_since(self, department: str, after_id: int = 0, limit: int = 100) -> List[dict]:
+        """Events for `department` after event `after_id`, oldest first."""
+        rows = (
+            self.db.query(NotificationEvent, Notification)
+            .join(Notification, Notification.id == NotificationEvent.notification_id)
+            .filter(_addressed_to(self.db, department), NotificationEvent.id > after_id)
+            .order_by(NotificationEvent.id)
+            .limit(limit)
+            .all()
+        )
+        return [event_payload(notification_event, notification) for notification_event, notification in rows]
+
+    def events_by_id(self, event_ids: List[int]) -> List[dict]:
+        rows = (
+            self.db.query(NotificationEvent, Notification)
+            .join(Notification, Notification.id == NotificationEvent.notification_id)
+            .filter(NotificationEvent.id.in_(event_ids))
+            .order_by(NotificationEvent.id)
+            .all()
+        )
+        return [event_payload(notification_event, notification) for notification_event, notification in rows]
+
+    def _record(self, notification: Notification, kind: str):
+        if self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EVENT_ORDER_LOCK})
+        notification_event = NotificationEvent(notification_id=notification.id, kind=kind)
+        self.db.add(notification_event)
+        self.db.flush()
+        department_event_hub.record(self.db, notification_event.id)
+
+
+class Subscription:
+    """One stream's queue of events. Lives on its event loop; close() ends get()."""
+
+    def __init__(self, department: str, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.department = department
+        self.loop = loop
+        self.closed = False
+        self._queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(queue_size)
+
+    def offer(self, payload: dict):
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Too far behind: end the stream, the client resumes from its last id
+            logger.warning(f"Notification stream for {self.department} fell behind; closing it")
+            self.close()
+
+    def close(self):
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self) -> Optional[dict]:
+        """The next event, or None once the subscription is closed and drained."""
+        if self.closed and self._queue.empty():
+            return None
+        return await self._queue.get()
+
+
+class DepartmentEventHub:
+    """
+    Per-worker fan-out of department notification events to open streams.
+
+    On Postgres an event id is sent with pg_notify inside the transaction
+    that records it, so it is delivered when (and only if) that transaction
+    commits, to the LISTEN thread of every worker. The thread loads the new
+    events in one query and hands each to the subscribers of its
+    departments. Elsewhere (a SQLite stand-in) events are published to this
+    worker only, after commit. Each subscriber has a bounded queue: a slow
+    one is disconnected rather than buffered without limit, and so is
+    everyone if the LISTEN connection drops, since events may have been
+    missed; clients reconnect with their last event id and catch up.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def subscribe(self, department: str) -> Subscription:
+        """Register a stream for `department`; call from its event loop."""
+        subscription = Subscription(department, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(department, set()).add(subscription)
+        NOTIFICATION_STREAM_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.department)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.department]
+        NOTIFICATION_STREAM_SUBSCRIBERS.dec()
+
+    def record(self, db: Session, event_id: int):
+        """Announce event `event_id` once `db` commits."""
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": str(event_id)})
+        else:
+            db.info.setdefault(_PENDING, []).append(event_id)
+
+    def publish(self, event_ids: List[int]):
+        """Deliver committed events to this worker's subscribers."""
+        with self._lock:
+            if not self._subscriptions:
+                return
+        db = SessionLocal()
+        try:
+            payloads = DepartmentNotificationService(db).events_by_id(event_ids)
+        finally:
+            db.close()
+        for payload in payloads:
+            with self._lock:
+                subscriptions = [
+                    subscription
+                    for department in payload["receiver_departments"]
+                    for subscription in self._subscriptions.get(department, ())
+                ]
+            for subscription in subscriptions:
+                subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+
+    def close_all(self):
+        with self._lock:
+            subscriptions = [s for department in self._subscriptions.values() for s in department]
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.close)
+
+    def start_listener(self, database_url: str):
+        """Follow events committed by every worker (Postgres only)."""
+        if not database_url.startswith("postgresql"):
+            return
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen, args=(database_url,), name="department-notification-listener", daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout)
+            self._listener = None
+        self.close_all()
+
+    def _listen(self, database_url: str):
+        import psycopg2
+        import psycopg2.extensions
+
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(database_url)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 5.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    if connection.notifies:
+                        event_ids = [int(notify.payload) for notify in connection.notifies]
+                        connection.notifies.clear()
+                        self.publish(event_ids)
+            except Exception as e:
+                logger.warning(f"Department notification listener disconnected: {e}")
+                self.close_all()
+                self._stop.wait(5.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+department_event_hub = DepartmentEventHub(queue_size=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session):
+    event_ids = session.info.pop(_PENDING, None)
+    if event_ids:
+        try:
+            department_event_hub.publish(event_ids)
+        except Exception as e:
+            logger.warning(f"Could not publish department notification events: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING, None)
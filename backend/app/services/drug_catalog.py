@@ -0,0 +1,228 @@
+# services/drug_catalog.py
+import hashlib
+import json
+import logging
+import select
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Drug, Stock
+from app.schemas import DrugOut
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel used to tell every worker that the catalog changed
+NOTIFY_CHANNEL = "drug_catalog"
+
+# Session.info flag set by invalidate() until the transaction ends
+_PENDING = "drug_catalog_invalidated"
+
+
+class DrugCatalog:
+    """
+    One immutable load of the catalog. As cached, it holds the drug
+    attributes only (total_stock is None); with_stock() fills in the
+    current totals for a response.
+    """
+
+    def __init__(self, drugs: List[DrugOut], version: int, etag: Optional[str] = None):
+        self.drugs = drugs
+        self.by_id: Dict[int, DrugOut] = {drug.id: drug for drug in drugs}
+        self.version = version
+        self.loaded_at = time.monotonic()
+        if etag is None:
+            # Content hash, so every worker hands out the same ETag for the same catalog
+            payload = json.dumps([drug.model_dump(mode="json") for drug in drugs], sort_keys=True)
+            etag = f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+        self.etag = etag
+
+    def with_stock(self, totals: Dict[int, int]) -> "DrugCatalog":
+        """This catalog with total_stock set from `totals` (drug id -> quantity); the ETag covers both."""
+        drugs = [drug.model_copy(update={"total_stock": int(totals.get(drug.id) or 0)}) for drug in self.drugs]
+        stock = json.dumps([[drug.id, drug.total_stock] for drug in drugs])
+        etag = f'"{hashlib.sha1((self.etag + stock).encode()).hexdigest()}"'
+        catalog = DrugCatalog(drugs, self.version, etag)
+        catalog.loaded_at = self.loaded_at
+        return catalog
+
+
+class DrugCatalogCache:
+    """
+    Per-worker cache of the drug catalog.
+
+    The drug attributes are loaded with one query and served from memory
+    until they are older than `ttl` seconds or the cache version moves on.
+    Stock totals change with every dispense and sale, so they are not
+    cached: get() and drugs() add them with one small GROUP BY over the
+    stock rows per call, and stock movements never invalidate the catalog.
+    Writers that create, change or delete drugs call invalidate(db) before
+    committing: the version is bumped once the transaction commits, and on
+    Postgres a NOTIFY on the `drug_catalog` channel is sent with the same
+    commit, which the listener thread of every other worker turns into a
+    bump of its own. A load that raced with an invalidation is returned to
+    its caller but not kept. The TTL bounds staleness if a notification is
+    ever missed.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._version = 0
+        self._catalog: Optional[DrugCatalog] = None
+        self._load_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def cached(self) -> Optional[DrugCatalog]:
+        """The cached drug attributes if they are fresh, without loading; for callers that must not block."""
+        catalog = self._catalog
+        return catalog if self._is_fresh(catalog) else None
+
+    def get(self, db: Session) -> DrugCatalog:
+        """The catalog with current stock totals."""
+        return self.attributes(db).with_stock(stock_totals(db))
+
+    def attributes(self, db: Session) -> DrugCatalog:
+        """The cached drug attributes (total_stock is None), loading them if stale."""
+        catalog = self.cached()
+        if catalog is not None:
+            return catalog
+        # One load per worker at a time; concurrent callers reuse its result
+        with self._load_lock:
+            catalog = self._catalog
+            if self._is_fresh(catalog):
+                return catalog
+            version = self._version
+            catalog = self._load(db, version)
+            if version == self._version:
+                self._catalog = catalog
+            return catalog
+
+    def drugs(self, db: Session) -> List[DrugOut]:
+        return self.get(db).drugs
+
+    def get_drug(self, db: Session, drug_id: int) -> DrugOut:
+        """A cached drug's attributes by ID (total_stock is None), or 404."""
+        drug = self.attributes(db).by_id.get(drug_id)
+        if drug is None:
+            raise HTTPException(status_code=404, detail=f"Drug with ID {drug_id} not found")
+        return drug
+
+    def invalidate(self, db: Optional[Session] = None):
+        """
+        Drop the cached catalog once `db` commits, in this worker and (on
+        Postgres) in every other one. Without a session the local cache is
+        dropped straight away.
+        """
+        if db is None:
+            self._bump()
+            return
+        if db.info.get(_PENDING):
+            return
+        db.info[_PENDING] = True
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NOTIFY_CHANNEL})
+
+    def start_listener(self, database_url: str):
+        """Follow invalidations from other workers (Postgres only)."""
+        if not database_url.startswith("postgresql"):
+            return
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen, args=(database_url,), name="drug-catalog-listener", daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout)
+            self._listener = None
+
+    def _is_fresh(self, catalog: Optional[DrugCatalog]) -> bool:
+        return (
+            catalog is not None
+            and catalog.version == self._version
+            and time.monotonic() - catalog.loaded_at < self.ttl
+        )
+
+    def _bump(self):
+        with self._version_lock:
+            self._version += 1
+
+    @staticmethod
+    def _load(db: Session, version: int) -> DrugCatalog:
+        drugs = [
+            DrugOut(
+                id=drug.id,
+                name=drug.name,
+                description=drug.description,
+                dosage=drug.dosage,
+                instructions=drug.instructions,
+                prescribed_date=drug.prescribed_date,
+                price=drug.price,
+                is_active=bool(drug.is_active),
+                expiration_date=drug.expiration_date,
+                total_stock=None,
+            )
+            for drug in db.query(Drug).order_by(Drug.id)
+        ]
+        return DrugCatalog(drugs, version)
+
+    def _listen(self, database_url: str):
+        import psycopg2
+        import psycopg2.extensions
+
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(database_url)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Anything may have changed while we were not listening
+                self._bump()
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 5.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    if connection.notifies:
+                        connection.notifies.clear()
+                        self._bump()
+            except Exception as e:
+                logger.warning(f"Drug catalog listener disconnected: {e}")
+                self._stop.wait(5.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def stock_totals(db: Session) -> Dict[int, int]:
+    """Total stock per drug id: one small GROUP BY over the stock rows."""
+    return dict(db.query(Stock.drug_id, func.sum(Stock.quantity)).group_by(Stock.drug_id).all())
+
+
+drug_catalog_cache = DrugCatalogCache(ttl=settings.DRUG_CATALOG_TTL)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    if session.info.pop(_PENDING, False):
+        drug_catalog_cache._bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,342 @@
+# services/export_jobs.py
+import hashlib
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import Sequence, event, func, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Base
+from app.metrics import EXPORT_JOB_SECONDS
+from app.process_pools import pool_context
+from app.models import (
+    Patient, ClinicalNote, MentalHealthNote, PharmacyRecord,
+    LaboratoryRecord, OccupationalTherapyRecord, PsychologyRecord,
+    SocialWorkRecord
+)
+
+logger = logging.getLogger(__name__)
+
+# Export kinds -> (file extension, media type)
+EXPORT_KINDS = {
+    "all_patients_excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "patient_excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "patient_pdf": ("pdf", "application/pdf"),
+    "patient_csv": ("csv", "text/csv"),
+}
+
+# Jobs still "running" after this long are assumed to have died with their worker
+JOB_STALE_AFTER = timedelta(minutes=30)
+
+# Tables whose rows end up in exports
+EXPORTED_MODELS = (
+    Patient, ClinicalNote, MentalHealthNote, PharmacyRecord,
+    LaboratoryRecord, OccupationalTherapyRecord, PsychologyRecord, SocialWorkRecord,
+)
+
+# Bumped (Postgres only) once per transaction that writes an exported table
+# through the ORM. Sequences are not transactional, so concurrent writers
+# never wait on each other; a rolled-back write merely costs one extra re-render
+export_data_version_seq = Sequence("export_data_version_seq", metadata=Base.metadata)
+
+# Session.info flag: the current transaction wrote an exported table
+_DATA_CHANGED = "export_data_changed"
+
+# How often submit() sweeps EXPORT_DIR for expired files
+CLEANUP_INTERVAL = 600.0
+
+
+class ExportJobManager:
+    """
+    Runs export jobs in a process pool and keeps their state on local disk.
+
+    A job's id is derived from its kind, its parameters and the current data
+    version, so repeating a request while nothing has changed returns the
+    finished artifact (or the job already in flight) instead of rendering again.
+    A finished artifact is reused for at most `cache_ttl` seconds, which bounds
+    staleness from writes the data version cannot see (raw SQL, or any write
+    on a SQLite stand-in). Status lives in a JSON file next to the artifact,
+    which lets every gunicorn worker on the host answer status and download
+    requests for any job. Files older than `retention` are deleted.
+    """
+
+    def __init__(self, export_dir: str, max_workers: int, cache_ttl: float, retention: timedelta):
+        self.export_dir = export_dir
+        self.max_workers = max_workers
+        self.cache_ttl = cache_ttl
+        self.retention = retention
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._last_cleanup = 0.0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            os.makedirs(self.export_dir, exist_ok=True)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_export_worker, mp_context=pool_context()
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, db: Session, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit an export, reusing a cached artifact or an in-flight job when possible."""
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"Unknown export kind: {kind}")
+
+        self._cleanup_if_due()
+        job_id = self.job_id(kind, params, data_version(db))
+        status = self.get_status(job_id)
+        if (
+            status and status["status"] == "completed" and not _is_older_than(status, self.cache_ttl)
+            and os.path.exists(self.artifact_path(job_id))
+        ):
+            return status
+        if status and status["status"] in ("queued", "running") and not _is_stale(status):
+            return status
+
+        extension, media_type = EXPORT_KINDS[kind]
+        now = datetime.utcnow().isoformat()
+        status = {
+            "job_id": job_id,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "progress": 0,
+            "created_at": now,
+            "updated_at": now,
+            "filename": f"{kind}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}",
+            "media_type": media_type,
+            "error": None,
+        }
+        write_status(self.export_dir, status)
+        self.executor.submit(run_export_job, self.export_dir, job_id).add_done_callback(_observe_export_job)
+        logger.info(f"Queued export job {job_id} ({kind})")
+        return status
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return read_status(self.export_dir, job_id)
+
+    def artifact_path(self, job_id: str) -> str:
+        return artifact_path(self.export_dir, job_id)
+
+    def cleanup(self) -> int:
+        """Delete export files (artifacts, statuses, leftovers) older than the retention period."""
+        cutoff = time.time() - self.retention.total_seconds()
+        removed = 0
+        try:
+            names = os.listdir(self.export_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.export_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Removed by another worker's sweep
+        if removed:
+            logger.info(f"Removed {removed} expired export files")
+        return removed
+
+    def _cleanup_if_due(self):
+        now = time.monotonic()
+        if now - self._last_cleanup >= CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            try:
+                self.cleanup()
+            except OSError as e:
+                logger.warning(f"Export cleanup failed: {e}")
+
+    @staticmethod
+    def job_id(kind: str, params: Dict[str, Any], version: str) -> str:
+        key = json.dumps({"kind": kind, "params": params, "version": version}, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def data_version(db: Session) -> str:
+    """
+    Fingerprint of the exportable data, fetched in a single round trip: the
+    write counter (export_data_version_seq, on Postgres) plus patient count
+    and the highest primary key of every exported table.
+    """
+    columns = [
+        select(func.count(Patient.id)).scalar_subquery(),
+        select(func.max(Patient.id)).scalar_subquery(),
+        select(func.max(ClinicalNote.id)).scalar_subquery(),
+        select(func.max(MentalHealthNote.mental_health_id)).scalar_subquery(),
+        select(func.max(PharmacyRecord.pharmacy_id)).scalar_subquery(),
+        select(func.max(LaboratoryRecord.id)).scalar_subquery(),
+        select(func.max(OccupationalTherapyRecord.id)).scalar_subquery(),
+        select(func.max(PsychologyRecord.id)).scalar_subquery(),
+        select(func.max(SocialWorkRecord.id)).scalar_subquery(),
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        columns.insert(0, text("(SELECT last_value FROM export_data_version_seq)"))
+    row = db.execute(select(*columns)).one()
+    return ":".join(str(value or 0) for value in row)
+
+
+def _writes_exported_data(session: Session) -> bool:
+    return any(isinstance(obj, EXPORTED_MODELS) for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+@event.listens_for(Session, "before_flush")
+def _note_flush(session: Session, flush_context, instances):
+    if _writes_exported_data(session):
+        session.info[_DATA_CHANGED] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_write(orm_execute_state):
+    # query.update()/delete() and update()/delete() statements skip the flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None:
+        if issubclass(orm_execute_state.bind_mapper.class_, EXPORTED_MODELS):
+            orm_execute_state.session.info[_DATA_CHANGED] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_before_commit(session: Session):
+    # One nextval per transaction, not per flush. Runs before commit's own
+    # flush, so changes still pending count too
+    if session.info.pop(_DATA_CHANGED, False) or _writes_exported_data(session):
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(select(export_data_version_seq.next_value()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_DATA_CHANGED, None)
+
+
+def status_path(export_dir: str, job_id: str) -> str:
+    return os.path.join(export_dir, f"{job_id}.json")
+
+
+def artifact_path(export_dir: str, job_id: str) -> str:
+    return os.path.join(export_dir, f"{job_id}.bin")
+
+
+def read_status(export_dir: str, job_id: str) -> Optional[Dict[str, Any]]:
+    # Job ids are hex digests; anything else is not one of ours
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(status_path(export_dir, job_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_status(export_dir: str, status: Dict[str, Any]):
+    """Atomically replace a job's status file."""
+    os.makedirs(export_dir, exist_ok=True)
+    status["updated_at"] = datetime.utcnow().isoformat()
+    path = status_path(export_dir, status["job_id"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _is_stale(status: Dict[str, Any]) -> bool:
+    return _is_older_than(status, JOB_STALE_AFTER.total_seconds())
+
+
+def _is_older_than(status: Dict[str, Any], seconds: float) -> bool:
+    updated_at = datetime.fromisoformat(status["updated_at"])
+    return (datetime.utcnow() - updated_at).total_seconds() > seconds
+
+
+def _init_export_worker():
+    """Drop pooled connections inherited from the parent process (fork start method)."""
+    from app.database import engine, replica_engine
+    engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.dispose(close=False)
+
+
+def _observe_export_job(future: Future):
+    # Observed here in the API worker: samples taken in a pool process are
+    # lost unless PROMETHEUS_MULTIPROC_DIR is set
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error(f"Export job crashed its pool process: {e}")
+        return
+    if result is not None:
+        kind, outcome, seconds = result
+        EXPORT_JOB_SECONDS.labels(kind, outcome).observe(seconds)
+
+
+def run_export_job(export_dir: str, job_id: str) -> Optional[Tuple[str, str, float]]:
+    """Entry point executed in the export process pool; returns the kind, outcome and duration."""
+    # Imported here so the route module is only loaded inside the worker
+    from app.database import open_read_session
+    from app.routes.v1 import export
+
+    status = read_status(export_dir, job_id)
+    if status is None:
+        return None
+
+    def report(progress: int):
+        status["progress"] = max(0, min(100, int(progress)))
+        write_status(export_dir, status)
+
+    status["status"] = "running"
+    report(0)
+
+    kind, params = status["kind"], status["params"]
+    started = time.perf_counter()
+    tmp_path = f"{artifact_path(export_dir, job_id)}.tmp"
+    db = open_read_session()
+    try:
+        with open(tmp_path, "wb") as output:
+            if kind == "all_patients_excel":
+                total = max(1, min(params["limit"], export.count_all_patients(db, params["skip"], params.get("filters"))))
+                for chunk in export.iter_all_patients_excel(
+                    params["skip"], params["limit"], params.get("filters"),
+                    progress=lambda done: report(done * 99 / total)
+                ):
+                    output.write(chunk)
+            else:
+                data = export.get_patient_data(params["patient_id"], db)
+                report(50)
+                generator = {
+                    "patient_excel": export.generate_excel,
+                    "patient_pdf": export.generate_pdf,
+                    "patient_csv": export.generate_csv,
+                }[kind]
+                output.write(generator(data).getvalue())
+        os.replace(tmp_path, artifact_path(export_dir, job_id))
+        status["status"] = "completed"
+        report(100)
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {traceback.format_exc()}")
+        status["status"] = "failed"
+        status["error"] = getattr(e, "detail", None) or str(e)
+        write_status(export_dir, status)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        db.close()
+    return kind, status["status"], time.perf_counter() - started
+
+
+export_job_manager = ExportJobManager(
+    settings.EXPORT_DIR,
+    settings.EXPORT_WORKERS,
+    cache_ttl=settings.EXPORT_CACHE_TTL,
+    retention=timedelta(hours=settings.EXPORT_RETENTION_HOURS),
+)
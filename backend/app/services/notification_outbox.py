@@ -0,0 +1,272 @@
+# services/notification_outbox.py
+import logging
+import random
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import NOTIFICATIONS_SENT
+from app.models import NotificationOutbox
+from app.services.notification_senders import PermanentDeliveryError, build_email_sender, build_sms_sender
+
+logger = logging.getLogger(__name__)
+
+# Channels
+EMAIL = "email"
+SMS = "sms"
+CHANNELS = (EMAIL, SMS)
+
+# Outbox statuses
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+# Session.info flag set by enqueue_notification() until the transaction ends
+_ENQUEUED = "notification_outbox_enqueued"
+
+
+def enqueue_notification(
+    db: Session,
+    channel: str,
+    recipient: str,
+    body: str,
+    subject: Optional[str] = None,
+    dedupe_key: Optional[str] = None,
+):
+    """
+    Add a message to the outbox as part of `db`'s transaction.
+
+    Nothing is sent here: the message becomes visible to the dispatcher when
+    the caller commits, together with the change it announces, and is lost
+    with it on rollback. A message whose `dedupe_key` is already in the
+    outbox is dropped, so retried requests and re-run jobs do not notify twice.
+    """
+    enqueue_notifications(
+        db, [dict(channel=channel, recipient=recipient, body=body, subject=subject, dedupe_key=dedupe_key)]
+    )
+
+
+def enqueue_notifications(db: Session, messages: List[dict]):
+    """
+    enqueue_notification() for many messages in one statement. Each message
+    is a dict of channel, recipient, body and optionally subject and dedupe_key.
+    """
+    if not messages:
+        return
+    now = datetime.utcnow()
+    rows = []
+    for message in messages:
+        if message["channel"] not in CHANNELS:
+            raise ValueError(f"Unknown notification channel '{message['channel']}'")
+        rows.append(dict(
+            channel=message["channel"], recipient=message["recipient"], body=message["body"],
+            subject=message.get("subject"), dedupe_key=message.get("dedupe_key"),
+            status=PENDING, attempts=0, next_attempt_at=now, created_at=now,
+        ))
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.execute(insert(NotificationOutbox).on_conflict_do_nothing(index_elements=["dedupe_key"]), rows)
+    else:
+        db.add_all([NotificationOutbox(**row) for row in rows])
+    db.info[_ENQUEUED] = True
+
+
+@dataclass(frozen=True)
+class ClaimedMessage:
+    id: int
+    channel: str
+    recipient: str
+    subject: Optional[str]
+    body: str
+    attempts: int
+
+
+class NotificationDispatcher:
+    """
+    Background sender draining the notification outbox.
+
+    Each pass claims up to `batch_size` due messages with SELECT ... FOR
+    UPDATE SKIP LOCKED, so the dispatchers of several workers never claim the
+    same row, and marks them 'sending' with a lease of `lease_seconds`: a
+    worker that dies mid-batch leaves rows that become due again when the
+    lease runs out. Messages are then sent outside any transaction over
+    long-lived connections (one SMTP session, one pooled HTTP client for
+    SMS) and their outcome is recorded in one commit. Failures are retried
+    with exponential backoff and jitter up to `max_attempts`; a message the
+    provider rejects outright fails at once. Delivery is at least once.
+
+    A commit that enqueued messages wakes this worker's dispatcher at once;
+    messages from other workers are picked up within `poll_interval`.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        lease_seconds: float,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self._senders: Dict[str, object] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_senders()
+
+    def wake(self):
+        self._wake.set()
+
+    def dispatch_once(self, now: Optional[datetime] = None) -> int:
+        """Claim and send one batch of due messages; returns how many were claimed."""
+        messages = self._claim(now or datetime.utcnow())
+        if messages:
+            self._record([(message, *self._deliver(message)) for message in messages])
+        return len(messages)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Notification dispatch failed: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        self._close_senders()
+
+    def _claim(self, now: datetime) -> List[ClaimedMessage]:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(NotificationOutbox)
+                .filter(
+                    NotificationOutbox.status.in_([PENDING, SENDING]),
+                    NotificationOutbox.next_attempt_at <= now,
+                )
+                .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            lease_expires = now + timedelta(seconds=self.lease_seconds)
+            for row in rows:
+                row.status = SENDING
+                row.attempts += 1
+                row.next_attempt_at = lease_expires
+            messages = [
+                ClaimedMessage(row.id, row.channel, row.recipient, row.subject, row.body, row.attempts) for row in rows
+            ]
+            db.commit()
+            return messages
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _deliver(self, message: ClaimedMessage) -> Tuple[str, Optional[str]]:
+        """Send one message; returns its new status and the error, if any."""
+        try:
+            self._sender(message.channel).send(message.recipient, message.subject, message.body)
+        except PermanentDeliveryError as e:
+            logger.warning(f"Notification {message.id} rejected: {e}")
+            return FAILED, str(e)
+        except Exception as e:
+            logger.warning(f"Notification {message.id} attempt {message.attempts} failed: {e}")
+            return (FAILED if message.attempts >= self.max_attempts else PENDING), str(e)
+        return SENT, None
+
+    def _record(self, outcomes: List[Tuple[ClaimedMessage, str, Optional[str]]]):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            for message, status, error in outcomes:
+                values = {"status": status, "last_error": error}
+                if status == SENT:
+                    values["sent_at"] = now
+                elif status == PENDING:
+                    values["next_attempt_at"] = now + timedelta(seconds=self._backoff(message.attempts))
+                # Only if no other dispatcher reclaimed the row after our lease ran out
+                db.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id == message.id, NotificationOutbox.attempts == message.attempts)
+                    .values(**values)
+                )
+                NOTIFICATIONS_SENT.labels(message.channel, "retry" if status == PENDING else status).inc()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _sender(self, channel: str):
+        sender = self._senders.get(channel)
+        if sender is None:
+            sender = self._senders[channel] = build_email_sender() if channel == EMAIL else build_sms_sender()
+        return sender
+
+    def _close_senders(self):
+        for sender in list(self._senders.values()):
+            try:
+                sender.close()
+            except Exception as e:
+                logger.warning(f"Error closing notification sender: {e}")
+        self._senders.clear()
+
+
+notification_dispatcher = NotificationDispatcher(
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    poll_interval=settings.NOTIFICATION_POLL_INTERVAL,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    retry_base=settings.NOTIFICATION_RETRY_BASE,
+    retry_max=settings.NOTIFICATION_RETRY_MAX,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session):
+    if session.info.pop(_ENQUEUED, False):
+        notification_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_ENQUEUED, None)
@@ -0,0 +1,179 @@
+# services/notification_senders.py
+import logging
+import smtplib
+import time
+from email.message import EmailMessage
+from typing import Optional
+
+import requests
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """The provider rejected the message itself; retrying cannot help."""
+
+
+class SmtpSender:
+    """
+    Sends email over one long-lived SMTP session.
+
+    The connection (with STARTTLS and login) is opened on first use and
+    reused for every message after it. A session idle for longer than
+    `idle_timeout` is checked with NOOP before use, since servers drop idle
+    clients; a dropped session is reopened once per message. Not thread
+    safe: the notification dispatcher owns one sender on its own thread.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str],
+        password: Optional[str],
+        from_address: str,
+        starttls: bool = True,
+        timeout: float = 30.0,
+        idle_timeout: float = 60.0,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.from_address = from_address
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def send(self, recipient: str, subject: Optional[str], body: str):
+        message = EmailMessage()
+        message["From"] = self.from_address
+        message["To"] = recipient
+        message["Subject"] = subject or ""
+        message.set_content(body)
+        try:
+            self._session().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._session().send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(f"Recipient refused: {e.recipients}")
+        except smtplib.SMTPResponseException as e:
+            if 500 <= e.smtp_code < 600:
+                raise PermanentDeliveryError(f"SMTP {e.smtp_code}: {e.smtp_error!r}")
+            raise
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _session(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self._server = None
+        if self._server is None:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password or "")
+            self._server = server
+            self._last_used = time.monotonic()
+        return self._server
+
+
+class TwilioSmsSender:
+    """Sends SMS through one Twilio client, whose HTTP session keeps its connections alive."""
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, recipient: str, subject: Optional[str], body: str):
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            self.client.messages.create(body=body, from_=self.from_number, to=recipient)
+        except TwilioRestException as e:
+            if 400 <= e.status < 500 and e.status != 429:
+                raise PermanentDeliveryError(f"Twilio {e.status}: {e.msg}")
+            raise
+
+    def close(self):
+        pass
+
+
+class HttpSmsSender:
+    """
+    Posts SMS as JSON ({"to", "from", "body"}) to an HTTP gateway over a
+    pooled requests session, e.g. a fake gateway in tests or an in-house relay.
+    """
+
+    def __init__(self, url: str, from_number: Optional[str], timeout: float = 10.0):
+        self.url = url
+        self.from_number = from_number
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, recipient: str, subject: Optional[str], body: str):
+        response = self.session.post(
+            self.url, json={"to": recipient, "from": self.from_number, "body": body}, timeout=self.timeout
+        )
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentDeliveryError(f"SMS gateway {response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+
+class LogSender:
+    """Logs messages instead of sending them (development)."""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    def send(self, recipient: str, subject: Optional[str], body: str):
+        logger.info(f"[{self.channel} not sent] to={recipient} subject={subject!r}: {body}")
+
+    def close(self):
+        pass
+
+
+def build_email_sender():
+    if settings.EMAIL_BACKEND == "log":
+        return LogSender("email")
+    return SmtpSender(
+        host=settings.SMTP_SERVER,
+        port=settings.SMTP_PORT,
+        user=settings.SMTP_USER or None,
+        password=settings.SMTP_PASSWORD,
+        from_address=settings.SMTP_FROM or settings.SMTP_USER,
+        starttls=settings.SMTP_STARTTLS,
+        idle_timeout=settings.SMTP_IDLE_TIMEOUT,
+    )
+
+
+def build_sms_sender():
+    if settings.SMS_BACKEND == "twilio":
+        if not settings.TWILIO_ACCOUNT_SID:
+            logger.warning("SMS_BACKEND is twilio but TWILIO_ACCOUNT_SID is not set; SMS will only be logged")
+            return LogSender("sms")
+        return TwilioSmsSender(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_FROM_NUMBER)
+    if settings.SMS_BACKEND == "http":
+        return HttpSmsSender(settings.SMS_GATEWAY_URL, settings.TWILIO_FROM_NUMBER)
+    return LogSender("sms")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.models import Notification, Patient, Appointment
 from app.schemas import (
@@ -7,7 +7,9 @@ from app.schemas import (
     NotificationResponseSchema,  # Used for fetching notifications
     UpdateNotificationStatusSchema
 )
-from app.utils import send_email, send_sms, send_in_app_notification
+from app.utils import send_in_app_notification
+from app.services.notification_outbox import EMAIL, SMS, enqueue_notification
+from app.services.appointment_reminders import REMINDER_SUBJECT, reminder_dedupe_key, reminder_message
 import logging
 
 class NotificationService:
@@ -46,42 +48,51 @@ class NotificationService:
             self.logger.error(f"Error creating notification: {str(e)}")
             raise Exception("Error creating notification")
 
-    def send_email_notification(self, patient_id: int, subject: str, body: str):
+    def send_email_notification(self, patient_id: int, subject: str, body: str, dedupe_key: Optional[str] = None):
         """
-        Sends an email notification to a patient.
+        Queues an email notification to a patient; the outbox dispatcher sends it.
         """
         patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
         if patient:
-            try:
-                # Sending email (you can integrate with a real email service here)
-                send_email(patient.email, subject, body)
-                self.logger.info(f"Email sent to {patient.email} with subject: {subject}")
-                return True
-            except Exception as e:
-                self.logger.error(f"Error sending email to {patient.email}: {str(e)}")
+            if not self._queue_email(patient, subject, body, dedupe_key):
                 return False
+            self.db.commit()
+            return True
         else:
             self.logger.warning(f"Patient with ID {patient_id} not found for email notification")
             return False
 
-    def send_sms_notification(self, patient_id: int, message: str):
+    def send_sms_notification(self, patient_id: int, message: str, dedupe_key: Optional[str] = None):
         """
-        Sends an SMS notification to a patient.
+        Queues an SMS notification to a patient; the outbox dispatcher sends it.
         """
         patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
         if patient:
-            try:
-                # Sending SMS (you can integrate with a real SMS service here)
-                send_sms(patient.phone_number, message)
-                self.logger.info(f"SMS sent to {patient.phone_number}: {message}")
-                return True
-            except Exception as e:
-                self.logger.error(f"Error sending SMS to {patient.phone_number}: {str(e)}")
+            if not self._queue_sms(patient, message, dedupe_key):
                 return False
+            self.db.commit()
+            return True
         else:
             self.logger.warning(f"Patient with ID {patient_id} not found for SMS notification")
             return False
 
+    def _queue_email(self, patient: Patient, subject: str, body: str, dedupe_key: Optional[str] = None) -> bool:
+        email = patient.user.email if patient.user else None
+        if not email:
+            self.logger.warning(f"Patient {patient.patient_id} has no email address")
+            return False
+        enqueue_notification(self.db, EMAIL, email, body, subject=subject, dedupe_key=dedupe_key)
+        self.logger.info(f"Email to {email} queued with subject: {subject}")
+        return True
+
+    def _queue_sms(self, patient: Patient, message: str, dedupe_key: Optional[str] = None) -> bool:
+        if not patient.residential_phone:
+            self.logger.warning(f"Patient {patient.patient_id} has no phone number")
+            return False
+        enqueue_notification(self.db, SMS, patient.residential_phone, message, dedupe_key=dedupe_key)
+        self.logger.info(f"SMS to {patient.residential_phone} queued")
+        return True
+
     def send_in_app_notification(self, patient_id: int, message: str):
         """
         Sends an in-app notification to a patient.
@@ -102,14 +113,20 @@ class NotificationService:
 
     def send_appointment_reminder(self, appointment_id: int):
         """
-        Sends an appointment reminder to the patient associated with the appointment.
+        Queues an appointment reminder (SMS and email) to the patient associated with the appointment,
+        ahead of the scheduled reminders (services/appointment_reminders.py), which then skip it.
+        Reminding twice about the same appointment time sends nothing new.
         """
-        appointment = self.db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        appointment = self.db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
         if appointment:
-            patient_id = appointment.patient_id
-            message = f"Reminder: Your appointment is scheduled for {appointment.date.strftime('%Y-%m-%d %H:%M:%S')}."
-            self.send_sms_notification(patient_id, message)
-            self.send_email_notification(patient_id, "Appointment Reminder", message)
+            when = appointment.appointment_date
+            message = reminder_message(when)
+            self._queue_sms(appointment.patient, message, reminder_dedupe_key(appointment_id, when, SMS))
+            self._queue_email(
+                appointment.patient, REMINDER_SUBJECT, message, reminder_dedupe_key(appointment_id, when, EMAIL)
+            )
+            appointment.reminder_sent_at = datetime.utcnow()
+            self.db.commit()
         else:
             self.logger.warning(f"Appointment with ID {appointment_id} not found")
 
@@ -0,0 +1,174 @@
+# services/password_hasher.py
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.metrics import PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+from app.process_pools import cores_per_worker, pool_context
+
+logger = logging.getLogger(__name__)
+
+# Operations, as metric labels
+HASH = "hash"
+VERIFY = "verify"
+
+
+@lru_cache(maxsize=None)
+def crypt_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """The bcrypt cost of `password_hash` ($2b$12$... -> 12), or None if it is not a bcrypt hash."""
+    parts = password_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def verify_and_update(password: str, password_hash: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Whether `password` matches, plus a new hash when the stored one was made with another cost."""
+    if not password_hash:
+        return False, None
+    try:
+        if not crypt_context(rounds).verify(password, password_hash):
+            return False, None
+    except ValueError:
+        # Not a hash passlib recognises (e.g. a disabled account's placeholder)
+        return False, None
+    if hash_rounds(password_hash) != rounds:
+        return True, hash_password(password, rounds)
+    return True, None
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords in a dedicated process pool.
+
+    A bcrypt call is a quarter of a second of CPU at cost 12. Run on the
+    request threadpool, a burst of logins (shift change) would hold the
+    threads every other request needs; here it runs in `max_workers`
+    processes instead. Async callers await the pool without holding a
+    thread at all; sync callers block only their own thread. At most
+    `max_pending` operations from this process are queued or running: past
+    that, callers fail fast with a 503 and Retry-After rather than queueing
+    behind a backlog they would time out in anyway. With max_workers=0
+    hashing runs inline.
+
+    Logins rehash transparently: verify_and_update returns a fresh hash when
+    the stored one was made with a cost other than `rounds`.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, rounds: int):
+        self.max_workers = max_workers
+        self.max_pending = max(1, max_pending)
+        self.rounds = rounds
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=pool_context())
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def hash(self, password: str) -> str:
+        return self._run(HASH, hash_password, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self.verify_and_update(password, password_hash)[0]
+
+    def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        return self._run(VERIFY, verify_and_update, password, password_hash, self.rounds)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(HASH, hash_password, password, self.rounds)
+
+    async def verify_and_update_async(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """verify_and_update() for async routes: waits on the pool without holding a thread."""
+        return await self._run_async(VERIFY, verify_and_update, password, password_hash, self.rounds)
+
+    def _run(self, operation: str, function: Callable, *args):
+        if self.max_workers <= 0:
+            return self._timed(operation, function, *args)
+        start = time.perf_counter()
+        try:
+            result = self._submit(operation, function, *args).result()
+        except BrokenProcessPool:
+            result = self._recover(function, *args)
+        PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        return result
+
+    async def _run_async(self, operation: str, function: Callable, *args):
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(self._timed, operation, function, *args)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wrap_future(self._submit(operation, function, *args))
+        except BrokenProcessPool:
+            result = await asyncio.to_thread(self._recover, function, *args)
+        PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        return result
+
+    def _timed(self, operation: str, function: Callable, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        return result
+
+    def _submit(self, operation: str, function: Callable, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                PASSWORD_HASH_REJECTED.labels(operation).inc()
+                raise HTTPException(
+                    status_code=503, detail="Too many sign-ins in progress, please retry", headers={"Retry-After": "1"}
+                )
+            self._pending += 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(self._pending)
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(self._pending)
+
+    def _recover(self, function: Callable, *args):
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        logger.error("Password hashing pool broke; hashing inline and restarting the pool")
+        with self._lock:
+            self._executor = None
+        return function(*args)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS if settings.PASSWORD_HASH_WORKERS is not None else cores_per_worker(),
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
@@ -0,0 +1,103 @@
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from app.id_allocator import hospital_reg_number_allocator, patient_id_allocator
+from app.models import Patient
+
+
+class PatientSearchService:
+    """
+    Shared patient search used by every department router.
+
+    On PostgreSQL the ILIKE filters are served by the pg_trgm GIN indexes on
+    patients (see migration a3f1c9d2b7e4) and results are ranked by trigram
+    similarity. The total is computed with a window function so the count and
+    the page come back in a single round trip.
+    """
+
+    # Search parameter name -> Patient column
+    SEARCH_FIELDS = {
+        "patient_id": Patient.patient_id,
+        "surname": Patient.surname,
+        "other_names": Patient.other_names,
+        "hospital_reg_number": Patient.hospital_reg_number,
+    }
+
+    # Fields holding allocated identifiers: a complete identifier with a valid
+    # check digit is looked up through the unique index instead of a trigram scan
+    IDENTIFIER_FIELDS = {
+        "patient_id": patient_id_allocator,
+        "hospital_reg_number": hospital_reg_number_allocator,
+    }
+
+    SORT_FIELDS = {
+        "surname": Patient.surname,
+        "hospital_reg_number": Patient.hospital_reg_number,
+    }
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @property
+    def _supports_trigram(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    def search(
+        self,
+        patient_id: Optional[str] = None,
+        surname: Optional[str] = None,
+        other_names: Optional[str] = None,
+        hospital_reg_number: Optional[str] = None,
+        page: int = 1,
+        size: int = 50,
+        sort_by: Optional[str] = None,
+    ) -> dict:
+        """
+        Search patients by any combination of the supported fields.
+
+        Returns the PatientSearchResponse payload. Raises a 404 when no patient
+        matches, which is what the department screens expect.
+        """
+        terms = {
+            "patient_id": patient_id,
+            "surname": surname,
+            "other_names": other_names,
+            "hospital_reg_number": hospital_reg_number,
+        }
+        terms = {field: value for field, value in terms.items() if value}
+
+        query = self.db.query(Patient, func.count().over().label("total_records"))
+
+        for field, value in terms.items():
+            allocator = self.IDENTIFIER_FIELDS.get(field)
+            if allocator and allocator.matches(value):
+                query = query.filter(self.SEARCH_FIELDS[field] == value)
+            else:
+                query = query.filter(self.SEARCH_FIELDS[field].ilike(f"%{value}%"))
+
+        query = query.order_by(*self._ordering(terms, sort_by))
+
+        rows = query.offset((page - 1) * size).limit(size).all()
+
+        if not rows:
+            raise HTTPException(status_code=404, detail="No patients found")
+
+        return {
+            "total_records": rows[0].total_records,
+            "page": page,
+            "size": size,
+            "patients": [row.Patient for row in rows],
+        }
+
+    def _ordering(self, terms: dict, sort_by: Optional[str]) -> list:
+        """Explicit sort wins; otherwise rank by best trigram similarity."""
+        if sort_by in self.SORT_FIELDS:
+            return [self.SORT_FIELDS[sort_by], Patient.id]
+
+        if terms and self._supports_trigram:
+            scores = [func.similarity(self.SEARCH_FIELDS[field], value) for field, value in terms.items()]
+            rank = scores[0] if len(scores) == 1 else func.greatest(*scores)
+            return [rank.desc(), Patient.id]
+
+        return [Patient.surname, Patient.id]
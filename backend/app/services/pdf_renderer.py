@@ -0,0 +1,333 @@
+# services/pdf_renderer.py
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import BaseDocTemplate, Frame, PageBreak, PageTemplate, Paragraph, Spacer, Table, TableStyle
+
+from app.config import settings
+from app.metrics import PDF_RENDER_FAILURES, PDF_RENDER_SECONDS
+from app.process_pools import pool_context
+from app.services.report_assets import report_assets
+
+logger = logging.getLogger(__name__)
+
+# Document kinds
+BILLING_RECEIPT = "billing_receipt"
+PHARMACY_RECEIPT = "pharmacy_receipt"
+WALKIN_RECEIPT = "walkin_receipt"
+LAB_REPORT = "lab_report"
+PATIENT_EXPORT = "patient_export"
+
+# Upper bound on receipts rendered into one batch PDF
+MAX_BATCH_RECEIPTS = 500
+
+
+class PdfTemplates:
+    """
+    Layout objects shared by every document rendered on this thread: the
+    sample stylesheet, the receipt table style and the page template with its
+    frame. Building them is most of the fixed cost of a small receipt, so
+    they are built once and reused. ReportLab resets frames as it lays out
+    each page, so templates are per thread rather than per process.
+    """
+
+    def __init__(self):
+        self.styles = getSampleStyleSheet()
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ])
+        # Same page geometry as SimpleDocTemplate's defaults
+        width, height = letter
+        self.frame = Frame(inch, inch, width - 2 * inch, height - 2 * inch, id="normal")
+        self.page_template = PageTemplate(id="receipt", frames=[self.frame], pagesize=letter)
+
+    def document(self, buffer: BytesIO) -> BaseDocTemplate:
+        return BaseDocTemplate(buffer, pagesize=letter, pageTemplates=[self.page_template])
+
+    def paragraph(self, text: str, style: str = "BodyText") -> Paragraph:
+        return Paragraph(text, self.styles[style])
+
+    def table(self, rows: List[List[Any]]) -> Table:
+        table = Table(rows)
+        table.setStyle(self.table_style)
+        return table
+
+
+_local = threading.local()
+
+
+def get_templates() -> PdfTemplates:
+    templates = getattr(_local, "templates", None)
+    if templates is None:
+        templates = _local.templates = PdfTemplates()
+    return templates
+
+
+# ------------------------------
+# Receipt layouts (lists of flowables, so receipts can be batched)
+# ------------------------------
+
+def _header(templates: PdfTemplates, fallback_title: str, title: str) -> List:
+    logo = report_assets.logo()
+    content = [logo.flowable(max_width=200, max_height=100) if logo else templates.paragraph(fallback_title, "Title")]
+    content += [Spacer(1, 12), templates.paragraph(title, "Title"), Spacer(1, 12)]
+    return content
+
+
+def _details(templates: PdfTemplates, lines: List[str]) -> List:
+    content = []
+    for line in lines:
+        content += [templates.paragraph(line), Spacer(1, 6)]
+    return content
+
+
+def billing_receipt_story(templates: PdfTemplates, data: Dict[str, Any]) -> List:
+    content = _header(templates, "Billing Receipt", "Billing Receipt")
+    content += _details(templates, [
+        f"Patient: {data['patient_name']}",
+        f"Doctor: {data['doctor_name']}",
+        f"Invoice Number: {data['invoice_number']}",
+        f"Invoice Date: {data['invoice_date']}",
+        f"Total Bill: NGN{data['total_bill']:.2f}",
+        f"Discount %: NGN{data['discount_percentage']:.2f}",
+        f"Discount Amt: NGN{data['discount_amount']:.2f}",
+        f"Amount Due: NGN{data['amount_due']:.2f}",
+        f"Status: {data['status']}",
+    ])
+    rows = [["Fee Type", "Amount"]] + [[fee_type, f"NGN{amount:.2f}"] for fee_type, amount in data["fees"]]
+    content += [Spacer(1, 12), templates.table(rows)]
+    content += [
+        Spacer(1, 12),
+        templates.paragraph("Thank you for choosing our service. For inquiries, contact support@example.com.", "Italic"),
+    ]
+    return content
+
+
+def pharmacy_receipt_story(templates: PdfTemplates, data: Dict[str, Any]) -> List:
+    content = _header(templates, "Pharmacy Receipt", "Pharmacy Receipt")
+    content += _details(templates, [
+        f"Patient: {data['patient_name']}",
+        f"Medication: {data['medication_name']}",
+        f"Dosage and Route: {data['dosage_and_route']}",
+        f"Frequency: {data['frequency']}",
+        f"Dispensation Date: {data['dispensation_date']}",
+    ])
+    rows = [["Drug Name", "Quantity", "Price"]] + [
+        [order["drug_name"], order["quantity"], f"NGN{order['price']:.2f}"] for order in data["drug_orders"]
+    ]
+    content += [Spacer(1, 12), templates.table(rows)]
+    total_cost = sum(order["price"] * order["quantity"] for order in data["drug_orders"])
+    content += [Spacer(1, 12), templates.paragraph(f"Total Cost: NGN{total_cost:.2f}")]
+    content += [
+        Spacer(1, 12),
+        templates.paragraph("Thank you for choosing our pharmacy. For inquiries, contact support@example.com.", "Italic"),
+    ]
+    return content
+
+
+def walkin_receipt_story(templates: PdfTemplates, data: Dict[str, Any]) -> List:
+    content = _header(templates, "Pharmacy Receipt", "PHARMACY RECEIPT (WALK-IN SALE)")
+    content += _details(templates, [
+        f"Receipt ID: {data['pharmacy_id']}",
+        f"Invoice Number: {data['invoice_number']}",
+        f"Customer: {data['customer_name']}",
+        f"Date: {data['date']}",
+    ])
+    content.append(Spacer(1, 12))
+    rows = [["Item", "Qty", "Unit Price", "Total"]] + [
+        [item["name"], str(item["quantity"]), f"NGN{item['unit_price']:.2f}", f"NGN{item['total']:.2f}"]
+        for item in data["items"]
+    ]
+    content += [templates.table(rows), Spacer(1, 12)]
+    content += [templates.paragraph(f"TOTAL: NGN{data['total']:.2f}", "Heading2"), Spacer(1, 24)]
+    content.append(templates.paragraph("Thank you for your purchase! This is a walk-in sale receipt.", "Italic"))
+    return content
+
+
+RECEIPT_STORIES: Dict[str, Callable[[PdfTemplates, Dict[str, Any]], List]] = {
+    BILLING_RECEIPT: billing_receipt_story,
+    PHARMACY_RECEIPT: pharmacy_receipt_story,
+    WALKIN_RECEIPT: walkin_receipt_story,
+}
+
+
+# ------------------------------
+# Canvas documents
+# ------------------------------
+
+def lab_report_pdf(data: Dict[str, Any]) -> bytes:
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer)
+
+    # Logo at the top center, limited to 500pt width or 100pt height (A4 page: 595x842 points)
+    logo = report_assets.logo()
+    if logo:
+        img_width, img_height = logo.fit(500, 100)
+        x_pos = (595 - img_width) / 2
+        p.drawImage(logo.reader, x_pos, 750, width=img_width, height=img_height, mask="auto")
+        y_position = 740 - img_height  # Position content below the image
+    else:
+        y_position = 800  # Start at the top if no image
+
+    p.drawString(100, y_position, f"Laboratory Report for {data['patient_name']}")
+    p.drawString(100, y_position - 20, f"Patient ID: {data['patient_id']}")
+    p.drawString(100, y_position - 40, f"Report Date: {data['report_date']}")
+    p.drawString(100, y_position - 60, "----------------------------------------")
+
+    sections = [
+        ("Tests Requested:", data["tests_requested"]),
+        ("Test Results:", data["test_results"]),
+        ("Reference Ranges:", data["reference_ranges"]),
+        ("Pathologist Comments:", data["pathologist_comments"]),
+        ("Specimen Type:", data["specimen_type"]),
+        ("Collection Date:", data["collection_date"]),
+    ]
+    offset = 80
+    for label, value in sections:
+        p.drawString(100, y_position - offset, label)
+        p.drawString(120, y_position - offset - 20, "" if value is None else str(value))
+        offset += 40
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def patient_export_pdf(data: Dict[str, Any]) -> bytes:
+    # Imported here so the export module is only loaded where it is used
+    from app.routes.v1.export import generate_pdf
+    return generate_pdf(data).getvalue()
+
+
+# ------------------------------
+# Entry points (run inside the render pool)
+# ------------------------------
+
+def render_document(kind: str, data: Dict[str, Any]) -> bytes:
+    if kind == LAB_REPORT:
+        return lab_report_pdf(data)
+    if kind == PATIENT_EXPORT:
+        return patient_export_pdf(data)
+    return render_receipt_batch([(kind, data)])
+
+
+def render_receipt_batch(receipts: List[Tuple[str, Dict[str, Any]]]) -> bytes:
+    """Lay out receipts one after another, each starting on a new page, in one PDF."""
+    templates = get_templates()
+    story = []
+    for index, (kind, data) in enumerate(receipts):
+        if index:
+            story.append(PageBreak())
+        story += RECEIPT_STORIES[kind](templates, data)
+
+    buffer = BytesIO()
+    templates.document(buffer).build(story)
+    return buffer.getvalue()
+
+
+def _init_pdf_worker():
+    """Build the layout templates and decode the logo before the first job arrives."""
+    get_templates()
+    report_assets.load()
+
+
+class PdfRenderer:
+    """
+    Renders PDFs in a bounded process pool.
+
+    Layout is CPU-bound and holds the GIL, so it is moved out of the uvicorn
+    worker into `max_workers` processes; the calling thread only waits for
+    the bytes. At most `max_pending` renders from this process are queued or
+    running at once: further callers wait up to `timeout` seconds for a slot
+    and then get a 503. With max_workers=0 documents are rendered inline.
+    Callers pass plain data (no ORM objects) so jobs can be pickled.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: float):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=_init_pdf_worker, mp_context=pool_context()
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def render(self, kind: str, data: Dict[str, Any]) -> bytes:
+        return self._run(kind, render_document, kind, data)
+
+    def render_batch(self, receipts: List[Tuple[str, Dict[str, Any]]]) -> bytes:
+        """One multi-page PDF of (kind, data) receipts, in order."""
+        if len(receipts) > MAX_BATCH_RECEIPTS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_RECEIPTS} receipts can be printed at once")
+        return self._run("receipt_batch", render_receipt_batch, receipts)
+
+    async def render_async(self, kind: str, data: Dict[str, Any]) -> bytes:
+        """render() for async routes, without blocking the event loop."""
+        return await asyncio.to_thread(self.render, kind, data)
+
+    def _run(self, kind: str, function: Callable, *args) -> bytes:
+        start = time.perf_counter()
+        pdf = self._submit(kind, function, *args)
+        PDF_RENDER_SECONDS.labels(kind).observe(time.perf_counter() - start)
+        return pdf
+
+    def _submit(self, kind: str, function: Callable, *args) -> bytes:
+        if self.max_workers <= 0:
+            return function(*args)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            PDF_RENDER_FAILURES.labels(kind, "busy").inc()
+            raise HTTPException(status_code=503, detail="PDF renderer is busy, please retry")
+        try:
+            future = self.executor.submit(function, *args)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            PDF_RENDER_FAILURES.labels(kind, "timeout").inc()
+            raise HTTPException(status_code=504, detail="PDF rendering timed out")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            logger.error("PDF render pool broke; rendering inline and restarting the pool")
+            with self._lock:
+                self._executor = None
+            return function(*args)
+        finally:
+            self._slots.release()
+
+
+pdf_renderer = PdfRenderer(
+    max_workers=settings.PDF_WORKERS,
+    max_pending=settings.PDF_MAX_PENDING,
+    timeout=settings.PDF_RENDER_TIMEOUT,
+)
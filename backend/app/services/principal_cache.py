@@ -0,0 +1,95 @@
+# services/principal_cache.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.config import settings
+from app.models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as route handlers see it: identity and role names, no ORM state."""
+
+    id: int
+    username: str
+    full_name: Optional[str]
+    roles: Tuple[str, ...]
+
+    def has_role(self, name: str) -> bool:
+        return name in self.roles
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            roles=tuple(sorted(role.name for role in user.roles)),
+        )
+
+
+class PrincipalCache:
+    """
+    Per-worker LRU of principals by username.
+
+    get_current_user resolves a token's subject here, so an authenticated
+    request makes no identity queries while its principal is cached. A miss
+    loads the user and its roles in one round trip. Entries live for `ttl`
+    seconds: the admin endpoints that change users or roles invalidate this
+    worker's entries straight away, and the TTL bounds how long another
+    worker can keep serving the old principal. A load that raced with an
+    invalidation is returned to its caller but not kept.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, db: Session, username: str) -> Optional[Principal]:
+        """The principal for `username`, or None when no such user exists."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(username)
+                return entry[0]
+            generation = self._generation
+
+        user = (
+            db.query(User)
+            .options(joinedload(User.roles))
+            .filter(User.username == username)
+            .first()
+        )
+        if user is None:
+            return None
+
+        principal = Principal.from_user(user)
+        with self._lock:
+            if generation != self._generation:
+                return principal
+            self._entries[username] = (principal, now)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, username: Optional[str] = None):
+        """Forget `username`, or every principal when no username is given (e.g. a role changed)."""
+        with self._lock:
+            self._generation += 1
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+
+principal_cache = PrincipalCache(ttl=settings.PRINCIPAL_CACHE_TTL, max_size=settings.PRINCIPAL_CACHE_SIZE)
@@ -0,0 +1,102 @@
+# services/report_assets.py
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Logo bundled with the backend, used when REPORT_LOGO_PATH is not set
+DEFAULT_LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets", "renewal.png")
+
+# Largest box (in points) any report draws the logo in, and how many pixels
+# per point are kept: the logo is downscaled once so renders stay cheap
+LOGO_MAX_BOX = (500, 100)
+LOGO_PIXELS_PER_POINT = 2
+
+
+class LogoAsset:
+    """A decoded, pre-scaled logo shared by every PDF rendered in this process."""
+
+    def __init__(self, image: PILImage.Image):
+        self.reader = ImageReader(image)
+        # Decode once up front; ImageReader keeps the RGB data for later draws
+        self.reader.getRGBData()
+        self.pixel_width, self.pixel_height = image.size
+
+    def fit(self, max_width: float, max_height: float) -> Tuple[float, float]:
+        """Draw size in points that fits the box and keeps the aspect ratio."""
+        scale = min(max_width / self.pixel_width, max_height / self.pixel_height)
+        return self.pixel_width * scale, self.pixel_height * scale
+
+    def flowable(self, max_width: float = 200, max_height: float = 100) -> Flowable:
+        width, height = self.fit(max_width, max_height)
+        return LogoFlowable(self.reader, width, height)
+
+
+class LogoFlowable(Flowable):
+    """Platypus flowable that draws a shared ImageReader without re-reading it."""
+
+    def __init__(self, reader: ImageReader, width: float, height: float):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = "CENTER"
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, width=self.width, height=self.height, mask="auto")
+
+
+class ReportAssetRegistry:
+    """
+    Images used by the PDF generators, loaded from disk once per process.
+
+    load() runs at startup; report code calls logo(), which loads on first
+    use in processes that skip startup (export workers, scripts). A missing
+    or unreadable file is logged once and reports render without a logo.
+    """
+
+    def __init__(self, logo_path: Optional[str] = None):
+        self.logo_path = logo_path or DEFAULT_LOGO_PATH
+        self._logo: Optional[LogoAsset] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._logo = self._load_logo(self.logo_path)
+            self._loaded = True
+
+    def logo(self) -> Optional[LogoAsset]:
+        if not self._loaded:
+            self.load()
+        return self._logo
+
+    @staticmethod
+    def _load_logo(path: str) -> Optional[LogoAsset]:
+        try:
+            with PILImage.open(path) as image:
+                image.load()
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                max_pixels = (LOGO_MAX_BOX[0] * LOGO_PIXELS_PER_POINT, LOGO_MAX_BOX[1] * LOGO_PIXELS_PER_POINT)
+                image.thumbnail(max_pixels, PILImage.LANCZOS)
+                return LogoAsset(image)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load report logo from {path}: {e}")
+            return None
+
+
+report_assets = ReportAssetRegistry(settings.REPORT_LOGO_PATH)
@@ -0,0 +1,106 @@
+# services/revenue_rollup.py
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Billing, DailyRevenue, Doctor, PaymentHistory
+
+# fee_type of the row that carries the whole billing (count and total_bill)
+REVENUE_TOTAL = "total"
+
+ZERO = Decimal("0.00")
+
+
+class RevenueRollupService:
+    """
+    Maintains and reads the daily_revenue rollup.
+
+    Each paid billing adds its total_bill to the (day, doctor, 'total') row
+    and its discounted fee amounts to one row per fee type; payments add to
+    payments_received on the 'total' row. Updates are upserts that run in the
+    caller's transaction, so the rollup commits or rolls back with the
+    billing change itself. Revenue is attributed to the invoice date, or to
+    the day the billing was paid when no invoice was generated.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_paid_billing(self, billing: Billing, sign: int = 1):
+        """Add a billing that was just marked Paid (sign=-1 removes it again)."""
+        day = (billing.invoice_date or datetime.utcnow()).date()
+        total_bill = billing.total_bill or ZERO
+
+        self._upsert(day, billing.doctor_id, REVENUE_TOTAL, revenue=sign * total_bill, billing_count=sign)
+
+        gross_by_type: Dict[str, Decimal] = {}
+        for fee in billing.fees:
+            fee_type = getattr(fee.fee_type, "value", fee.fee_type)
+            gross_by_type[fee_type] = gross_by_type.get(fee_type, ZERO) + (fee.amount or ZERO)
+        gross = sum(gross_by_type.values(), ZERO)
+        if gross <= 0:
+            return
+
+        # Spread the discount over fee types so they add up to total_bill
+        for fee_type, amount in gross_by_type.items():
+            share = (amount * total_bill / gross).quantize(Decimal("0.01"))
+            self._upsert(day, billing.doctor_id, fee_type, revenue=sign * share, billing_count=sign)
+
+    def record_payment(self, payment: PaymentHistory, billing: Billing):
+        day = (payment.payment_date or datetime.utcnow()).date()
+        self._upsert(day, billing.doctor_id, REVENUE_TOTAL, payments_received=payment.amount_paid or ZERO)
+
+    def revenue_by_doctor(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        doctor_id: Optional[int] = None,
+    ) -> List:
+        """(doctor_id, doctor_name, total_revenue, billing_count) per doctor for an inclusive day range."""
+        query = self.db.query(
+            Doctor.id.label("doctor_id"),
+            Doctor.full_name.label("doctor_name"),
+            func.sum(DailyRevenue.revenue).label("total_revenue"),
+            func.sum(DailyRevenue.billing_count).label("billing_count")
+        ).join(
+            DailyRevenue, Doctor.id == DailyRevenue.doctor_id
+        ).filter(
+            DailyRevenue.fee_type == REVENUE_TOTAL
+        ).group_by(
+            Doctor.id, Doctor.full_name
+        )
+
+        if doctor_id:
+            query = query.filter(Doctor.id == doctor_id)
+        if start:
+            query = query.filter(DailyRevenue.day >= start)
+        if end:
+            query = query.filter(DailyRevenue.day <= end)
+
+        # Doctors whose billings were all removed again keep a zeroed row
+        return query.having(func.sum(DailyRevenue.billing_count) > 0).all()
+
+    def _upsert(self, day: date, doctor_id: int, fee_type: str, revenue=ZERO, billing_count=0, payments_received=ZERO):
+        dialect = self.db.get_bind().dialect.name
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(DailyRevenue).values(
+            day=day,
+            doctor_id=doctor_id,
+            fee_type=fee_type,
+            revenue=revenue,
+            billing_count=billing_count,
+            payments_received=payments_received,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[DailyRevenue.day, DailyRevenue.doctor_id, DailyRevenue.fee_type],
+            set_={
+                "revenue": DailyRevenue.revenue + statement.excluded.revenue,
+                "billing_count": DailyRevenue.billing_count + statement.excluded.billing_count,
+                "payments_received": DailyRevenue.payments_received + statement.excluded.payments_received,
+            },
+        )
+        self.db.execute(statement)
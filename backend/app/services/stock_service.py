@@ -0,0 +1,277 @@
+# services/stock_service.py
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Drug, Stock, StockMovement, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Stock movement types
+RECEIPT = "receipt"
+DISPENSE = "dispense"
+SALE = "sale"
+ADJUSTMENT = "adjustment"
+
+
+class InsufficientStockError(HTTPException):
+    """400 raised when a basket asks for more of a drug than is in stock."""
+
+    def __init__(self, drug: Drug, available: int, requested: int):
+        self.drug = drug
+        self.available = available
+        self.requested = requested
+        super().__init__(
+            status_code=400,
+            detail=f"Insufficient stock for drug {drug.name}. Available: {available}, Requested: {requested}"
+        )
+
+
+@dataclass
+class ReservedLine:
+    drug: Drug
+    quantity: int
+    price: Decimal
+
+    @property
+    def total(self) -> Decimal:
+        return round(self.price * Decimal(str(self.quantity)), 2)
+
+
+class StockReservationService:
+    """
+    Reserves stock for a whole basket of drug orders in three statements.
+
+    All drugs and their stock rows are read in one SELECT ... FOR UPDATE
+    ordered by drug id, so concurrent dispensing of overlapping baskets
+    serialises on the stock rows without deadlocking. The basket is validated
+    as a whole, every decrement is applied by a single UPDATE and the matching
+    ledger rows are written by a single INSERT. Nothing is committed here: the
+    caller commits once, together with the records that consume the stock,
+    and the row locks are held until then.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def reserve(
+        self,
+        drug_orders,
+        movement_type: str = DISPENSE,
+        reference: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> List[ReservedLine]:
+        """
+        Lock, validate and decrement stock for `drug_orders` (objects with
+        drug_id, quantity and an optional price). Returns one ReservedLine per
+        order, in order. Raises 404 for unknown drugs or missing stock and
+        InsufficientStockError when the basket cannot be filled.
+        """
+        requested: Dict[int, int] = {}
+        for order in drug_orders:
+            requested[order.drug_id] = requested.get(order.drug_id, 0) + order.quantity
+        if not requested:
+            return []
+
+        rows = (
+            self.db.query(Drug, Stock)
+            .join(Stock, Stock.drug_id == Drug.id)
+            .filter(Drug.id.in_(requested))
+            .order_by(Drug.id)
+            .with_for_update(of=Stock)
+            .all()
+        )
+        drugs = {drug.id: drug for drug, _ in rows}
+        stocks = {drug.id: stock for drug, stock in rows}
+
+        missing = [drug_id for drug_id in requested if drug_id not in stocks]
+        if missing:
+            existing = {drug_id for (drug_id,) in self.db.query(Drug.id).filter(Drug.id.in_(missing))}
+            drug_id = missing[0]
+            if drug_id not in existing:
+                raise HTTPException(status_code=404, detail=f"Drug with ID {drug_id} not found")
+            raise HTTPException(status_code=404, detail=f"Stock for drug ID {drug_id} not found")
+
+        for drug_id, quantity in requested.items():
+            if stocks[drug_id].quantity < quantity:
+                raise InsufficientStockError(drugs[drug_id], stocks[drug_id].quantity, quantity)
+
+        decrement = case(requested, value=Stock.drug_id)
+        result = self.db.execute(
+            update(Stock)
+            .where(Stock.drug_id.in_(requested), Stock.quantity >= decrement)
+            .values(quantity=Stock.quantity - decrement, last_updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(requested):
+            # Only reachable without row locks (e.g. SQLite); never oversell
+            raise HTTPException(status_code=409, detail="Stock changed while the order was being processed, please retry")
+
+        for drug_id, quantity in requested.items():
+            self.db.expire(stocks[drug_id])
+
+        StockLedger(self.db).record_many([
+            {"drug_id": drug_id, "movement_type": movement_type, "quantity": -quantity,
+             "reference": reference, "user_id": user_id}
+            for drug_id, quantity in requested.items()
+        ])
+
+        return [
+            ReservedLine(
+                drug=drugs[order.drug_id],
+                quantity=order.quantity,
+                price=Decimal(str(order.price if order.price is not None else drugs[order.drug_id].price)),
+            )
+            for order in drug_orders
+        ]
+
+
+class StockLedger:
+    """
+    Append-only history of stock changes.
+
+    Every change to Stock.quantity writes a signed stock_movements row in the
+    same transaction. Stock levels can be rebuilt from the ledger as the
+    latest snapshot plus the movements after it, for now or for any past
+    moment. compact() rolls recent movements into fresh snapshots so those
+    reads stay short; movements themselves are never updated or deleted.
+    """
+
+    # Movements younger than this are left for the next compaction, so rows
+    # from transactions still in flight are not skipped
+    COMPACTION_SETTLE = timedelta(minutes=5)
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_many(self, movements: List[Dict]):
+        """Insert movement rows (drug_id, movement_type, quantity, reference, user_id) in one statement."""
+        if not movements:
+            return
+        now = datetime.utcnow()
+        self.db.execute(insert(StockMovement), [{**movement, "created_at": now} for movement in movements])
+
+    def adjust(self, drug_id: int, quantity: int, user_id: Optional[int] = None, reference: Optional[str] = None):
+        """
+        Add (receipt) or remove (adjustment) stock in one guarded UPDATE plus
+        a ledger row. Raises 400 if the change would take stock below zero.
+        """
+        result = self.db.execute(
+            update(Stock)
+            .where(Stock.drug_id == drug_id, Stock.quantity + quantity >= 0)
+            .values(quantity=Stock.quantity + quantity, last_updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            if not self.db.query(Stock.id).filter(Stock.drug_id == drug_id).first():
+                raise HTTPException(status_code=404, detail="Stock not found for given drug")
+            raise HTTPException(status_code=400, detail="Stock quantity cannot be negative")
+        self.record_many([{
+            "drug_id": drug_id,
+            "movement_type": RECEIPT if quantity > 0 else ADJUSTMENT,
+            "quantity": quantity,
+            "reference": reference,
+            "user_id": user_id,
+        }])
+
+    def levels(self, drug_ids: Optional[List[int]] = None, at: Optional[datetime] = None) -> Dict[int, int]:
+        """Stock per drug rebuilt from the ledger (latest snapshot plus later movements), now or as of `at`."""
+        latest = self._latest_snapshots(at, drug_ids)
+
+        levels: Dict[int, int] = {
+            drug_id: quantity
+            for drug_id, quantity in self.db.execute(
+                select(StockSnapshot.drug_id, StockSnapshot.quantity).join(latest, latest.c.id == StockSnapshot.id)
+            )
+        }
+
+        deltas = (
+            select(StockMovement.drug_id, func.sum(StockMovement.quantity))
+            .outerjoin(latest, latest.c.drug_id == StockMovement.drug_id)
+            .where(StockMovement.id > func.coalesce(latest.c.last_movement_id, 0))
+            .group_by(StockMovement.drug_id)
+        )
+        if at is not None:
+            deltas = deltas.where(StockMovement.created_at <= at)
+        if drug_ids is not None:
+            deltas = deltas.where(StockMovement.drug_id.in_(drug_ids))
+        for drug_id, delta in self.db.execute(deltas):
+            levels[drug_id] = levels.get(drug_id, 0) + int(delta or 0)
+
+        if drug_ids is not None:
+            for drug_id in drug_ids:
+                levels.setdefault(drug_id, 0)
+        return levels
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Snapshot every drug that has settled movements since its last snapshot,
+        then compare ledger levels with Stock.quantity and log any drift.
+        """
+        cutoff = datetime.utcnow() - self.COMPACTION_SETTLE
+        cutoff_id = self.db.execute(
+            select(func.max(StockMovement.id)).where(StockMovement.created_at <= cutoff)
+        ).scalar()
+
+        created = 0
+        if cutoff_id:
+            latest = self._latest_snapshots()
+            rows = self.db.execute(
+                select(
+                    StockMovement.drug_id,
+                    (func.coalesce(StockSnapshot.quantity, 0) + func.sum(StockMovement.quantity)).label("quantity"),
+                )
+                .outerjoin(latest, latest.c.drug_id == StockMovement.drug_id)
+                .outerjoin(StockSnapshot, StockSnapshot.id == latest.c.id)
+                .where(
+                    StockMovement.id > func.coalesce(latest.c.last_movement_id, 0),
+                    StockMovement.id <= cutoff_id,
+                )
+                .group_by(StockMovement.drug_id, StockSnapshot.quantity)
+            ).all()
+            if rows:
+                self.db.execute(insert(StockSnapshot), [
+                    {"drug_id": drug_id, "quantity": int(quantity), "last_movement_id": cutoff_id, "taken_at": cutoff}
+                    for drug_id, quantity in rows
+                ])
+                created = len(rows)
+            self.db.commit()
+
+        drift = 0
+        ledger_levels = self.levels()
+        for drug_id, quantity in self.db.query(Stock.drug_id, Stock.quantity):
+            if ledger_levels.get(drug_id, 0) != quantity:
+                drift += 1
+                logger.warning(
+                    f"Stock drift for drug {drug_id}: stock table {quantity}, ledger {ledger_levels.get(drug_id, 0)}"
+                )
+        return {"snapshots_created": created, "drugs_with_drift": drift}
+
+    @staticmethod
+    def _latest_snapshots(at: Optional[datetime] = None, drug_ids: Optional[List[int]] = None):
+        """Subquery: (drug_id, id, last_movement_id) of each drug's newest snapshot, optionally as of `at`."""
+        ranked = select(
+            StockSnapshot.drug_id,
+            StockSnapshot.id,
+            StockSnapshot.last_movement_id,
+            func.row_number().over(
+                partition_by=StockSnapshot.drug_id,
+                order_by=StockSnapshot.last_movement_id.desc()
+            ).label("rank"),
+        )
+        if at is not None:
+            ranked = ranked.where(StockSnapshot.taken_at <= at)
+        if drug_ids is not None:
+            ranked = ranked.where(StockSnapshot.drug_id.in_(drug_ids))
+        ranked = ranked.subquery()
+        return (
+            select(ranked.c.drug_id, ranked.c.id, ranked.c.last_movement_id)
+            .where(ranked.c.rank == 1)
+            .subquery()
+        )
@@ -0,0 +1,281 @@
+# benchmarks/datagen.py
+#
+# Synthetic hospital data for the benchmarks: patients with clinical notes,
+# appointments, billings with fees and payments, pharmacy records, one record
+# of each department history (laboratory, mental health, nurses' notes,
+# occupational therapy, social work) and audit logs, plus the doctors, users and stocked drugs they reference. Output is
+# deterministic for a given seed and patient count (dates are relative to
+# the day of the run). Rows are bulk inserted in batches with explicit keys
+# (sequences are moved past them on Postgres), so seeding a million
+# patients does not build a million ORM objects.
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterator, List
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.enums import FeeTypeEnum
+from app.models import (
+    Appointment, AuditLog, Billing, ClinicalNote, Doctor, Drug, Fee, LaboratoryRecord, MentalHealthNote, NursesNote,
+    OccupationalTherapyRecord, Patient, PaymentHistory, PharmacyRecord, SocialWorkRecord, Stock, User
+)
+
+# Records generated per patient
+CLINICAL_NOTES_PER_PATIENT = 2
+BILLINGS_PER_PATIENT = 2
+FEES_PER_BILLING = 2
+AUDIT_LOGS_PER_PATIENT = 3
+
+DOCTORS = 20
+USERS = 10
+DRUGS = 200
+
+# Identifiers of seeded rows, so scenarios can pick existing records
+PATIENT_ID_FORMAT = "BEN-{:07d}"
+BENCH_USERNAME = "bench-user-{}"
+
+SURNAMES = [
+    "Okafor", "Adeyemi", "Bello", "Eze", "Ibrahim", "Okon", "Udo", "Effiong", "Nwosu", "Balogun",
+    "Smith", "Johnson", "Mensah", "Owusu", "Danjuma", "Etim", "Akpan", "Obi", "Lawal", "Yusuf",
+]
+OTHER_NAMES = [
+    "Ekemini", "Chinedu", "Amaka", "Tunde", "Fatima", "Ngozi", "Emeka", "Aisha", "Kemi", "Ifeanyi",
+    "Grace", "Samuel", "Mary", "David", "Blessing", "Joseph", "Esther", "Daniel", "Ruth", "Peter",
+]
+COMPLAINTS = [
+    "reports poor sleep for the past three weeks", "describes persistent low mood", "has auditory hallucinations",
+    "reports anxiety in crowded places", "has stopped taking prescribed medication", "presents with irritability",
+    "describes intrusive thoughts", "reports reduced appetite and weight loss", "has episodes of panic",
+]
+OBSERVATIONS = [
+    "Speech normal in rate and volume.", "Affect restricted, mood described as low.", "No suicidal ideation reported.",
+    "Insight partial, judgement fair.", "Thought form coherent, no formal thought disorder.",
+    "Collateral history obtained from next of kin.", "Adherence discussed and psychoeducation given.",
+    "Sleep hygiene advice given.", "Risk assessed as low; safety plan reviewed.",
+]
+PLANS = [
+    "Continue current regimen and review in two weeks.", "Refer to occupational therapy.",
+    "Start cognitive behavioural therapy.", "Increase dose and monitor for side effects.",
+    "Arrange laboratory work-up.", "Family meeting scheduled.",
+]
+# Required narrative fields of a mental health note
+MENTAL_HEALTH_FIELDS = [
+    column.name for column in MentalHealthNote.__table__.columns
+    if not column.nullable and not column.primary_key and not column.foreign_keys
+]
+AUDIT_ACTIONS = ["patient_viewed", "patient_updated", "billing_created", "pharmacy_record_created", "login"]
+
+
+class HospitalDataGenerator:
+    """Bulk-loads a synthetic hospital of `patients` patients into `db`."""
+
+    def __init__(self, db: Session, patients: int, seed: int = 42, batch_size: int = 2000):
+        self.db = db
+        self.patients = patients
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        # Dates are spread over the year before today, so time-frame filters find them
+        self.now = datetime.combine(date.today(), datetime.min.time())
+
+    def run(self, progress=None) -> Dict[str, int]:
+        """Seed everything; `progress`, when given, is called with the number of patients written."""
+        self._seed_reference_data()
+        counts: Dict[str, int] = {}
+        for start in range(1, self.patients + 1, self.batch_size):
+            stop = min(start + self.batch_size, self.patients + 1)
+            for table, rows in self._patient_batch(start, stop).items():
+                if rows:
+                    self.db.execute(insert(table), rows)
+                    counts[table.__tablename__] = counts.get(table.__tablename__, 0) + len(rows)
+            self.db.commit()
+            if progress:
+                progress(stop - 1)
+        self._advance_sequences()
+        return counts
+
+    def _seed_reference_data(self):
+        self.db.execute(insert(User), [
+            {
+                "id": n, "username": BENCH_USERNAME.format(n), "full_name": f"Benchmark User {n}",
+                "email": f"bench{n}@example.com", "password_hash": "!",
+            }
+            for n in range(1, USERS + 1)
+        ])
+        self.db.execute(insert(Doctor), [
+            {"id": n, "full_name": f"Dr {self.random.choice(SURNAMES)} {n}", "specialty": "Psychiatry"}
+            for n in range(1, DOCTORS + 1)
+        ])
+        self.db.execute(insert(Drug), [
+            {
+                "id": n, "name": f"Benchmark drug {n}", "dosage": f"{self.random.choice([5, 10, 20, 50])} mg",
+                "price": round(self.random.uniform(100, 5000), 2), "is_active": 1,
+                "expiration_date": date(2030, 1, 1),
+            }
+            for n in range(1, DRUGS + 1)
+        ])
+        # Plenty of stock, so dispensing never runs out during a benchmark
+        self.db.execute(insert(Stock), [
+            {"id": n, "drug_id": n, "quantity": 1_000_000_000, "last_updated": self.now} for n in range(1, DRUGS + 1)
+        ])
+        self.db.commit()
+
+    def _patient_batch(self, start: int, stop: int) -> Dict[type, List[dict]]:
+        rows: Dict[type, List[dict]] = {
+            Patient: [], ClinicalNote: [], Appointment: [], Billing: [], Fee: [], PaymentHistory: [],
+            PharmacyRecord: [], LaboratoryRecord: [], MentalHealthNote: [], NursesNote: [],
+            OccupationalTherapyRecord: [], SocialWorkRecord: [], AuditLog: [],
+        }
+        for n in range(start, stop):
+            patient_id = PATIENT_ID_FORMAT.format(n)
+            rows[Patient].append(self._patient(n, patient_id))
+            for k in range(CLINICAL_NOTES_PER_PATIENT):
+                rows[ClinicalNote].append(self._clinical_note(n * CLINICAL_NOTES_PER_PATIENT + k, patient_id))
+            rows[Appointment].append({
+                "appointment_id": n, "patient_id": patient_id, "appointment_date": self._past(180),
+                "reason_for_visit": "Follow-up review", "notes": self._narrative(2),
+            })
+            for k in range(BILLINGS_PER_PATIENT):
+                billing_id = (n - 1) * BILLINGS_PER_PATIENT + k + 1
+                billing, fees, payments = self._billing(billing_id, patient_id)
+                rows[Billing].append(billing)
+                rows[Fee].extend(fees)
+                rows[PaymentHistory].extend(payments)
+            rows[PharmacyRecord].append(self._pharmacy_record(n, patient_id, (n - 1) * BILLINGS_PER_PATIENT + 1))
+            for model, record in self._department_records(n, patient_id).items():
+                rows[model].append(record)
+            for k in range(AUDIT_LOGS_PER_PATIENT):
+                rows[AuditLog].append({
+                    "id": n * AUDIT_LOGS_PER_PATIENT + k, "action": self.random.choice(AUDIT_ACTIONS),
+                    "entity_type": "Patient", "entity_id": patient_id, "timestamp": self._past(365),
+                    "user_id": self.random.randint(1, USERS), "description": f"Benchmark event for {patient_id}",
+                    "ip_address": "10.0.0.1", "user_agent": "benchmark",
+                })
+        return rows
+
+    def _patient(self, n: int, patient_id: str) -> dict:
+        born = date(1940, 1, 1) + timedelta(days=self.random.randint(0, 365 * 65))
+        return {
+            "id": n, "patient_id": patient_id, "hospital_reg_number": f"BREG-{n:07d}",
+            "source_of_info": "Self", "relationship_to_patient": "Self",
+            "surname": self.random.choice(SURNAMES), "other_names": self.random.choice(OTHER_NAMES),
+            "residential_address": f"{n} Hospital Road, Uyo", "residential_phone": f"080{n:08d}",
+            "next_of_kin": self.random.choice(OTHER_NAMES), "next_of_kin_address": f"{n} Hospital Road, Uyo",
+            "next_of_kin_residential_phone": f"081{n:08d}", "date_of_birth": born, "sex": self.random.choice("MF"),
+            "age": self.now.year - born.year, "marital_status": self.random.choice(["Single", "Married", "Widowed"]),
+            "legal_status": "Voluntary", "religion": self.random.choice(["Christianity", "Islam", "Other"]),
+            "doctor_id": self.random.randint(1, DOCTORS),
+        }
+
+    def _clinical_note(self, note_id: int, patient_id: str) -> dict:
+        created = self._past(365)
+        return {
+            "id": note_id, "patient_id": patient_id, "temperature": round(self.random.uniform(36.0, 38.5), 1),
+            "blood_pressure": f"{self.random.randint(100, 150)}/{self.random.randint(60, 95)}",
+            "pulse_rate": self.random.randint(55, 110), "respiratory_rate": self.random.randint(12, 22),
+            "present_psychological_concerns": f"Patient {self.random.choice(COMPLAINTS)}.",
+            "progress_notes": self._narrative(6), "type_of_therapy": self.random.choice(PLANS),
+            "created_at": created, "updated_at": created,
+        }
+
+    def _billing(self, billing_id: int, patient_id: str):
+        fee_types = self.random.sample(list(FeeTypeEnum), FEES_PER_BILLING)
+        fees = [
+            {
+                "fee_id": (billing_id - 1) * FEES_PER_BILLING + k + 1, "billing_id": billing_id, "fee_type": fee_type,
+                "amount": Decimal(self.random.randint(10, 500) * 100),
+            }
+            for k, fee_type in enumerate(fee_types)
+        ]
+        total = sum(fee["amount"] for fee in fees)
+        paid = self.random.random() < 0.6
+        issued = self._past(365)
+        billing = {
+            "billing_id": billing_id, "patient_id": patient_id, "doctor_id": self.random.randint(1, DOCTORS),
+            "invoice_number": f"BINV-{billing_id:09d}", "invoice_status": "generated", "invoice_date": issued,
+            "amount": total, "total_bill": total, "amount_due": Decimal("0.00") if paid else total,
+            "status": "Paid" if paid else "Unpaid",
+        }
+        payments = [{
+            "payment_id": billing_id, "billing_id": billing_id, "payment_date": issued + timedelta(hours=2),
+            "amount_paid": total, "payment_method": "cash", "receipt_number": f"BREC-{billing_id:09d}",
+        }] if paid else []
+        return billing, fees, payments
+
+    def _pharmacy_record(self, record_id: int, patient_id: str, billing_id: int) -> dict:
+        orders = []
+        for drug_id in self.random.sample(range(1, DRUGS + 1), self.random.randint(1, 3)):
+            orders.append({
+                "drug_id": drug_id, "drug_name": f"Benchmark drug {drug_id}",
+                "quantity": self.random.randint(1, 30), "price": round(self.random.uniform(100, 5000), 2),
+            })
+        return {
+            "pharmacy_id": record_id, "patient_id": patient_id, "billing_id": billing_id,
+            "medication_name": orders[0]["drug_name"], "dosage_and_route": "Oral", "frequency": "Twice daily",
+            "dispensation_date": self._past(365), "drug_orders": orders, "is_paid": self.random.random() < 0.5,
+        }
+
+    def _department_records(self, n: int, patient_id: str) -> Dict[type, dict]:
+        created = self._past(365)
+        return {
+            LaboratoryRecord: {
+                "id": n, "patient_id": patient_id, "tests_requested_by_physicians": "Full blood count",
+                "urgency": "Routine", "test_results": "Within normal limits", "specimen_type": "Blood",
+                "date_time_of_collection": created,
+            },
+            MentalHealthNote: {
+                "mental_health_id": n, "patient_id": patient_id,
+                **{field: self._narrative(2) for field in MENTAL_HEALTH_FIELDS},
+            },
+            NursesNote: {
+                "id": n, "patient_id": patient_id, "source_of_referral": "Outpatient clinic",
+                "temperature": Decimal("36.80"), "blood_pressure": f"{self.random.randint(100, 150)}/80",
+                "pulse_rate": self.random.randint(55, 110), "nurse_note": self._narrative(3),
+                "created_at": created, "updated_at": created,
+            },
+            OccupationalTherapyRecord: {
+                "id": n, "patient_id": patient_id, "long_term_goals": "Return to work",
+                "therapy_sessions": self._narrative(2),
+            },
+            SocialWorkRecord: {"id": n, "patient_id": patient_id, "housing_status": "Stable"},
+        }
+
+    def _narrative(self, sentences: int) -> str:
+        parts = [f"Patient {self.random.choice(COMPLAINTS)}."]
+        parts += [self.random.choice(OBSERVATIONS) for _ in range(sentences - 2)]
+        parts.append(self.random.choice(PLANS))
+        return " ".join(parts)
+
+    def _past(self, days: int) -> datetime:
+        return self.now - timedelta(seconds=self.random.randint(0, days * 86400))
+
+    def _advance_sequences(self):
+        """Move Postgres serial sequences past the explicit keys inserted above."""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return
+        for model in (User, Doctor, Drug, Stock, Patient, ClinicalNote, Appointment, Billing, Fee,
+                      PaymentHistory, PharmacyRecord, LaboratoryRecord, MentalHealthNote, NursesNote,
+                      OccupationalTherapyRecord, SocialWorkRecord, AuditLog):
+            table = model.__table__
+            key = list(table.primary_key.columns)[0]
+            self.db.execute(
+                text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"),
+                {
+                    "table": table.name, "column": key.name,
+                    "value": max(1, self.db.scalar(select(func.max(key))) or 1),
+                },
+            )
+        self.db.commit()
+
+
+def seeded_patient_count(db: Session) -> int:
+    """Patients seeded by an earlier run against this database (0 when none)."""
+    return db.scalar(select(func.count()).select_from(Patient).where(Patient.patient_id.like("BEN-%"))) or 0
+
+
+def sample_patient_ids(patients: int, count: int, seed: int = 7) -> Iterator[str]:
+    """Existing seeded patient IDs to drive lookups, spread over the whole range."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield PATIENT_ID_FORMAT.format(rng.randint(1, patients))
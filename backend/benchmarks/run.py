@@ -0,0 +1,245 @@
+# benchmarks/run.py
+#
+# Times the backend hot paths against a seeded database and compares the
+# result with a stored baseline. Run from backend/ (the .env settings are
+# still read, but the database comes from --database-url):
+#
+#   python -m benchmarks.run --database-url sqlite:///benchmark.db --patients 10000
+#   python -m benchmarks.run --database-url postgresql://localhost/emr_bench \
+#       --patients 1000000 --save main
+#   python -m benchmarks.run --database-url postgresql://localhost/emr_bench \
+#       --patients 1000000 --compare main
+#
+# An empty database is seeded on first use (benchmarks/datagen.py) and reused
+# afterwards. Every scenario reports p50/p95/p99 latency and SQL statements
+# per iteration, plus expected errors (4xx rejections, skipped) and failures
+# (5xx). A run with failures exits with status 1 and is not saved.
+# --save writes benchmarks/baselines/<name>.json; --compare exits with
+# status 1 when a scenario's p95 grew by more than --tolerance, it runs more
+# statements or it hit more errors than the baseline did.
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# p95 differences below this many milliseconds are noise, not regressions
+NOISE_FLOOR_MS = 1.0
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of `samples`."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(durations: List[float], queries: List[int], errors: int, failures: int) -> Dict[str, float]:
+    if not durations:
+        return {"iterations": 0, "errors": errors, "failures": failures}
+    return {
+        "iterations": len(durations),
+        "errors": errors,
+        "failures": failures,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 3),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+        "queries_p50": percentile(queries, 0.50),
+        "queries_max": max(queries),
+    }
+
+
+def run_scenario(name: str, iterations: int, warmup: int, context) -> Dict[str, float]:
+    from fastapi import HTTPException
+
+    from app.database import SessionLocal
+    from app.query_stats import query_budget
+    from benchmarks.scenarios import SCENARIOS, is_expected_error
+
+    scenario = SCENARIOS[name]
+    durations: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    failures = 0
+    for iteration in range(warmup + iterations):
+        # One session per iteration, as one request would have
+        db = SessionLocal()
+        try:
+            with query_budget() as stats:
+                start = time.perf_counter()
+                try:
+                    scenario(db, context)
+                except HTTPException as e:
+                    if is_expected_error(e):
+                        errors += iteration >= warmup
+                    else:
+                        logging.getLogger(__name__).error(f"{name} failed: {e.status_code} {e.detail}")
+                        failures += iteration >= warmup
+                    continue
+                elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        if iteration >= warmup:
+            durations.append(elapsed)
+            queries.append(stats.count)
+    return summarize(durations, queries, errors, failures)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline`, as printable lines."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current.get("failures"):
+            regressions.append(f"{name}: {current['failures']} failed iterations")
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {previous.get('errors', 0)}")
+        if "p95_ms" not in previous or "p95_ms" not in current:
+            continue
+        limit = previous["p95_ms"] * (1 + tolerance)
+        if current["p95_ms"] > limit and current["p95_ms"] - previous["p95_ms"] > NOISE_FLOOR_MS:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f} ms vs baseline {previous['p95_ms']:.1f} ms")
+        if current["queries_max"] > previous["queries_max"]:
+            regressions.append(f"{name}: up to {current['queries_max']} queries vs baseline {previous['queries_max']}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]):
+    header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}{'failed':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        if not result["iterations"]:
+            print(f"{name:<28}{'-':>10}{'-':>10}{'-':>10}{'-':>9}{result['errors']:>8}{result['failures']:>8}")
+            continue
+        print(
+            f"{name:<28}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            f"{result['queries_p50']:>9}{result['errors']:>8}{result['failures']:>8}"
+        )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend hot paths against synthetic data.")
+    parser.add_argument("--database-url", required=True, help="SQLAlchemy URL of a dedicated benchmark database")
+    parser.add_argument("--patients", type=int, default=10_000, help="Patients to seed (10k to 1M)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed iterations per scenario")
+    parser.add_argument("--scenarios", help="Comma-separated scenarios to run (default: all)")
+    parser.add_argument("--read-only", action="store_true", help="Skip scenarios that write")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the data generator")
+    parser.add_argument("--save", metavar="NAME", help="Store the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Compare with baseline NAME; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth over the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Must be set before app is imported: the engine is built at import time
+    os.environ["SQLALCHEMY_DATABASE_URL"] = args.database_url
+    # Configured first so the DEBUG basicConfig of some route modules is a no-op;
+    # per-statement pool logs would skew the timings
+    logging.basicConfig(level=logging.WARNING)
+
+    from app.database import SessionLocal, engine
+    from app.models import Base
+    from app.services.audit_logger import audit_log_writer
+    from benchmarks.datagen import HospitalDataGenerator, seeded_patient_count
+    from benchmarks.scenarios import SCENARIOS, WRITE_SCENARIOS, ScenarioContext
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(SCENARIOS)}", file=sys.stderr)
+        return 2
+    if args.read_only:
+        names = [name for name in names if name not in WRITE_SCENARIOS]
+
+    # The app creates its tables at startup; a fresh benchmark database needs them too
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seeded = seeded_patient_count(db)
+        if seeded == 0:
+            print(f"Seeding {args.patients} patients ...")
+            started = time.perf_counter()
+            counts = HospitalDataGenerator(db, args.patients, seed=args.seed).run(
+                progress=lambda done: print(f"  {done}/{args.patients} patients", end="\r")
+            )
+            print(f"\nSeeded in {time.perf_counter() - started:.0f}s: {counts}")
+        elif seeded != args.patients:
+            print(f"Database already holds {seeded} benchmark patients; use --patients {seeded} "
+                  "or a fresh database.", file=sys.stderr)
+            return 2
+        context = ScenarioContext(db, args.patients)
+    finally:
+        db.close()
+
+    audit_log_writer.start()
+    results = {}
+    try:
+        for name in names:
+            results[name] = run_scenario(name, args.iterations, args.warmup, context)
+    finally:
+        audit_log_writer.shutdown()
+
+    print(f"\n{args.patients} patients on {engine.dialect.name}, {args.iterations} iterations per scenario\n")
+    print_results(results)
+
+    failed = [name for name, result in results.items() if result["failures"]]
+    if failed:
+        print(f"\nFailed iterations (5xx) in: {', '.join(failed)}; the timings are not comparable", file=sys.stderr)
+
+    if args.save and failed:
+        print(f"Baseline {args.save} not saved", file=sys.stderr)
+    elif args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save), "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "dialect": engine.dialect.name,
+                "patients": args.patients,
+                "iterations": args.iterations,
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path(args.save)}")
+
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+        if baseline.get("patients") != args.patients or baseline.get("dialect") != engine.dialect.name:
+            print(f"\nWarning: baseline {args.compare} was taken with {baseline.get('patients')} patients "
+                  f"on {baseline.get('dialect')}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')}): "
+              f"{len(regressions) or 'no'} regression(s)")
+        for line in regressions:
+            print(f"  {line}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
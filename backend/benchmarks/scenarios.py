@@ -0,0 +1,146 @@
+# benchmarks/scenarios.py
+#
+# The hot paths being measured. Each scenario runs one operation the way the
+# route does (reads through the service or query helper, writes through the
+# route function itself, so commits, stock locking and audit enqueueing are
+# included) against a database seeded by benchmarks/datagen.py.
+import random
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from fastapi import HTTPException, Response
+from sqlalchemy.orm import Session
+
+from app.enums import FeeTypeEnum
+from app.models import AuditLog, User
+from app.pagination import keyset_paginate
+from app.routes.v1 import billing as billing_routes
+from app.routes.v1 import export as export_routes
+from app.routes.v1 import patients as patient_routes
+from app.routes.v1 import pharmacy as pharmacy_routes
+from app.routes.v1.audit_logs import audit_log_query
+from app.routes.v2.async_reads import HISTORY_SECTIONS, patient_history
+from app.schemas import BillingCreate, DrugOrder, FeeCreate, PatientCreate, PharmacyRecordCreate
+from app.services.dashboard_service import DashboardService
+from app.services.patient_search_service import PatientSearchService
+from app.services.principal_cache import Principal
+
+from benchmarks.datagen import BENCH_USERNAME, DOCTORS, DRUGS, OTHER_NAMES, PATIENT_ID_FORMAT, SURNAMES
+
+# Rows per iteration of the all-patients export
+EXPORT_ALL_LIMIT = 500
+
+# Stands in for the Starlette request the write routes read the client address from
+BENCHMARK_REQUEST = SimpleNamespace(client=SimpleNamespace(host="127.0.0.1"), headers={"user-agent": "benchmark"})
+
+
+class ScenarioContext:
+    """Seeded data the scenarios draw their inputs from, with a fixed random stream."""
+
+    def __init__(self, db: Session, patients: int, seed: int = 7):
+        self.patients = patients
+        self.random = random.Random(seed)
+        self.user = Principal.from_user(db.query(User).filter(User.username == BENCH_USERNAME.format(1)).one())
+
+    def patient_id(self) -> str:
+        return PATIENT_ID_FORMAT.format(self.random.randint(1, self.patients))
+
+
+def patient_search(db: Session, context: ScenarioContext):
+    prefix = context.random.choice(SURNAMES)[:3].lower()
+    PatientSearchService(db).search(surname=prefix, size=50)
+
+
+def patient_dashboard(db: Session, context: ScenarioContext):
+    DashboardService(db).get_patient_dashboard_data(context.patient_id())
+
+
+def patient_registration(db: Session, context: ScenarioContext):
+    patient = PatientCreate(
+        source_of_info="Self", relationship_to_patient="Self", surname=context.random.choice(SURNAMES),
+        other_names=context.random.choice(OTHER_NAMES), residential_address="1 Hospital Road, Uyo",
+        residential_phone="08000000000", next_of_kin=context.random.choice(OTHER_NAMES),
+        next_of_kin_address="1 Hospital Road, Uyo", next_of_kin_residential_phone="08100000000",
+        date_of_birth=date(1980, 1, 1), sex="F", age=46, marital_status="Single", legal_status="Voluntary",
+        religion="Christianity", doctor_id=context.random.randint(1, DOCTORS),
+    )
+    patient_routes.create_patient(patient, BENCHMARK_REQUEST, db, context.user)
+
+
+def billing_creation(db: Session, context: ScenarioContext):
+    fee_types = context.random.sample(list(FeeTypeEnum), 2)
+    billing = BillingCreate(
+        patient_id=context.patient_id(),
+        doctor_id=context.random.randint(1, DOCTORS),
+        fees=[FeeCreate(fee_type=fee_type, amount=Decimal("1500.00"), billing_id=0) for fee_type in fee_types],
+    )
+    billing_routes.create_billing(billing.patient_id, billing, BENCHMARK_REQUEST, db, context.user)
+
+
+def dispensing(db: Session, context: ScenarioContext):
+    patient_id = context.patient_id()
+    orders = [
+        DrugOrder(drug_id=drug_id, quantity=context.random.randint(1, 5))
+        for drug_id in context.random.sample(range(1, DRUGS + 1), 3)
+    ]
+    record = PharmacyRecordCreate(
+        patient_id=patient_id, medication_name="Benchmark", dosage_and_route="Oral", frequency="Daily",
+        dispensation_date=date.today(), drug_orders=orders,
+    )
+    pharmacy_routes.create_pharmacy_record(patient_id, record, BENCHMARK_REQUEST, db, context.user)
+
+
+def patient_history_sections(db: Session, context: ScenarioContext):
+    # Every /v2/async history section of one patient, serialized as the route does;
+    # a schema that cannot be built from its ORM rows fails the run
+    patient_id = context.patient_id()
+    for section in HISTORY_SECTIONS:
+        patient_history(db, patient_id, section, Response(), limit=50)
+
+
+def patient_export_excel(db: Session, context: ScenarioContext):
+    export_routes.generate_excel(export_routes.get_patient_data(context.patient_id(), db))
+
+
+def all_patients_export_excel(db: Session, context: ScenarioContext):
+    skip = context.random.randint(0, max(0, context.patients - EXPORT_ALL_LIMIT))
+    for _ in export_routes.iter_all_patients_excel(skip, EXPORT_ALL_LIMIT, {}):
+        pass
+
+
+def audit_log_browse(db: Session, context: ScenarioContext):
+    query = audit_log_query(db, "year", None, None, None, "Patient", None, None, True)
+    keyset_paginate(query, [AuditLog.timestamp, AuditLog.id], limit=100, descending=True)
+
+
+def audit_log_entity_history(db: Session, context: ScenarioContext):
+    query = audit_log_query(db, None, None, None, None, "Patient", context.patient_id(), None, True)
+    keyset_paginate(query, [AuditLog.timestamp, AuditLog.id], limit=100, descending=True)
+
+
+SCENARIOS: Dict[str, Callable[[Session, ScenarioContext], None]] = {
+    "patient_search": patient_search,
+    "patient_dashboard": patient_dashboard,
+    "patient_registration": patient_registration,
+    "billing_creation": billing_creation,
+    "dispensing": dispensing,
+    "patient_history_sections": patient_history_sections,
+    "patient_export_excel": patient_export_excel,
+    "all_patients_export_excel": all_patients_export_excel,
+    "audit_log_browse": audit_log_browse,
+    "audit_log_entity_history": audit_log_entity_history,
+}
+
+# Scenarios that write; they can be skipped to keep a shared benchmark database unchanged
+WRITE_SCENARIOS: List[str] = ["patient_registration", "billing_creation", "dispensing"]
+
+
+def is_expected_error(error: Exception) -> bool:
+    """
+    Whether `error` is a rejection the route may legitimately give (a 4xx,
+    e.g. a drug that ran out): the iteration is skipped and counted as an
+    error. A 5xx is a failure of the code under test; anything else aborts the run.
+    """
+    return isinstance(error, HTTPException) and error.status_code < 500
@@ -0,0 +1,23 @@
+# compact_stock_ledger.py
+#
+# Rolls settled stock movements into snapshots and reports drift between the
+# ledger and the stock table. Run it periodically, e.g. hourly from cron:
+#   python compact_stock_ledger.py
+
+import logging
+
+from app.database import SessionLocal
+from app.services.stock_service import StockLedger
+
+logging.basicConfig(level=logging.INFO)
+
+def compact_stock_ledger():
+    db = SessionLocal()
+    try:
+        result = StockLedger(db).compact()
+        print(f"Snapshots created: {result['snapshots_created']}, drugs with drift: {result['drugs_with_drift']}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    compact_stock_ledger()
@@ -0,0 +1,25 @@
+# Gunicorn settings for the Docker image (see Dockerfile).
+# Workers write Prometheus samples to PROMETHEUS_MULTIPROC_DIR so /metrics
+# can merge them (see app/metrics.py); the directory is emptied when the
+# master starts and a dead worker's live gauges are dropped when it exits.
+import os
+import shutil
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+# Workers size their process pools by their share of the cores (app/process_pools.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -4,8 +4,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from app import app  # Import the FastAPI instance
 from app.config import settings  # Import settings from config.py
 from dotenv import load_dotenv
-import os
-from sqlalchemy import create_engine
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -30,19 +28,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allows all headers
+    # Keyset pagination cursor (see app/pagination.py) and per-request SQL counts (app/query_stats.py)
+    expose_headers=["X-Next-Cursor", "X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-Max-Repeat"],
 )
 
-# Set up the database connection
-DATABASE_URL = os.getenv("DATABASE_URL")  # Get the connection string from the environment
-if DATABASE_URL:
-    try:
-        engine = create_engine(DATABASE_URL)
-        logging.info("Database connection successful.")
-    except Exception as e:
-        logging.error(f"Database connection failed: {e}")
-else:
-    logging.error("Database URL is not set in the environment variables.")
-
 if __name__ == "__main__":
     logging.info("Starting the FastAPI application...")
     uvicorn.run(
@@ -0,0 +1,39 @@
+"""Add trigram indexes for patient search
+
+Revision ID: a3f1c9d2b7e4
+Revises: 34868b2ea75c
+Create Date: 2026-10-17 09:12:44.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d2b7e4'
+down_revision: Union[str, None] = '34868b2ea75c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_COLUMNS = ['patient_id', 'surname', 'other_names', 'hospital_reg_number']
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRIGRAM_COLUMNS:
+        op.create_index(
+            f'ix_patients_{column}_trgm',
+            'patients',
+            [column],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    for column in TRIGRAM_COLUMNS:
+        op.drop_index(f'ix_patients_{column}_trgm', table_name='patients')
@@ -0,0 +1,47 @@
+"""Add notification outbox
+
+Revision ID: a8d3f5b1c62e
+Revises: f4c1a7e9d3b2
+Create Date: 2026-10-17 18:42:13.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f5b1c62e'
+down_revision: Union[str, None] = 'f4c1a7e9d3b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('channel', sa.String(length=10), nullable=False),
+        sa.Column('recipient', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=True),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('dedupe_key', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dedupe_key'),
+    )
+    op.create_index(
+        'ix_notification_outbox_status_next_attempt_at', 'notification_outbox', ['status', 'next_attempt_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_outbox_status_next_attempt_at', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
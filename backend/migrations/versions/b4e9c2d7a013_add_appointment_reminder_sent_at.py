@@ -0,0 +1,26 @@
+"""Add appointments.reminder_sent_at
+
+Revision ID: b4e9c2d7a013
+Revises: a8d3f5b1c62e
+Create Date: 2026-10-17 19:35:02.771463
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e9c2d7a013'
+down_revision: Union[str, None] = 'a8d3f5b1c62e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('appointments', sa.Column('reminder_sent_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('appointments', 'reminder_sent_at')
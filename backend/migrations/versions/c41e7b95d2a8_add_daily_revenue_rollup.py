@@ -0,0 +1,77 @@
+"""Add daily revenue rollup
+
+Revision ID: c41e7b95d2a8
+Revises: a3f1c9d2b7e4
+Create Date: 2026-10-17 11:02:17.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b95d2a8'
+down_revision: Union[str, None] = 'a3f1c9d2b7e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_revenue',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('fee_type', sa.String(length=50), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+        sa.Column('billing_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payments_received', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'doctor_id', 'fee_type', name='uq_daily_revenue_day_doctor_fee_type'),
+    )
+    op.create_index(op.f('ix_daily_revenue_day'), 'daily_revenue', ['day'], unique=False)
+
+    # Backfill from existing paid billings. Billings without an invoice date
+    # are attributed to today, matching how new ones are recorded.
+    op.execute("""
+        INSERT INTO daily_revenue (day, doctor_id, fee_type, revenue, billing_count, payments_received)
+        SELECT COALESCE(invoice_date::date, CURRENT_DATE), doctor_id, 'total',
+               COALESCE(SUM(total_bill), 0), COUNT(*), 0
+        FROM billings
+        WHERE status = 'Paid'
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO daily_revenue (day, doctor_id, fee_type, revenue, billing_count, payments_received)
+        SELECT day, doctor_id, fee_type, SUM(share), COUNT(*), 0
+        FROM (
+            SELECT COALESCE(b.invoice_date::date, CURRENT_DATE) AS day,
+                   b.doctor_id,
+                   LOWER(f.fee_type::text) AS fee_type,
+                   ROUND(SUM(f.amount) * COALESCE(b.total_bill, 0) / g.gross, 2) AS share
+            FROM billings b
+            JOIN fees f ON f.billing_id = b.billing_id
+            JOIN (SELECT billing_id, SUM(amount) AS gross FROM fees GROUP BY billing_id) g
+              ON g.billing_id = b.billing_id
+            WHERE b.status = 'Paid' AND g.gross > 0
+            GROUP BY b.billing_id, 1, 2, 3, g.gross
+        ) per_billing
+        GROUP BY day, doctor_id, fee_type
+    """)
+    op.execute("""
+        INSERT INTO daily_revenue (day, doctor_id, fee_type, revenue, billing_count, payments_received)
+        SELECT p.payment_date::date, b.doctor_id, 'total', 0, 0, SUM(p.amount_paid)
+        FROM payment_histories p
+        JOIN billings b ON b.billing_id = p.billing_id
+        GROUP BY 1, 2
+        ON CONFLICT (day, doctor_id, fee_type)
+        DO UPDATE SET payments_received = daily_revenue.payments_received + EXCLUDED.payments_received
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_daily_revenue_day'), table_name='daily_revenue')
+    op.drop_table('daily_revenue')
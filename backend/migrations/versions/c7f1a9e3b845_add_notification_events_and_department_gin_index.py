@@ -0,0 +1,51 @@
+"""Add notification events and a GIN index on receiver_departments
+
+Revision ID: c7f1a9e3b845
+Revises: b4e9c2d7a013
+Create Date: 2026-10-17 20:51:37.204918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f1a9e3b845'
+down_revision: Union[str, None] = 'b4e9c2d7a013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notification_events',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        op.f('ix_notification_events_notification_id'), 'notification_events', ['notification_id'], unique=False
+    )
+    op.create_index(
+        'ix_notifications_receiver_departments', 'notifications', ['receiver_departments'],
+        unique=False, postgresql_using='gin',
+    )
+
+    # Existing notifications become the first events, so clients can catch up on them
+    op.execute("""
+        INSERT INTO notification_events (notification_id, kind, created_at)
+        SELECT id, 'created', COALESCE(created_at, NOW() AT TIME ZONE 'utc')
+        FROM notifications
+        ORDER BY id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_receiver_departments', table_name='notifications')
+    op.drop_index(op.f('ix_notification_events_notification_id'), table_name='notification_events')
+    op.drop_table('notification_events')
@@ -0,0 +1,27 @@
+"""Add export_data_version_seq
+
+Revision ID: d2a6b8f4c951
+Revises: c7f1a9e3b845
+Create Date: 2026-10-17 22:08:44.391027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6b8f4c951'
+down_revision: Union[str, None] = 'c7f1a9e3b845'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Write counter behind the export cache (app/services/export_jobs.py)
+    op.execute("CREATE SEQUENCE IF NOT EXISTS export_data_version_seq")
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE IF EXISTS export_data_version_seq")
@@ -0,0 +1,65 @@
+"""Add stock movement ledger and snapshots
+
+Revision ID: d7a2e6f0b913
+Revises: c41e7b95d2a8
+Create Date: 2026-10-17 13:26:51.804417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a2e6f0b913'
+down_revision: Union[str, None] = 'c41e7b95d2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('drug_id', sa.Integer(), nullable=False),
+        sa.Column('movement_type', sa.String(length=20), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reference', sa.String(length=100), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['drug_id'], ['drugs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_movements_drug_id_id', 'stock_movements', ['drug_id', 'id'], unique=False)
+    op.create_index(op.f('ix_stock_movements_created_at'), 'stock_movements', ['created_at'], unique=False)
+
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('drug_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['drug_id'], ['drugs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_snapshots_drug_id_taken_at', 'stock_snapshots', ['drug_id', 'taken_at'], unique=False)
+
+    # Opening balance: the ledger starts from the current stock levels
+    op.execute("""
+        INSERT INTO stock_snapshots (drug_id, quantity, last_movement_id, taken_at)
+        SELECT drug_id, SUM(quantity), 0, (NOW() AT TIME ZONE 'utc')
+        FROM stock
+        WHERE drug_id IS NOT NULL
+        GROUP BY drug_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_snapshots_drug_id_taken_at', table_name='stock_snapshots')
+    op.drop_table('stock_snapshots')
+    op.drop_index(op.f('ix_stock_movements_created_at'), table_name='stock_movements')
+    op.drop_index('ix_stock_movements_drug_id_id', table_name='stock_movements')
+    op.drop_table('stock_movements')
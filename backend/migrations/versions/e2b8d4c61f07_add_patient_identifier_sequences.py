@@ -0,0 +1,35 @@
+"""Add sequences for patient identifiers
+
+Revision ID: e2b8d4c61f07
+Revises: d7a2e6f0b913
+Create Date: 2026-10-17 16:05:12.431876
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8d4c61f07'
+down_revision: Union[str, None] = 'd7a2e6f0b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# patient_id and hospital_reg_number are allocated from these (app/id_allocator.py).
+# The new identifiers are longer than the random PAT-XXXXXX / REG-NNNNN ones
+# already issued, so both sequences can start at 1 without colliding
+SEQUENCES = ['patient_id_seq', 'hospital_reg_number_seq']
+
+
+def upgrade() -> None:
+    for name in SEQUENCES:
+        # The app's create_all may have created it already
+        op.execute(f'CREATE SEQUENCE IF NOT EXISTS {name} START WITH 1')
+
+
+def downgrade() -> None:
+    for name in SEQUENCES:
+        op.execute(f'DROP SEQUENCE IF EXISTS {name}')
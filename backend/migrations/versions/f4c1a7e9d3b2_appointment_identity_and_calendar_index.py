@@ -0,0 +1,46 @@
+"""Make appointment_id an identity column and index appointment dates
+
+Revision ID: f4c1a7e9d3b2
+Revises: e2b8d4c61f07
+Create Date: 2026-10-17 17:21:40.662019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1a7e9d3b2'
+down_revision: Union[str, None] = 'e2b8d4c61f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_identity = bind.execute(sa.text(
+        "SELECT is_identity FROM information_schema.columns "
+        "WHERE table_name = 'appointments' AND column_name = 'appointment_id'"
+    )).scalar()
+    if is_identity != 'YES':
+        # The serial default was never used (the app computed MAX + 1), so
+        # its sequence is behind; replace it with an identity column
+        op.execute("ALTER TABLE appointments ALTER COLUMN appointment_id DROP DEFAULT")
+        op.execute("DROP SEQUENCE IF EXISTS appointments_appointment_id_seq")
+        op.execute("ALTER TABLE appointments ALTER COLUMN appointment_id ADD GENERATED BY DEFAULT AS IDENTITY")
+    # Start after the ids already handed out
+    op.execute("""
+        SELECT setval(pg_get_serial_sequence('appointments', 'appointment_id'), COALESCE(MAX(appointment_id), 0) + 1, false)
+        FROM appointments
+    """)
+
+    op.create_index(
+        'ix_appointments_appointment_date_patient_id', 'appointments', ['appointment_date', 'patient_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_appointment_date_patient_id', table_name='appointments')
+    op.execute("ALTER TABLE appointments ALTER COLUMN appointment_id DROP IDENTITY IF EXISTS")
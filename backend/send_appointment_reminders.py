@@ -0,0 +1,52 @@
+# send_appointment_reminders.py
+#
+# Queues reminders for upcoming appointments into the notification outbox,
+# which the API workers' dispatchers deliver. Runs as its own process and
+# makes a pass every REMINDER_INTERVAL_MINUTES:
+#   python send_appointment_reminders.py
+# or a single pass, e.g. from cron:
+#   python send_appointment_reminders.py --once
+
+import argparse
+import logging
+import signal
+import threading
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.appointment_reminders import AppointmentReminderService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("appointment_reminders")
+
+def send_appointment_reminders():
+    db = SessionLocal()
+    try:
+        counts = AppointmentReminderService(db).send_due()
+        logger.info(
+            f"Reminders queued for {counts['appointments']} appointments "
+            f"({counts['email']} email, {counts['sms']} SMS)"
+        )
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue appointment reminders")
+    parser.add_argument("--once", action="store_true", help="make a single pass and exit")
+    args = parser.parse_args()
+    if args.once:
+        send_appointment_reminders()
+        return
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not stop.is_set():
+        try:
+            send_appointment_reminders()
+        except Exception as e:
+            logger.error(f"Reminder pass failed: {e}")
+        stop.wait(settings.REMINDER_INTERVAL_MINUTES * 60)
+
+if __name__ == "__main__":
+    main()
@@ -5,24 +5,46 @@ const Notifications = ({ department }) => {
   const [notifications, setNotifications] = useState([]);
 
   useEffect(() => {
-    const ws = new WebSocket(`ws://localhost:8000/ws/${department}`);
-
-    ws.onmessage = (event) => {
-      const newNotification = JSON.parse(event.data);
-      setNotifications((prev) => [newNotification, ...prev]);
-
-      // Show Ant Design notification popup
-      notification.info({
-        message: "New Notification",
-        description: newNotification.message,
-        placement: "topRight",
-      });
+    let ws;
+    let retry;
+    let lastId = null;
+    let stopped = false;
+
+    const connect = () => {
+      const token = localStorage.getItem("access_token");
+      const resume = lastId !== null ? `&last_id=${lastId}` : "";
+      ws = new WebSocket(
+        `ws://localhost:8000/v1/notifications/ws/${encodeURIComponent(department)}?token=${token}${resume}`
+      );
+
+      ws.onmessage = (event) => {
+        const newNotification = JSON.parse(event.data);
+        // Resume after the highest event seen
+        lastId = Math.max(lastId ?? 0, newNotification.event_id);
+        setNotifications((prev) => [newNotification, ...prev]);
+
+        // Show Ant Design notification popup
+        notification.info({
+          message: newNotification.event === "response" ? "New Response" : "New Notification",
+          description: newNotification.message,
+          placement: "topRight",
+        });
+      };
+
+      ws.onerror = (error) => console.error("WebSocket Error:", error);
+      // Reconnect and replay anything missed since the last event
+      ws.onclose = () => {
+        if (!stopped) retry = setTimeout(connect, 5000);
+      };
     };
 
-    ws.onerror = (error) => console.error("WebSocket Error:", error);
-    ws.onclose = () => setTimeout(() => window.location.reload(), 5000);
+    connect();
 
-    return () => ws.close();
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      ws.close();
+    };
   }, [department]);
 
   return (